@@ -29,7 +29,7 @@ setuptools.setup(
         "tqdm",
         "coloredlogs",
     ],
-    extras_require={"gui": ["GooeyEx>=0.1.1"], "il2cpp": ["lief"], "criware": ["PyCriCodecsEx"]},
+    extras_require={"gui": ["GooeyEx>=0.1.1"], "il2cpp": ["lief"], "criware": ["PyCriCodecsEx"], "fuse": ["fusepy"], "rla": ["numpy"]},
     entry_points={
         "console_scripts": [
             "sssekai = sssekai.__main__:__main__",
@@ -55,7 +55,11 @@ def main_moc3paths(*args, **kwargs):
 # endregion
 
 from sssekai.unity import sssekai_get_unity_version, sssekai_set_unity_version
-from sssekai.fmt.rla import RLA_VERSIONS
+from sssekai.fmt.rla import RLA_VERSIONS, RLA_FRAME_TYPES
+from sssekai.fmt.rla_audio import HCA_AUDIO_FORMATS
+from sssekai.fmt.rla_index import RLA_TICKS_PER_SECOND
+from sssekai.fmt.rla_output import RLA_OUTPUT_FORMATS
+from sssekai.profiling import PROFILE_MODES
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +99,23 @@ This has been changed to 2022.3.21f1 since, which would apply to all the assets
 If you encounter any issues, try switching to the old version, or vice versa.""",
         default=sssekai_get_unity_version(),
     )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="""profile the subcommand with this profiler, and record its phase timings (default: off)
+cprofile: deterministic, saved as <output>.pstats
+sample: low overhead stack sampling of all threads, saved as collapsed stacks in <output>.stacks
+In both cases, wall-clock timings of each phase are saved in <output>.phases.json""",
+        default=None,
+        choices=PROFILE_MODES,
+    )
+    parser.add_argument(
+        "--profile-output",
+        type=str,
+        help="output path prefix of the profile (default: %(default)s)",
+        default="sssekai_profile",
+        **gooey_only(widget="FileSaver"),
+    )
     subparsers = parser.add_subparsers(
         title="subcommands", description="valid subcommands", help="additional help"
     )
@@ -232,7 +253,7 @@ This crypto applies to:
     group.add_argument(
         "--download-no-overwrite",
         action="store_true",
-        help="skip downloading AssetBundles that are already present in the download directory",        
+        help="with --download-no-verify, skip downloading AssetBundles that are already present in the download directory. otherwise present ones are skipped once verified",
     )
     group.add_argument(
         "--download-filter",
@@ -240,6 +261,17 @@ This crypto applies to:
         help="filter AssetBundles (by bundle names) with this regex pattern",
         default=None,
     )
+    group.add_argument(
+        "--download-query",
+        type=str,
+        help="""filter AssetBundles with a query expression. combined with other filters with 'and'. e.g.
+    name ^= "live_pv/model/" and size > 1048576
+    category = "StartApp" or (isBuiltin = true and not name ~ "shader.*")
+    dependency = "shader/live"
+fields: name, category, hash, size, builtin, dependency, status ("added", "modified", "unchanged"; needs --download-filter-cache-diff) and other index fields
+operators: = != < <= > >= ^= (prefix) ~ (regex)""",
+        default=None,
+    )
     group.add_argument(
         "--download-filter-cache-diff",
         type=str,
@@ -265,6 +297,48 @@ This crypto applies to:
         help="number of download workers (default: %(default)s)",
         default=4,
     )
+    group.add_argument(
+        "--download-storage",
+        type=str,
+        choices=["local", "shards", "objects"],
+        help="""how downloaded bundles are stored (default: %(default)s)
+local: one file per bundle in the download directory
+shards: packed into append-only ZIP shards (with a 'shards.jsonl' index) in the download directory
+objects: written whole as objects. The download directory can be any fsspec URL, i.e. s3://bucket/prefix with s3fs installed""",
+        default="local",
+    )
+    group.add_argument(
+        "--download-readahead",
+        type=int,
+        help="number of blocks each worker fetches ahead of the disk writes. 0 to disable (default: %(default)s)",
+        default=4,
+    )
+    group.add_argument(
+        "--download-plan",
+        type=str,
+        help="write the download plan (selection, dependencies, sizes and ETA) as JSON to this file ('-' for stdout) and exit without downloading",
+        default=None,
+        **gooey_only(widget="FileSaver"),
+    )
+    group.add_argument(
+        "--download-no-verify",
+        action="store_true",
+        help="skip integrity checks on downloaded AssetBundles. by default, corrupt downloads are retried then moved to '.quarantine' in the download directory",
+    )
+    group = abcache_parser.add_argument_group(
+        "sync options",
+        "NOTE: when specified, 'game version options' and '--db' are ignored. Each config carries its own.",
+    )
+    group.add_argument(
+        "--sync-configs",
+        type=str,
+        help="""JSON file containing a list of configs (AbCacheConfig fields, plus optional 'db' path) to refresh concurrently.
+When --download-dir is set, bundles selected across all configs are deduplicated by hash into a shared store
+('.objects' in the download directory) and linked into '<region>/<platform>/' views.
+Objects are never downloaded twice. --download-no-overwrite keeps existing view files. --download-filter-cache-diff is not supported.""",
+        default=None,
+        **gooey_only(widget="FileChooser"),
+    )
     group = abcache_parser.add_argument_group(
         "extra options",
         "NOTE: when *any* of these options are specified, the cache database *won't* be updated, and no download will be performed either.",
@@ -322,6 +396,30 @@ This crypto applies to:
         default="",
         **gooey_only(widget="DirChooser"),
     )
+    abserve_parser.add_argument(
+        "--fuse-cache-dir",
+        type=str,
+        help="""directory of the persistent block store backing FUSE reads (default: %(default)s)""",
+        default="~/.sssekai/abcache_blocks",
+        **gooey_only(widget="DirChooser"),
+    )
+    abserve_parser.add_argument(
+        "--fuse-workers",
+        type=int,
+        help="""number of concurrent background downloads filling the block store (default: %(default)s)""",
+        default=4,
+    )
+    abserve_parser.add_argument(
+        "--fuse-prefetch-deps",
+        action="store_true",
+        help="""prefetch the dependencies of a bundle into the block store when it's opened""",
+    )
+    abserve_parser.add_argument(
+        "--fuse-attr-timeout",
+        type=float,
+        help="""seconds the kernel may cache entries and attributes for (default: %(default)s)""",
+        default=60,
+    )
     abserve_parser.add_argument(
         "--host",
         type=str,
@@ -334,6 +432,18 @@ This crypto applies to:
         help="""port to listen on (default: %(default)s)""",
         default="3939",
     )
+    abserve_parser.add_argument(
+        "--refresh-interval",
+        type=int,
+        help="""refresh the AssetBundle index from the server every N seconds in the background. 0 to disable (default: %(default)s)""",
+        default=0,
+    )
+    abserve_parser.add_argument(
+        "--readahead",
+        type=int,
+        help="""number of blocks fetched ahead of the client for each served file. 0 to disable (default: %(default)s)""",
+        default=4,
+    )
     abserve_parser.set_defaults(func=main_abserve)
     # live2dextract
     live2dextract_parser = subparsers.add_parser(
@@ -387,6 +497,47 @@ This crypto applies to:
         action="store_true",
         help="strict mode. raise exception on unknown frame type or corrupt frames",
     )
+    rla2json_parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes decoding frames in parallel. 0 for one per CPU core (default: %(default)s)",
+        default=1,
+    )
+    rla2json_parser.add_argument(
+        "--types",
+        type=str,
+        nargs="+",
+        help="only dump these frame types. others are skipped before decoding (default: all)",
+        default=None,
+        choices=list(RLA_FRAME_TYPES.values()),
+    )
+    rla2json_parser.add_argument(
+        "--format",
+        type=str,
+        help="output format of frames. json: a file per frame. ndjson, msgpack: a stream per frame type. npz: motion tracks as arrays (needs sssekai[rla]), others as ndjson (default: %(default)s)",
+        default="json",
+        choices=RLA_OUTPUT_FORMATS,
+    )
+    rla2json_parser.add_argument(
+        "--audio",
+        type=str,
+        help="assemble SoundData frames into one track of this format, instead of a file per frame. wav needs sssekai[criware] and --hca-template",
+        default=None,
+        choices=HCA_AUDIO_FORMATS,
+    )
+    rla2json_parser.add_argument(
+        "--hca-template",
+        type=str,
+        help="HCA file encoded with the same settings as the live audio, i.e. from the live's ACB. its header makes the assembled track playable",
+        default=None,
+        **gooey_only(widget="FileChooser"),
+    )
+    rla2json_parser.add_argument(
+        "--ticks-per-second",
+        type=int,
+        help="unit of the packet ticks in RLA archives, used to place SoundData frames of --audio in time and report gaps. assumed to be .NET ticks, which is unverified (default: %(default)s)",
+        default=RLA_TICKS_PER_SECOND,
+    )
     rla2json_parser.set_defaults(func=main_rla2json)
     # apphash
     apphash_parser = subparsers.add_parser(
@@ -506,6 +657,11 @@ def __main__():
     sssekai_set_unity_version(args.unity_version)
     if "func" in args:
         try:
+            if args.profile:
+                from sssekai.profiling import Profile
+
+                with Profile(args.profile_output, args.profile):
+                    return args.func(args)
             return args.func(args)
         except Exception as e:
             logger.exception("Error while running command: %s", e)
@@ -65,6 +65,8 @@ from msgpack import unpackb, packb
 from sssekai import __version__, __version_tuple__
 from sssekai.unity import sssekai_get_unity_version
 from sssekai.crypto.APIManager import decrypt, encrypt, SEKAI_APIMANAGER_KEYSETS
+from sssekai.abcache.adapter import AbCacheHTTPAdapter
+from sssekai.abcache.throttle import AbCacheThrottle, THROTTLE_STATUS, parse_retry_after
 
 
 @dataclass
@@ -276,6 +278,16 @@ class AbCacheUserNotAuthenticatedError(Exception):
     pass
 
 
+class AbCacheIntegrityError(Exception):
+    bundleName: str
+    reason: str
+
+    def __init__(self, bundleName: str, reason: str):
+        self.bundleName = bundleName
+        self.reason = reason
+        super().__init__("Integrity check failed for %s: %s" % (bundleName, reason))
+
+
 class AbCache(Session):
     database: SSSekaiDatabase
 
@@ -535,6 +547,46 @@ class AbCache(Session):
     def abcache_index(self):
         return self.database.sekai_abcache_index
 
+    THROTTLE_RETRIES = 5
+
+    def request_throttled(
+        self, method: str, url: str, hold: bool = False, **kwargs
+    ) -> Response:
+        """Send a request under `throttle`. Throttled (429, 503) ones are retried after backing off.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            hold (bool, optional): Keep the throttle slot after returning. i.e. for streamed responses.
+                The caller must call `throttle.release()` once done. Defaults to False.
+
+        Returns:
+            Response: Response object. Which may still be a throttled one after all retries.
+        """
+        for attempt in range(self.THROTTLE_RETRIES):
+            self.throttle.acquire()
+            try:
+                resp = self.request(method=method, url=url, **kwargs)
+            except BaseException:
+                self.throttle.release()
+                raise
+            if resp.status_code in THROTTLE_STATUS:
+                delay = self.throttle.backoff(
+                    parse_retry_after(resp.headers.get("Retry-After"))
+                )
+                logger.debug(
+                    "%s %s %d. Retrying in %.1fs" % (method, url, resp.status_code, delay)
+                )
+                if attempt < self.THROTTLE_RETRIES - 1:
+                    resp.close()
+                    self.throttle.release()
+                    continue
+            elif resp.status_code < 400:
+                self.throttle.success()
+            if not hold:
+                self.throttle.release()
+            return resp
+
     def request_packed(self, method: str, url: str, data: dict = None, **kwargs):
         """Send a request with packed data. Data will be packed and encrypted before sending.
 
@@ -566,7 +618,7 @@ class AbCache(Session):
             #   https://github.com/msgpack/msgpack-python/issues/326
             data = packb(data, use_single_float=True)
             data = encrypt(data, SEKAI_APIMANAGER_KEYSETS[self.config.app_region])
-        resp = self.request(method=method, url=url, data=data, **kwargs)
+        resp = self.request_throttled(method, url, data=data, **kwargs)
         if 400 <= resp.status_code < 600:
             logger.error(f"{method} {url} {resp.status_code}")
             try:  # log the error message provided by the API.
@@ -651,6 +703,42 @@ class AbCache(Session):
             "unknown", "unknown", "unknown", "unknown"
         )
         self.config.version = __version_tuple__
+        self.throttle = AbCacheThrottle()
+        self.configure_pool()
+
+    def configure_pool(
+        self,
+        workers: int = 10,
+        per_host: int = None,
+        block: bool = False,
+        keepalive: bool = True,
+    ):
+        """(Re)configure the connection pools of this session.
+
+        Args:
+            workers (int, optional): Number of threads making requests concurrently. Defaults to 10.
+            per_host (int, optional): Pooled connections per host. Defaults to `workers`.
+            block (bool, optional): Wait for a pooled connection when all of them are in use, instead of
+                opening (and discarding afterwards) extra ones. Defaults to False.
+            keepalive (bool, optional): Enable TCP keep-alive on the connections. Defaults to True.
+
+        The concurrency limit of `throttle` is capped to `workers` as well.
+        """
+        self.throttle.resize(workers)
+        adapter = AbCacheHTTPAdapter(
+            pool_maxsize=per_host or workers, pool_block=block, keepalive=keepalive
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def connection_stats(self) -> Mapping[str, dict]:
+        """Requests made and connections opened per host. Reused connections = requests - connections."""
+        stats = dict()
+        for adapter in set(self.adapters.values()):
+            if isinstance(adapter, AbCacheHTTPAdapter):
+                for host, host_stats in adapter.stats().items():
+                    stats.setdefault(host, host_stats)
+        return stats
 
     def update_client_headers(self):
         """Authenticate the user and update client headers."""
@@ -744,6 +832,34 @@ class AbCache(Session):
     def get_entry_by_bundle_name(self, bundleName: str) -> AbCacheEntry:
         return self.abcache_index.bundles.get(bundleName, None)
 
+    _query_index = None
+
+    @property
+    def query_index(self):
+        """Query indices of the current AssetBundle index. Rebuilt when the index is replaced."""
+        from .query import AbCacheQueryIndex
+
+        bundles = self.abcache_index.bundles
+        if self._query_index is None or self._query_index.bundles is not bundles:
+            self._query_index = AbCacheQueryIndex(bundles)
+        return self._query_index
+
+    def query(self, expr: str, diff: "AbCache" = None) -> List[str]:
+        """Select bundle names with a query expression. See `sssekai.abcache.query` for the syntax.
+
+        Args:
+            expr (str): The query expression, i.e. `name ^= "live_pv/" and size > 1024`
+            diff (AbCache, optional): Another cache to compare against for `status` predicates.
+
+        Returns:
+            List[str]: Sorted names of the matching bundles.
+        """
+        from .query import query_bundles
+
+        return query_bundles(
+            self.query_index, expr, diff.abcache_index.bundles if diff else None
+        )
+
     def get_entry_download_url(self, entry: AbCacheEntry):
         if self.config.app_region in REGION_JP_EN:
             return self.SEKAI_AB_ENDPOINT + self.SEKAI_AB_BASE_PATH + entry.bundleName
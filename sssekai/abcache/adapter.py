@@ -0,0 +1,78 @@
+"""Connection pooling for AbCache sessions."""
+
+import socket
+from typing import Mapping
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+KEEPALIVE_IDLE = 60  # Seconds before an idle connection is probed
+KEEPALIVE_INTERVAL = 10  # Seconds between probes
+KEEPALIVE_COUNT = 6  # Failed probes before the connection is dropped
+
+
+def keepalive_socket_options() -> list:
+    """urllib3's default socket options (TCP_NODELAY) with TCP keep-alive enabled, and tuned where supported."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPALIVE", KEEPALIVE_IDLE),  # macOS
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class AbCacheHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP keep-alive, and connection reuse statistics.
+
+    Connections are kept alive and reused by the pools. New connections (and their TLS
+    handshakes) are only made when every pooled one is in use. `pool_maxsize` is the per-host
+    limit of pooled connections. With `pool_block`, requests beyond it wait for a free
+    connection instead of making ones that'd be discarded afterwards.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["keepalive"]
+
+    def __init__(
+        self,
+        pool_connections: int = 16,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keepalive: bool = True,
+        **kwargs
+    ):
+        self.keepalive = keepalive
+        super().__init__(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            **kwargs
+        )
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keepalive:
+            pool_kwargs.setdefault("socket_options", keepalive_socket_options())
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if self.keepalive:
+            proxy_kwargs.setdefault("socket_options", keepalive_socket_options())
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def stats(self) -> Mapping[str, dict]:
+        """Requests made, and connections opened per host (of the pools still alive)."""
+        stats = dict()
+        for manager in [self.poolmanager, *self.proxy_manager.values()]:
+            pools = manager.pools
+            for key in pools.keys():
+                pool = pools.get(key, None)
+                if pool is None:
+                    continue
+                host = "%s://%s:%s" % (key.key_scheme, key.key_host, key.key_port)
+                host = stats.setdefault(host, {"requests": 0, "connections": 0})
+                host["requests"] += pool.num_requests
+                host["connections"] += pool.num_connections
+        return stats
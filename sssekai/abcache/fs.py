@@ -1,14 +1,18 @@
-import math, fsspec
-from typing import Callable
-from functools import cached_property, cache
-from collections import defaultdict
+import re, math, hashlib, threading, weakref, fsspec
+from glob import has_magic
+from typing import Callable, List, Mapping, Set
+from functools import cached_property
+from array import array
+from queue import Queue, Full
+from bisect import bisect_left, bisect_right
 from fsspec.spec import AbstractBufferedFile
 from fsspec.caching import BaseCache, register_cache
 from fsspec.archive import AbstractArchiveFileSystem
+from fsspec.utils import glob_translate
 from requests import Response
 from logging import getLogger
 from sssekai.crypto.AssetBundle import decrypt_iter, SEKAI_AB_MAGIC
-from . import AbCache, AbCacheEntry
+from . import AbCache, AbCacheEntry, AbCacheIntegrityError
 
 logger = getLogger("abcache.fs")
 
@@ -82,6 +86,25 @@ class UnidirectionalBlockCache(BaseCache):
 register_cache(UnidirectionalBlockCache)
 
 
+def unityfs_declared_size(block: bytes) -> int | None:
+    """Parse the total file size declared in a (decrypted) UnityFS header.
+
+    Args:
+        block (bytes): The first block of the bundle.
+
+    Returns:
+        int | None: The declared size. None if the block is not a UnityFS header.
+    """
+    # [UnityFS\0][u32 version][str unityVersion\0][str unityRevision\0][i64 size]
+    if not block.startswith(b"UnityFS\x00"):
+        return None
+    pos = block.find(b"\x00", 12)
+    pos = block.find(b"\x00", pos + 1) if pos >= 0 else -1
+    if pos < 0 or len(block) < pos + 9:
+        return None
+    return int.from_bytes(block[pos + 1 : pos + 9], "big")
+
+
 # Reference: https://github.com/fsspec/filesystem_spec/blob/master/fsspec/implementations/http.py#L526
 class AbCacheFile(AbstractBufferedFile):
     """Cached, file-like object for reading from an AbCache on demand.
@@ -92,6 +115,10 @@ class AbCacheFile(AbstractBufferedFile):
           will incur additional download (in-betweens will be cached as well).
         - File sizes reported are *inaccurate* due to wrong values sent by the server.
           Read until EOF otherwise you will miss data.
+        - Integrity data is gathered while streaming. Call `verify()` after reaching EOF
+          to check the content against the index without another read pass.
+        - With `readahead` > 0, blocks are fetched and decrypted by a background thread that
+          keeps up to `readahead` of them in flight, overlapping network I/O with the consumer.
     """
 
     DEFAULT_BLOCK_SIZE = 65536  # 64KB
@@ -114,9 +141,16 @@ class AbCacheFile(AbstractBufferedFile):
         self.loc += len(out)
         return out
 
-    def __init__(self, fs, bundle: str, block_size=None):
+    def __init__(self, fs, bundle: str, block_size=None, readahead: int = 0):
         self.fs, self.path = fs, bundle
         self.fetch_loc = 0
+        self.readahead = readahead
+        self.__readahead_stop = threading.Event()
+        # Integrity states. Updated as the blocks are fetched
+        self.raw_size = 0
+        self.fetch_size = 0
+        self.raw_md5 = hashlib.md5() if self.entry.md5Hash else None
+        self.unityfs_size = None
         super().__init__(
             fs,
             bundle,
@@ -131,21 +165,122 @@ class AbCacheFile(AbstractBufferedFile):
 
     @cached_property
     def __resp(self) -> Response:
+        # The throttle slot is held while streaming. Released with the response
         url = self.session.get_entry_download_url(self.entry)
-        resp = self.session.get(url, stream=True)
-        resp.raise_for_status()
+        resp = self.session.request_throttled("GET", url, hold=True, stream=True)
+        try:
+            resp.raise_for_status()
+        except Exception:
+            resp.close()
+            self.session.throttle.release()
+            raise
         return resp
 
+    def __blocks(self):
+        # `self` is a weakref.proxy when run by the read-ahead thread. The response is held
+        # here, so it's closed with the generator even if the file is already gone
+        resp, throttle = self.__resp, self.session.throttle
+
+        def __next_raw_bytes(nbytes):
+            block = next(resp.iter_content(nbytes), b"")
+            self.raw_size += len(block)
+            if self.raw_md5:
+                self.raw_md5.update(block)
+            return block
+
+        try:
+            for block in decrypt_iter(__next_raw_bytes, self.blocksize):
+                if self.unityfs_size is None:
+                    self.unityfs_size = unityfs_declared_size(block)
+                self.fetch_size += len(block)
+                yield bytes(block)
+        finally:
+            resp.close()
+            throttle.release()
+
+    def __prefetch(self, blocks):
+        """Produce `blocks` in a background thread, keeping up to `readahead` of them queued.
+
+        Exceptions raised by the producer are re-raised in the consumer. The thread holds no
+        reference to the file, and exits on EOF, `close()`, or when the file is collected.
+        """
+        queue, stop = Queue(self.readahead), self.__readahead_stop
+
+        def __put(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def __produce():
+            try:
+                for block in blocks:
+                    if not __put(block):
+                        return
+                __put(None)
+            except Exception as e:
+                __put(e)
+            finally:
+                blocks.close()
+
+        threading.Thread(
+            target=__produce, name="abcache-readahead", daemon=True
+        ).start()
+        while (item := queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
     @cached_property
     def __fetch(self):
-        def __innner():
-            for block in decrypt_iter(
-                lambda nbytes: next(self.__resp.iter_content(nbytes), b""),
-                self.blocksize,
-            ):
-                yield bytes(block)
+        if self.readahead > 0:
+            return self.__prefetch(AbCacheFile.__blocks(weakref.proxy(self)))
+        return self.__blocks()
+
+    def close(self):
+        self.__readahead_stop.set()
+        if not self.readahead and "_AbCacheFile__fetch" in self.__dict__:
+            self.__fetch.close()  # Releases the connection. Done by the producer otherwise
+        super().close()
+
+    @property
+    def eof(self) -> bool:
+        return self.cache.eof
+
+    def verify(self):
+        """Verify the streamed content against the index. Must be called after EOF.
+
+        Checks performed:
+            - MD5 of the raw (encrypted) response body, if `md5Hash` is available (ROW)
+            - Size declared by the UnityFS header against the decrypted content size
+
+        NOTE:
+            `crc` in the index is Unity's CRC of the *uncompressed* bundle content, and is
+            not verifiable on the wire.
+
+        Raises:
+            AbCacheIntegrityError: If any of the checks failed.
+        """
+        assert self.eof, "verify() called before EOF"
+        entry = self.entry
+        if self.raw_md5 and self.raw_md5.hexdigest() != entry.md5Hash.lower():
+            raise AbCacheIntegrityError(
+                entry.bundleName,
+                "md5 mismatch. expected=%s actual=%s"
+                % (entry.md5Hash, self.raw_md5.hexdigest()),
+            )
+        if self.unityfs_size is not None and self.unityfs_size != self.fetch_size:
+            raise AbCacheIntegrityError(
+                entry.bundleName,
+                "size mismatch. declared=%d actual=%d"
+                % (self.unityfs_size, self.fetch_size),
+            )
+        if self.raw_size == 0:
+            raise AbCacheIntegrityError(entry.bundleName, "empty response")
 
-        return __innner()
 
     def _fetch_range(self, start, end):
         assert start - self.fetch_loc == 0, f"can only fetch sequentially. {start=} {self.fetch_loc=}"
@@ -153,6 +288,357 @@ class AbCacheFile(AbstractBufferedFile):
         return next(self.__fetch, b"")
 
 
+class AbCacheDirectoryIndex:
+    """Lazily built, incrementally updated listing index of a bundle mapping.
+
+    Bundle names are kept sorted, which is also their DFS order. Every node covers a
+    contiguous range `[lo, hi)` of them, and its path is the first `end` characters of
+    `names[lo]`, so no path strings are kept. File counts are range lengths, total sizes
+    are range sums over a Fenwick tree of the file sizes, and `find` without directories
+    is a slice.
+
+    Nodes are array-backed, with integer parent pointers. A directory's children are only
+    built the first time it's visited. `update` applies a diff of the bundles to a copy of
+    the index: size changes are point updates, and only the visited directories that gained
+    or lost entries are listed again. The index itself is never changed by it, so readers
+    of it aren't held up while the copy is worked on.
+    """
+
+    root_marker = "/"
+    bundles: Mapping[str, AbCacheEntry]
+    names: List[str]  # Sorted bundle names
+    sizes: array  # Fenwick tree (1-based) of the sizes of `names`
+
+    def __init__(self, bundles: Mapping[str, AbCacheEntry]):
+        """Create the index. Only the root node is built.
+
+        Args:
+            bundles (Mapping[str, AbCacheEntry]): The bundles to index.
+        """
+        self.lock = threading.RLock()
+        self.bundles = bundles
+        self.names = sorted(bundles)
+        self._build_sizes()
+        self._reset_nodes()
+
+    def _build_sizes(self):
+        tree = array("q", [0])
+        tree.extend(self.bundles[name].fileSize for name in self.names)
+        n = len(tree)
+        for i in range(1, n):
+            j = i + (i & -i)
+            if j < n:
+                tree[j] += tree[i]
+        self.sizes = tree
+
+    def _add_size(self, i: int, delta: int):
+        tree, i = self.sizes, i + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix_size(self, i: int) -> int:
+        tree, total = self.sizes, 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _reset_nodes(self):
+        # Root is always 0
+        self.node_parent = array("l", [-1])
+        self.node_lo = array("l", [0])
+        self.node_hi = array("l", [len(self.names)])
+        self.node_end = array("l", [0])  # Length of the path in names[lo]
+        self.node_is_file = bytearray(1)
+        self.node_children = [None]  # Unexpanded directories are None
+        self.node_info = [None]
+        self.garbage = 0  # Nodes of removed entries, left unreachable by `update`
+
+    def __len__(self):
+        return len(self.node_parent)
+
+    def path(self, u: int) -> str:
+        return self.root_marker + self.names[self.node_lo[u]][: self.node_end[u]]
+
+    def _add_node(self, parent: int, end: int, lo: int, hi: int, is_file: bool):
+        u = len(self.node_parent)
+        self.node_parent.append(parent)
+        self.node_lo.append(lo)
+        self.node_hi.append(hi)
+        self.node_end.append(end)
+        self.node_is_file.append(is_file)
+        self.node_children.append([] if is_file else None)
+        self.node_info.append(None)
+        return u
+
+    def _list(self, u: int, reuse: dict = None) -> List[int]:
+        """Builds the children of directory `u`, reusing the nodes in `reuse` (path : node)"""
+        names = self.names
+        pos = self.node_end[u] + 1 if u else 0
+        lo, hi = self.node_lo[u], self.node_hi[u]
+        children = list()
+        while lo < hi:
+            name = names[lo]
+            sep = name.find(self.root_marker, pos)
+            if sep < 0:
+                end, next, is_file = len(name), lo + 1, True
+            else:
+                # Names sharing the directory prefix are contiguous
+                end = sep
+                next = bisect_left(names, name[: sep + 1] + "\U0010ffff", lo, hi)
+                is_file = False
+            v = reuse.get(name[:end], None) if reuse else None
+            if v is None or self.node_is_file[v] != is_file:
+                v = self._add_node(u, end, lo, next, is_file)
+            children.append(v)
+            lo = next
+        return children
+
+    def expand(self, u: int) -> List[int]:
+        """Children of node `u`. Built on first access."""
+        children = self.node_children[u]
+        if children is not None:
+            return children
+        with self.lock:
+            if self.node_children[u] is None:
+                self.node_children[u] = self._list(u)
+            return self.node_children[u]
+
+    def normalize(self, path: str) -> str:
+        path = (path or self.root_marker).rstrip(self.root_marker)
+        if not path.startswith(self.root_marker):
+            path = self.root_marker + path
+        return path
+
+    def _child_at(self, u: int, i: int) -> int:
+        """The child of expanded directory `u` whose range starts at or before name `i`. -1 if none"""
+        children = self.node_children[u]
+        k = bisect_right(children, i, key=self.node_lo.__getitem__) - 1
+        return children[k] if k >= 0 else -1
+
+    def lookup(self, path: str) -> int:
+        path = self.normalize(path)[1:]
+        if not path:
+            return 0
+        names, sep = self.names, self.root_marker
+        with self.lock:
+            i = bisect_left(names, path)
+            if i >= len(names) or names[i] != path:
+                i = bisect_left(names, path + sep)
+                if i >= len(names) or not names[i].startswith(path + sep):
+                    raise FileNotFoundError(sep + path)
+            u = 0
+            while self.node_end[u] != len(path):
+                self.expand(u)
+                u = self._child_at(u, i)
+            return u
+
+    def size(self, lo: int, hi: int) -> int:
+        return self._prefix_size(hi) - self._prefix_size(lo)
+
+    def file_info(self, name: str) -> dict:
+        size = self.bundles[name].fileSize
+        return {
+            "name": self.root_marker + name,
+            "type": "file",
+            "size": size,
+            "item_count": 0,
+            "file_count": 0,
+            "total_size": size,
+        }
+
+    def info(self, u: int) -> dict:
+        """Info of node `u`. Only the ones of directories are kept, file ones are cheap to make"""
+        if self.node_is_file[u]:
+            return self.file_info(self.names[self.node_lo[u]])
+        info = self.node_info[u]
+        if info is None:
+            with self.lock:
+                lo, hi = self.node_lo[u], self.node_hi[u]
+                info = {
+                    "name": self.path(u),
+                    "type": "directory",
+                    "size": 0,
+                    "item_count": len(self.expand(u)),  # Direct children
+                    "file_count": hi - lo,
+                    "total_size": self.size(lo, hi),
+                }
+                self.node_info[u] = info
+        return info
+
+    def child(self, path: str, name: str) -> dict | None:
+        """Lookup of a direct child by its name. None if there's none.
+
+        Not a lookup in the parent's children. Like any path, it's found by bisecting the
+        sorted names, then walking down from the root with a bisect per level.
+        """
+        path = self.normalize(path).rstrip(self.root_marker)
+        try:
+            return self.info(self.lookup(path + self.root_marker + name))
+        except FileNotFoundError:
+            return None
+
+    def ls(self, path: str, detail=True, offset=0, limit=None) -> list:
+        with self.lock:
+            children = self.expand(self.lookup(path))
+            children = children[offset : offset + limit if limit is not None else None]
+            if detail:
+                return [self.info(v) for v in children]
+            return [self.path(v) for v in children]
+
+    def find(self, path: str, maxdepth=None, withdirs=False) -> List[dict]:
+        """Nodes under `path` in DFS order. Only directories are expanded when `withdirs` is set."""
+        with self.lock:
+            u = self.lookup(path)
+            if self.node_is_file[u]:
+                return [self.info(u)]
+            depth = (
+                self.normalize(path).rstrip(self.root_marker).count(self.root_marker)
+            )
+            if not withdirs:
+                # Files in DFS order are just the range of sorted names
+                return [
+                    self.file_info(name)
+                    for name in self.names[self.node_lo[u] : self.node_hi[u]]
+                    if maxdepth is None
+                    or name.count(self.root_marker) + 1 - depth <= maxdepth
+                ]
+            result = [self.info(u)]
+            stack = [(v, 1) for v in reversed(self.expand(u))]
+            while stack:
+                v, d = stack.pop()
+                if maxdepth is not None and d > maxdepth:
+                    continue
+                result.append(self.info(v))
+                stack += [(w, d + 1) for w in reversed(self.expand(v))]
+            return result
+
+    def _trail(self, name: str) -> List[int]:
+        """Built nodes on the way from the root to `name`, which may not be indexed"""
+        trail, u, sep = [0], 0, self.root_marker
+        i = bisect_left(self.names, name)
+
+        def contains(v):
+            path = self.names[self.node_lo[v]][: self.node_end[v]]
+            return name == path or name.startswith(path + sep)
+
+        while not self.node_is_file[u] and self.node_children[u]:
+            # Names not indexed yet may go right after the end of their directory
+            for v in (self._child_at(u, i), self._child_at(u, i - 1)):
+                if v >= 0 and contains(v):
+                    break
+            else:
+                break
+            trail.append(v)
+            u = v
+        return trail
+
+    def copy(self) -> "AbCacheDirectoryIndex":
+        """Copy of the index and its built nodes. Only blocks readers for the copy itself"""
+        index = object.__new__(type(self))
+        index.lock = threading.RLock()
+        with self.lock:
+            # Names, child lists and infos are replaced, never changed in place
+            index.bundles, index.names = self.bundles, self.names
+            index.sizes = array("q", self.sizes)
+            index.node_parent = array("l", self.node_parent)
+            index.node_lo = array("l", self.node_lo)
+            index.node_hi = array("l", self.node_hi)
+            index.node_end = array("l", self.node_end)
+            index.node_is_file = bytearray(self.node_is_file)
+            index.node_children = list(self.node_children)
+            index.node_info = list(self.node_info)
+            index.garbage = self.garbage
+        return index
+
+    def update(
+        self, bundles: Mapping[str, AbCacheEntry], changed: Set[str]
+    ) -> "AbCacheDirectoryIndex":
+        """Apply a diff of the bundles to a copy of the index.
+
+        Args:
+            bundles (Mapping[str, AbCacheEntry]): The new bundles.
+            changed (Set[str]): Names added, removed, or otherwise changed since the last update.
+
+        Returns:
+            AbCacheDirectoryIndex: The updated index. This one is left as is.
+        """
+        index = self.copy()
+        index._apply(bundles, changed)
+        return index
+
+    def _apply(self, bundles: Mapping[str, AbCacheEntry], changed: Set[str]):
+        # In place. Only ever done to copies no reader has seen yet
+        with self.lock:
+            names, sep = self.names, self.root_marker
+
+            def is_indexed(name):
+                i = bisect_left(names, name)
+                return i < len(names) and names[i] == name
+
+            added = {
+                name for name in changed if name in bundles and not is_indexed(name)
+            }
+            removed = {name for name in changed if name not in bundles}
+            dirty = set()  # Directories to list again
+            for name in changed:
+                trail = self._trail(name)
+                for v in trail:
+                    self.node_info[v] = None
+                if name in added or name in removed:
+                    u = trail[-1]
+                    if self.node_is_file[u]:
+                        u = trail[-2]
+                    if self.node_children[u] is not None:
+                        dirty.add(u)
+            if not added and not removed:
+                for name in changed:
+                    i = bisect_left(names, name)
+                    self._add_size(
+                        i, bundles[name].fileSize - self.bundles[name].fileSize
+                    )
+                self.bundles = bundles
+                return
+            # Built nodes, by their paths under the current names
+            paths, stack = dict(), [0]
+            while stack:
+                u = stack.pop()
+                paths[u] = names[self.node_lo[u]][: self.node_end[u]]
+                stack += self.node_children[u] or []
+            self.bundles = bundles
+            self.names = names = [name for name in names if name not in removed]
+            names += added
+            names.sort()
+            self._build_sizes()
+            # Move the nodes to their new ranges. Ones with nothing left are dropped
+            dead = set()
+            for u, path in paths.items():
+                if not u:
+                    lo, hi = 0, len(names)
+                elif self.node_is_file[u]:
+                    lo = bisect_left(names, path)
+                    hi = lo + 1 if lo < len(names) and names[lo] == path else lo
+                else:
+                    lo = bisect_left(names, path + sep)
+                    hi = bisect_left(names, path + sep + "\U0010ffff", lo)
+                if u and lo == hi:
+                    dead.add(u)
+                    dirty.add(self.node_parent[u])
+                self.node_lo[u], self.node_hi[u] = lo, hi
+            for u in dirty - dead:
+                reuse = {paths[v]: v for v in self.node_children[u] if v not in dead}
+                self.node_children[u] = self._list(u, reuse)
+                self.node_info[u] = None
+            reachable, stack = 0, [0]
+            while stack:
+                reachable += 1
+                stack += self.node_children[stack.pop()] or []
+            self.garbage = len(self) - reachable
+            if self.garbage > reachable:
+                self._reset_nodes()  # Built again on demand
+
+
 # Reference: https://github.com/fsspec/filesystem_spec/blob/master/fsspec/implementations/libarchive.py
 class AbCacheFilesystem(AbstractArchiveFileSystem):
     """Filesystem for reading from an AbCache on demand."""
@@ -179,97 +665,120 @@ class AbCacheFilesystem(AbstractArchiveFileSystem):
             else:
                 self.cache.load(fo)
             self.cache.update_client_headers()
+        self.refresh_callbacks = list()
+        self._refresh_stop = threading.Event()
+        self._refresh_lock = threading.Lock()  # Only held by refreshes, never by readers
 
-    @cached_property
-    def dir_cache(self):
-        # Reference implementation did O(n) per *every* ls() call
-        # We can make it O(1) with DP on tree preprocessing of O(nlogn)
-        bundles = self.cache.abcache_index.bundles
-        # Only the leaf nodes are given.
-        keys = set((self.root_marker + key for key in bundles.keys()))
-        keys |= self._all_dirnames(bundles.keys())
-        # Sorting implies DFS order.
-        keys = [self.root_marker] + [key for key in sorted(keys)]
-        _trim = lambda key: key[len(self.root_marker) :]
-        nodes = [
-            {
-                "name": key,
-                "type": "directory" if not _trim(key) in bundles else "file",
-                "size": (
-                    0 if not _trim(key) in bundles else bundles[_trim(key)].fileSize
-                ),
-                "item_count": 0,
-                "file_count": 0,
-                "total_size": 0,
-            }
-            for key in keys
-        ]
-        # Already in DFS order.
-        # Get start index for each directory and their item count.
-        stack = [0]
-        graph = defaultdict(list)
-        table = {node["name"]: index for index, node in enumerate(nodes)}
-
-        def is_file(name):
-            return _trim(name) in bundles
-
-        def is_parent_path(a, b):
-            # a is parent of b
-            if a == self.root_marker:
-                return True
-            return b.startswith(a + self.root_marker)
-
-        def maintain():
-            # Always starts from root. Safe to assume stack size >= 2
-            u, v = stack[-2], stack[-1]
-            nodes[u]["item_count"] += nodes[v]["item_count"]
-            nodes[u]["file_count"] += nodes[v]["file_count"]
-            nodes[u]["total_size"] += nodes[v]["total_size"]
-            stack.pop()
-
-        for index, name in enumerate(keys):
-            # Skip root
-            if index == 0:
-                continue
-            while not is_parent_path(keys[stack[-1]], name):
-                maintain()
-            pa = stack[-1]
-            nodes[pa]["item_count"] += 1
-            graph[pa].append(index)
-            if not is_file(name):
-                stack.append(index)
-            else:
-                nodes[pa]["file_count"] += 1
-                nodes[pa]["total_size"] += nodes[index]["size"]
-                nodes[index]["total_size"] = nodes[index]["size"]
-        while len(stack) >= 2:
-            maintain()
-        assert nodes[0]["file_count"] == len(bundles), "file count mismatch"
-        return nodes, graph, table
+    _dir_cache: AbCacheDirectoryIndex = None
+
+    @property
+    def dir_cache(self) -> AbCacheDirectoryIndex:
+        if self._dir_cache is None:
+            self._dir_cache = AbCacheDirectoryIndex(self.cache.abcache_index.bundles)
+        return self._dir_cache
 
     def _get_dirs(self):
         return self.dir_cache
 
+    refresh_callbacks: List[Callable[[Set[str]], None]]
+
+    def refresh(self) -> Set[str]:
+        """Update the AssetBundle index from the server and apply the diff to the directory index.
+
+        The diff is applied to a copy of the directory index, which then replaces it. Readers
+        keep using the old one meanwhile. Only the parts of it affected by the diff are updated.
+        Callbacks in `refresh_callbacks` are called with the changed bundle names afterwards.
+        Refreshes are serialized, so none of them replaces the index with one missing the
+        diff of another.
+
+        Returns:
+            Set[str]: Names of the bundles that were added, removed, or had their hashes changed.
+        """
+        with self._refresh_lock:
+            old = self.cache.abcache_index.bundles
+            self.cache.update_abcache_index()
+            new = self.cache.abcache_index.bundles
+            changed = {
+                name
+                for name, entry in new.items()
+                if name not in old or old[name].hash != entry.hash
+            }
+            changed |= old.keys() - new.keys()
+            if changed:
+                if self._dir_cache is not None:
+                    self._dir_cache = self._dir_cache.update(new, changed)
+                for callback in self.refresh_callbacks:
+                    callback(changed)
+        logger.info("Index refreshed. %d bundles changed", len(changed))
+        return changed
+
+    def start_refresh(self, interval: float) -> threading.Thread:
+        """Refresh the index every `interval` seconds in a background thread, until `stop_refresh` is called."""
+
+        def __loop():
+            while not self._refresh_stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning("Index refresh failure: %s", e)
+
+        self._refresh_stop.clear()
+        thread = threading.Thread(target=__loop, name="abcache-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_refresh(self):
+        self._refresh_stop.set()
+
     def info(self, path, **kwargs):
-        nodes, graph, table = self._get_dirs()
-        path = path or self.root_marker
-        if path in table:
-            return nodes[table[path]]
+        dirs = self._get_dirs()
+        return dirs.info(dirs.lookup(path))
+
+    def ls(self, path, detail=True, offset=0, limit=None, **kwargs):
+        """List a directory. Use `offset` and `limit` to paginate large ones."""
+        try:
+            return self._get_dirs().ls(path, detail, offset, limit)
+        except FileNotFoundError:
+            return []
+
+    def find(self, path, maxdepth=None, withdirs=False, detail=False, **kwargs):
+        try:
+            nodes = self._get_dirs().find(path, maxdepth, withdirs)
+        except FileNotFoundError:
+            nodes = []
+        if detail:
+            return {node["name"]: node for node in nodes}
+        return [node["name"] for node in nodes]
+
+    def glob(self, path, maxdepth=None, **kwargs):
+        dirs = self._get_dirs()
+        path = dirs.normalize(path)
+        if not has_magic(path):
+            try:
+                nodes = [dirs.info(dirs.lookup(path))]
+            except FileNotFoundError:
+                nodes = []
         else:
-            raise FileNotFoundError(path)
-
-    @cache
-    def ls(self, path, detail=True, **kwargs):
-        nodes, graph, table = self._get_dirs()
-        path = path or self.root_marker
-        if path in table:
-            u = table[path]
-            return [nodes[v] if detail else nodes[v]["name"] for v in graph[u]]
-        return []
-
-    def open(self, path, mode="rb"):
+            # Only the subtree under the non-magic part of the pattern is scanned
+            magic = min(i for i in (path.find(c) for c in "*?[") if i >= 0)
+            root = path[: path.rfind(self.root_marker, 0, magic)]
+            pattern = re.compile(glob_translate(path))
+            try:
+                nodes = dirs.find(root, maxdepth, withdirs=True)
+            except FileNotFoundError:
+                nodes = []
+            nodes = [node for node in nodes if pattern.match(node["name"])]
+        if kwargs.get("detail", False):
+            return {node["name"]: node for node in nodes}
+        return [node["name"] for node in nodes]
+
+    readahead: int = 0  # Default read-ahead depth (in blocks) of opened files
+
+    def open(self, path, mode="rb", readahead: int = None):
         assert mode == "rb", "only binary read-only mode is supported"
-        return AbCacheFile(self, path)
+        return AbCacheFile(
+            self, path, readahead=self.readahead if readahead is None else readahead
+        )
 
 
 fsspec.register_implementation("abcache", AbCacheFilesystem)
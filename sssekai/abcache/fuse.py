@@ -0,0 +1,287 @@
+"""FUSE adapter for AbCacheFilesystem.
+
+Compared to `fsspec.fuse`, which goes through `info` / `ls` and the unidirectional cache for
+every call, this adapter
+    - Tells the kernel to cache entries and attributes for `attr_timeout` seconds
+    - Backs reads with a persistent on-disk block store, keyed by bundle hash. Bundles are
+      downloaded in full in the background on open, and reads only wait for the range they need
+    - Lets the kernel page cache serve bundles that are already stored (`keep_cache`). Bundles
+      still being downloaded are read with `direct_io`, as their sizes in the index are inaccurate
+    - Optionally prefetches the dependency closure of a bundle when it's opened
+
+Requires fusepy, and FUSE on the host OS.
+"""
+
+import os, stat, errno, time, threading, itertools
+from logging import getLogger
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from . import AbCacheEntry
+from .fs import AbCacheFilesystem
+
+logger = getLogger("abcache.fuse")
+
+
+class AbCacheBlockStoreEntry:
+    """Download state of a bundle in the block store."""
+
+    path: str  # Where the content currently is. `.part` file until completed
+    size: int  # Bytes available on disk
+    done: bool
+    error: Exception = None
+
+    def __init__(self, path: str, size: int = 0, done: bool = False):
+        self.path, self.size, self.done = path, size, done
+        self.cond = threading.Condition()
+
+
+class AbCacheBlockStore:
+    """Persistent store of decrypted bundles, addressed by their hashes.
+
+    Bundles are filled sequentially by background downloads. Readers block until
+    the range they asked for is on disk, or the download has finished.
+    """
+
+    fs: AbCacheFilesystem
+    root: str
+    states: Dict[str, AbCacheBlockStoreEntry]
+
+    def __init__(self, fs: AbCacheFilesystem, root: str, workers: int = 4):
+        self.fs, self.root = fs, root
+        self.states = dict()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="abcache-fill")
+
+    def object_path(self, hash: str) -> str:
+        return os.path.join(self.root, hash[:2], hash)
+
+    def stored_size(self, entry: AbCacheEntry) -> int | None:
+        """Exact size of the bundle if it's completely stored. None otherwise."""
+        try:
+            return os.stat(self.object_path(entry.hash)).st_size
+        except FileNotFoundError:
+            return None
+
+    def fill(self, entry: AbCacheEntry) -> AbCacheBlockStoreEntry:
+        """Get the state of a bundle, starting its download if it isn't stored yet."""
+        with self.lock:
+            state = self.states.get(entry.hash, None)
+            if state is None or state.error:
+                path = self.object_path(entry.hash)
+                size = self.stored_size(entry)
+                if size is not None:
+                    state = AbCacheBlockStoreEntry(path, size, True)
+                else:
+                    state = AbCacheBlockStoreEntry(path + ".part")
+                    self.pool.submit(self.__download, entry, state, path)
+                self.states[entry.hash] = state
+            return state
+
+    def __download(self, entry: AbCacheEntry, state: AbCacheBlockStoreEntry, path: str):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self.fs.open(entry.bundleName) as src, open(state.path, "wb") as f:
+                while block := src.read(src.blocksize):
+                    f.write(block)
+                    f.flush()
+                    with state.cond:
+                        state.size += len(block)
+                        state.cond.notify_all()
+                src.verify()
+            with state.cond:
+                os.replace(state.path, path)
+                state.path = path
+        except Exception as e:
+            logger.error("While storing %s : %s" % (entry.bundleName, e))
+            state.error = e
+        finally:
+            with state.cond:
+                state.done = True
+                state.cond.notify_all()
+
+    def read(self, state: AbCacheBlockStoreEntry, offset: int, size: int) -> bytes:
+        with state.cond:
+            state.cond.wait_for(lambda: state.done or state.size >= offset + size)
+            # Content of failed downloads is never served, even the part that's on disk
+            if state.error:
+                raise OSError(errno.EIO, str(state.error))
+            # Opened while holding the lock, so the .part file can't be renamed in between
+            fd = os.open(state.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            return os.pread(fd, size, offset)
+        finally:
+            os.close(fd)
+
+    def discard(self, hash: str):
+        """Remove a stored bundle, unless it's being downloaded."""
+        with self.lock:
+            state = self.states.get(hash, None)
+            if state and not state.done:
+                return
+            self.states.pop(hash, None)
+            try:
+                os.remove(self.object_path(hash))
+            except FileNotFoundError:
+                pass
+
+
+class AbCacheFuseOperations:
+    """fusepy operations over an AbCacheFilesystem. Must be mounted with `raw_fi=True`.
+
+    Raised OSErrors are returned to the kernel as their errnos by fusepy.
+    """
+
+    fs: AbCacheFilesystem
+    store: AbCacheBlockStore
+    prefetch_deps: bool
+    attr_timeout: float
+
+    def __init__(
+        self,
+        fs: AbCacheFilesystem,
+        store: AbCacheBlockStore,
+        prefetch_deps: bool = False,
+        attr_timeout: float = 60,
+    ):
+        self.fs, self.store = fs, store
+        self.prefetch_deps, self.attr_timeout = prefetch_deps, attr_timeout
+        self.attrs = dict()  # path : stat. Only exact ones are kept
+        self.inexact = dict()  # path : time an inexact size was last reported
+        self.hashes = dict()  # bundleName : hash at the time it's stored
+        self.handles = dict()  # fh : AbCacheBlockStoreEntry
+        self.fh_counter = itertools.count(1)
+        self.mount_time = time.time()
+        fs.refresh_callbacks.append(self.invalidate)
+
+    def __call__(self, op, *args):
+        if not hasattr(self, op):
+            raise OSError(errno.EFAULT, op)
+        return getattr(self, op)(*args)
+
+    def invalidate(self, changed):
+        """Refresh callback. Drops cached attributes, and stored content of changed bundles."""
+        self.attrs.clear()
+        by_hash = self.fs.cache.query_index.by_hash
+        for name in changed:
+            hash = self.hashes.pop(name, None)
+            if hash and not by_hash.get(hash, None):
+                self.store.discard(hash)
+
+    def __entry(self, path: str) -> AbCacheEntry:
+        entry = self.fs.cache.get_entry_by_bundle_name(path.strip("/"))
+        if entry is None:
+            raise OSError(errno.ENOENT, path)
+        return entry
+
+    def __dir_attr(self):
+        t = self.mount_time
+        return dict(
+            st_mode=stat.S_IFDIR | 0o555,
+            st_nlink=2,
+            st_size=0,
+            st_atime=t,
+            st_mtime=t,
+            st_ctime=t,
+        )
+
+    def getattr(self, path, fh=None):
+        attr = self.attrs.get(path, None)
+        if attr is not None:
+            return attr
+        try:
+            info = self.fs.info(path)
+        except FileNotFoundError:
+            raise OSError(errno.ENOENT, path)
+        if info["type"] == "directory":
+            attr = self.attrs[path] = self.__dir_attr()
+            return attr
+        entry = self.__entry(path)
+        size = self.store.stored_size(entry)
+        attr = self.__dir_attr()
+        attr.update(st_mode=stat.S_IFREG | 0o444, st_nlink=1)
+        if size is None:
+            # Sizes in the index are inaccurate. Exact ones are known once stored
+            attr["st_size"] = entry.fileSize
+            self.inexact[path] = time.time()
+        else:
+            attr["st_size"] = size
+            self.attrs[path] = attr
+        return attr
+
+    def readdir(self, path, fh):
+        names = [".", ".."]
+        for info in self.fs.ls(path, detail=True):
+            name = info["name"]
+            if info["type"] == "directory":
+                self.attrs.setdefault(name, self.__dir_attr())
+            names.append(name.rsplit("/", 1)[-1])
+        return names
+
+    def open(self, path, fi):
+        entry = self.__entry(path)
+        state = self.store.fill(entry)
+        self.hashes[entry.bundleName] = entry.hash
+        if self.prefetch_deps:
+            cache = self.fs.cache
+            for dep in cache.get_or_update_dependency_tree_flatten(entry.bundleName):
+                if dep != entry.bundleName:
+                    self.store.fill(cache.get_entry_by_bundle_name(dep))
+        fi.fh = next(self.fh_counter)
+        self.handles[fi.fh] = state
+        # The kernel clamps page cache reads to the size it knows of. Which must be exact
+        stale = time.time() - self.inexact.get(path, 0) < self.attr_timeout
+        if state.done and not state.error and not stale:
+            fi.keep_cache, fi.direct_io = 1, 0
+        else:
+            fi.keep_cache, fi.direct_io = 0, 1
+        return 0
+
+    def read(self, path, size, offset, fi):
+        state = self.handles.get(fi.fh, None)
+        if state is None:
+            raise OSError(errno.EBADF, path)
+        return self.store.read(state, offset, size)
+
+    def release(self, path, fi):
+        self.handles.pop(fi.fh, None)
+        return 0
+
+
+def mount(
+    fs: AbCacheFilesystem,
+    mountpoint: str,
+    cache_dir: str,
+    workers: int = 4,
+    prefetch_deps: bool = False,
+    attr_timeout: float = 60,
+):
+    """Mount the filesystem read-only at `mountpoint`. Blocks until unmounted.
+
+    Args:
+        fs (AbCacheFilesystem): The filesystem to mount.
+        mountpoint (str): Local mount point.
+        cache_dir (str): Directory of the persistent block store.
+        workers (int, optional): Number of concurrent background downloads. Defaults to 4.
+        prefetch_deps (bool, optional): Prefetch the dependencies of opened bundles. Defaults to False.
+        attr_timeout (float, optional): Seconds the kernel may cache entries and attributes for. Defaults to 60.
+    """
+    try:
+        from fuse import FUSE
+    except (ImportError, OSError) as e:
+        logger.error(
+            "Please install sssekai[fuse] through your Python package manager, and FUSE on your OS to mount AbCache"
+        )
+        raise e
+    store = AbCacheBlockStore(fs, os.path.expanduser(cache_dir), workers)
+    operations = AbCacheFuseOperations(fs, store, prefetch_deps, attr_timeout)
+    logger.info("Mounting at %s. Block store at %s", mountpoint, store.root)
+    FUSE(
+        operations,
+        mountpoint,
+        foreground=True,
+        raw_fi=True,
+        ro=True,
+        entry_timeout=attr_timeout,
+        attr_timeout=attr_timeout,
+        negative_timeout=attr_timeout,
+    )
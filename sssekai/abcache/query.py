@@ -0,0 +1,374 @@
+"""Indexed queries over an AbCache index.
+
+Expressions are made of predicates combined with `and`, `or`, `not` and parentheses. i.e.
+    name ^= "live_pv/model/" and size > 1048576
+    category = "StartApp" or (isBuiltin = true and not name ~ "shader.*")
+    dependency = "shader/live" and status != "unchanged"
+
+Predicates are in the form of `<field> <op> <value>`, where
+    - field: any AbCacheEntry field (`name`, `size`, `builtin` and `dependency` are aliases
+      of `bundleName`, `fileSize`, `isBuiltin` and `dependencies`), or `status`
+    - op: one of `=`, `!=`, `<`, `<=`, `>`, `>=`, `^=` (prefix), `~` (regex match from the start)
+    - value: a double-quoted string (escape `"` and `\` with `\`), a number, `true`, `false` or `null`
+
+`dependency = X` selects bundles that directly depend on X.
+`status` is one of "added", "modified", "unchanged", compared against a diff index.
+
+Predicates on names, categories, hashes, builtin flags, dependencies and status are answered
+from the indices. Others are evaluated only on the candidates left by the indexed ones.
+"""
+
+import re, operator, threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Mapping, Set, List
+from . import AbCacheEntry
+
+FIELD_ALIASES = {
+    "name": "bundleName",
+    "size": "fileSize",
+    "builtin": "isBuiltin",
+    "dependency": "dependencies",
+}
+STATUS_OPTIONS = {"added", "modified", "unchanged"}
+COMPARE_OPS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class AbCacheQueryError(Exception):
+    pass
+
+
+def regex_literal_prefix(pattern: re.Pattern) -> str:
+    """Literal prefix every `pattern.match` hit must start with. Empty if there's none, or it can't be determined."""
+    if pattern.flags & re.IGNORECASE:
+        return ""
+    try:
+        try:
+            from re._parser import parse, LITERAL, AT
+        except ImportError:  # Python < 3.11
+            from sre_parse import parse, LITERAL, AT
+
+        prefix = []
+        for op, value in parse(pattern.pattern).data:
+            if op == LITERAL:
+                prefix.append(chr(value))
+            elif op == AT and not prefix:
+                continue
+            else:
+                break
+        return "".join(prefix)
+    except Exception:
+        return ""
+
+
+class AbCacheQueryIndex:
+    """Prefix and secondary indices of a bundle mapping.
+
+    The prefix index is the sorted list of bundle names. All names sharing a prefix are
+    contiguous in it, so prefix lookups are a pair of binary searches.
+
+    Queries hold `lock`, since the diff index and the status cache are per query.
+    """
+
+    bundles: Mapping[str, AbCacheEntry]
+    diff: Mapping[str, AbCacheEntry] = None
+
+    names: List[str]
+    by_category: Mapping[str, Set[str]]
+    by_builtin: Mapping[bool, Set[str]]
+    by_hash: Mapping[str, Set[str]]
+    by_dependency: Mapping[str, Set[str]]
+
+    def __init__(self, bundles: Mapping[str, AbCacheEntry]):
+        self.bundles = bundles
+        self.names = sorted(bundles)
+        self.by_category = defaultdict(set)
+        self.by_builtin = defaultdict(set)
+        self.by_hash = defaultdict(set)
+        self.by_dependency = defaultdict(set)
+        for name, entry in bundles.items():
+            self.by_category[entry.category].add(name)
+            self.by_builtin[bool(entry.isBuiltin)].add(name)
+            self.by_hash[entry.hash].add(name)
+            for dep in entry.dependencies or []:
+                self.by_dependency[dep].add(name)
+        self._status = None
+        self._status_diff = None
+        self.lock = threading.Lock()
+
+    def prefixed(self, prefix: str) -> List[str]:
+        lo = bisect_left(self.names, prefix)
+        hi = bisect_left(self.names, prefix + "\U0010ffff")
+        return self.names[lo:hi]
+
+    def status(self, diff: Mapping[str, AbCacheEntry]) -> Mapping[str, Set[str]]:
+        if self._status_diff is not diff:
+            status = {k: set() for k in STATUS_OPTIONS}
+            for name, entry in self.bundles.items():
+                other = diff.get(name, None)
+                if other is None:
+                    status["added"].add(name)
+                elif other.hash != entry.hash:
+                    status["modified"].add(name)
+                else:
+                    status["unchanged"].add(name)
+            self._status, self._status_diff = status, diff
+        return self._status
+
+
+# region AST
+class Node:
+    indexed = False
+
+    def select(self, index: AbCacheQueryIndex, candidates: Set[str] | None) -> Set[str]:
+        raise NotImplementedError
+
+
+class All(Node):
+    indexed = True
+
+    def select(self, index, candidates):
+        return set(index.bundles) if candidates is None else set(candidates)
+
+
+class And(Node):
+    def __init__(self, *children):
+        # Indexed predicates narrow down the candidates for the rest
+        self.children = sorted(children, key=lambda c: not c.indexed)
+        self.indexed = all(c.indexed for c in children)
+
+    def select(self, index, candidates):
+        for child in self.children:
+            candidates = child.select(index, candidates)
+            if not candidates:
+                break
+        return candidates
+
+
+class Or(Node):
+    def __init__(self, *children):
+        self.children = children
+        self.indexed = all(c.indexed for c in children)
+
+    def select(self, index, candidates):
+        result = set()
+        for child in self.children:
+            result |= child.select(index, candidates)
+        return result
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+        self.indexed = child.indexed
+
+    def select(self, index, candidates):
+        universe = set(index.bundles) if candidates is None else candidates
+        return universe - self.child.select(index, candidates)
+
+
+class Predicate(Node):
+    def __init__(self, field: str, op: str, value):
+        self.field = FIELD_ALIASES.get(field, field)
+        self.op, self.value = op, value
+        if self.field == "status":
+            if op not in {"=", "!="} or value not in STATUS_OPTIONS:
+                raise AbCacheQueryError(
+                    "status only supports = and != with one of %s" % STATUS_OPTIONS
+                )
+        elif self.field not in AbCacheEntry.__dataclass_fields__:
+            raise AbCacheQueryError("unknown field: %s" % field)
+        if op == "~":
+            self.pattern = re.compile(value)
+        self.indexed = (
+            self.field == "status"
+            or (self.field == "bundleName" and op in {"=", "^=", "~"})
+            or (
+                op == "="
+                and self.field in {"category", "isBuiltin", "hash", "dependencies"}
+            )
+        )
+        if self.field == "dependencies" and op not in {"=", "!="}:
+            raise AbCacheQueryError("dependency only supports = and !=")
+
+    def lookup(self, index: AbCacheQueryIndex):
+        """Matches from the indices. None if not applicable."""
+        field, op, value = self.field, self.op, self.value
+        if field == "status":
+            if index.diff is None:
+                raise AbCacheQueryError("status requires a diff index")
+            status = index.status(index.diff)
+            if op == "=":
+                return status[value]
+            return set().union(*(v for k, v in status.items() if k != value))
+        if field == "bundleName":
+            if op == "=":
+                return {value} if value in index.bundles else set()
+            if op == "^=":
+                return set(index.prefixed(value))
+            if op == "~":
+                prefix = regex_literal_prefix(self.pattern)
+                names = index.prefixed(prefix) if prefix else index.names
+                return {name for name in names if self.pattern.match(name)}
+        if op == "=":
+            match field:
+                case "category":
+                    return index.by_category.get(value, set())
+                case "isBuiltin":
+                    return index.by_builtin.get(bool(value), set())
+                case "hash":
+                    return index.by_hash.get(value, set())
+                case "dependencies":
+                    return index.by_dependency.get(value, set())
+        return None
+
+    def match(self, entry: AbCacheEntry) -> bool:
+        actual = getattr(entry, self.field)
+        match self.op:
+            case "^=":
+                return isinstance(actual, str) and actual.startswith(self.value)
+            case "~":
+                return isinstance(actual, str) and bool(self.pattern.match(actual))
+        if self.field == "dependencies":
+            return (self.value in (actual or [])) == (self.op == "=")
+        try:
+            return COMPARE_OPS[self.op](actual, self.value)
+        except TypeError:
+            return False
+
+    def select(self, index, candidates):
+        if self.indexed:
+            result = self.lookup(index)
+            return result & candidates if candidates is not None else set(result)
+        names = index.bundles if candidates is None else candidates
+        return {name for name in names if self.match(index.bundles[name])}
+
+
+# endregion
+
+# region Parser
+TOKEN_PATTERN = re.compile(
+    r"""\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<op>\^=|!=|<=|>=|=|<|>|~)|(?P<paren>[()])|(?P<word>[^\s()"=!<>~^]+))"""
+)
+
+
+def tokenize(expr: str):
+    pos, expr = 0, expr.rstrip()
+    while pos < len(expr):
+        m = TOKEN_PATTERN.match(expr, pos)
+        if not m:
+            raise AbCacheQueryError(
+                "unexpected character at %d: %s" % (pos, expr[pos:])
+            )
+        pos = m.end()
+        yield m.lastgroup, m.group(m.lastgroup)
+
+
+def parse_value(kind: str, token: str):
+    if kind == "string":
+        # Only quotes and backslashes are escaped. Regexes can be written as is
+        return re.sub(r'\\(["\\])', r"\1", token[1:-1])
+    match token:
+        case "true":
+            return True
+        case "false":
+            return False
+        case "null":
+            return None
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return token  # Bare words are strings
+
+
+def compile_query(expr: str) -> Node:
+    """Compile a query expression. See module docstring for the syntax.
+
+    Raises:
+        AbCacheQueryError: On syntax errors.
+    """
+    tokens = list(tokenize(expr or ""))
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def take(kind=None, value=None):
+        nonlocal pos
+        tk, tv = peek()
+        if tk is None or (kind and tk != kind) or (value and tv != value):
+            raise AbCacheQueryError(
+                "expected %s at token %d, got %s" % (value or kind, pos, tv)
+            )
+        pos += 1
+        return tv
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == ("word", "or"):
+            take()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else Or(*children)
+
+    def parse_and():
+        children = [parse_not()]
+        while peek() == ("word", "and"):
+            take()
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else And(*children)
+
+    def parse_not():
+        if peek() == ("word", "not"):
+            take()
+            return Not(parse_not())
+        if peek() == ("paren", "("):
+            take()
+            node = parse_or()
+            take("paren", ")")
+            return node
+        field = take("word")
+        op = take("op")
+        kind, token = peek()
+        if kind not in {"string", "word"}:
+            raise AbCacheQueryError("expected value after %s %s" % (field, op))
+        take()
+        return Predicate(field, op, parse_value(kind, token))
+
+    if not tokens:
+        return All()
+    node = parse_or()
+    if pos != len(tokens):
+        raise AbCacheQueryError("unexpected token: %s" % tokens[pos][1])
+    return node
+
+
+# endregion
+
+
+def query_bundles(
+    index: AbCacheQueryIndex, expr: str, diff: Mapping[str, AbCacheEntry] = None
+) -> List[str]:
+    """Evaluate a query expression against an index.
+
+    Args:
+        index (AbCacheQueryIndex): The index to query.
+        expr (str): The query expression. Empty expressions select everything.
+        diff (Mapping[str, AbCacheEntry], optional): Bundles to compare against for `status`.
+
+    Returns:
+        List[str]: Sorted names of the matching bundles.
+    """
+    node = compile_query(expr)
+    with index.lock:
+        index.diff = diff
+        return sorted(node.select(index, None))
@@ -0,0 +1,434 @@
+"""Storage backends for downloaded AssetBundles.
+
+Bundles are addressed by their names (POSIX-style relative paths). Available backends are
+    - AbCacheLocalStorage: One file per bundle under a directory
+    - AbCacheShardStorage: Bundles packed into large, append-only ZIP shards, with an index
+    - AbCacheObjectStorage: Bundles as objects written whole to any fsspec filesystem. i.e. a local
+      directory as an object store stand-in, or `s3://bucket/prefix` with s3fs installed
+
+Content written to a storage is only visible once committed. Small metadata files (i.e. download
+states) are stored alongside with `read_meta` and `write_meta`.
+"""
+
+import os, io, json, time, shutil, zipfile, tempfile, threading, warnings
+from logging import getLogger
+from typing import BinaryIO, Set, Tuple
+
+logger = getLogger("abcache.storage")
+
+# Bundles up to this size are buffered in memory before being stored
+SPOOL_SIZE = 16 << 20
+
+
+class AbCacheStorageWriter:
+    """Content being written to a storage. Discarded unless `commit` is called."""
+
+    def __init__(self, storage: "AbCacheStorage", name: str):
+        self.storage, self.name = storage, name
+        self.file = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        self.size = 0
+
+    def write(self, data) -> int:
+        n = self.file.write(data)
+        self.size += n
+        return n
+
+    def commit(self, name: str = None):
+        """Store the content as `name`. Defaults to the name the writer is created with."""
+        self.file.seek(0)
+        self.storage.put(name or self.name, self.file, self.size)
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AbCacheStorage:
+    """Base class of the storage backends."""
+
+    def names(self) -> Set[str]:
+        """Names of all stored bundles."""
+        raise NotImplementedError
+
+    def stat(self, name: str) -> Tuple[int, int]:
+        """(size, mtime in nanoseconds) of a stored bundle.
+
+        Raises:
+            FileNotFoundError: If it's not stored.
+        """
+        raise NotImplementedError
+
+    def open(self, name: str) -> BinaryIO:
+        """Open a stored bundle for reading."""
+        raise NotImplementedError
+
+    def put(self, name: str, src: BinaryIO, size: int):
+        """Store `size` bytes read from `src` as `name`."""
+        raise NotImplementedError
+
+    def remove(self, name: str):
+        raise NotImplementedError
+
+    def read_meta(self, name: str) -> bytes | None:
+        raise NotImplementedError
+
+    def write_meta(self, name: str, data: bytes):
+        raise NotImplementedError
+
+    def create(self, name: str) -> AbCacheStorageWriter:
+        return AbCacheStorageWriter(self, name)
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.stat(name)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def read_or_none(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class AbCacheLocalWriter(AbCacheStorageWriter):
+    """Writes to a `.tmp` file next to the destination, which is renamed on commit."""
+
+    def __init__(self, storage: "AbCacheLocalStorage", name: str):
+        self.storage, self.name = storage, name
+        self.tmp_path = storage.path(name) + ".tmp"
+        os.makedirs(os.path.dirname(self.tmp_path) or ".", exist_ok=True)
+        self.file = open(self.tmp_path, "wb")
+        self.size = 0
+
+    def commit(self, name: str = None):
+        self.file.close()
+        path = self.storage.path(name or self.name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        os.replace(self.tmp_path, path)
+
+    def close(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class AbCacheLocalStorage(AbCacheStorage):
+    """One file per bundle under `root`."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def names(self) -> Set[str]:
+        """Relative paths of all files under `root`, gathered in a single walk."""
+        files = set()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            rel = "" if rel == "." else rel + "/"
+            files.update(rel + filename for filename in filenames)
+        return files
+
+    def stat(self, name):
+        st = os.stat(self.path(name))
+        return st.st_size, st.st_mtime_ns
+
+    def open(self, name):
+        return open(self.path(name), "rb")
+
+    def put(self, name, src, size):
+        with self.create(name) as f:
+            shutil.copyfileobj(src, f.file)
+            f.commit()
+
+    def create(self, name):
+        return AbCacheLocalWriter(self, name)
+
+    def remove(self, name):
+        os.remove(self.path(name))
+
+    def read_meta(self, name):
+        return read_or_none(self.path(name))
+
+    def write_meta(self, name, data):
+        write_atomic(self.path(name), data)
+
+
+class AbCacheRangeReader(io.RawIOBase):
+    """Read-only view of a byte range of a file."""
+
+    def __init__(self, file: BinaryIO, offset: int, size: int):
+        self.file, self.offset, self.size = file, offset, size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.size - self.pos)
+        if n <= 0:
+            return 0
+        self.file.seek(self.offset + self.pos)
+        n = self.file.readinto(memoryview(b)[:n])
+        self.pos += n
+        return n
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        match whence:
+            case io.SEEK_CUR:
+                pos += self.pos
+            case io.SEEK_END:
+                pos += self.size
+        self.pos = max(pos, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class AbCacheShardStorage(AbCacheStorage):
+    """Bundles packed into append-only ZIP shards (`shard-00000.zip`, ...) under `root`.
+
+    Members are STORED (uncompressed). Shards stay readable with any ZIP tool once closed.
+    Every commit is also appended to an index (`shards.jsonl`) with the data offset of the
+    member. Reads go through the index, so members of shards left unclosed by a crash are
+    still readable. The latest record of a name wins. Removals are recorded as `"shard": null`.
+    """
+
+    INDEX = "shards.jsonl"
+    SHARD = "shard-%05d.zip"
+
+    def __init__(self, root: str, shard_size: int = 1 << 30):
+        self.root, self.shard_size = root, shard_size
+        self.lock = threading.Lock()
+        self.index = dict()  # name : (shard, offset, size, mtime)
+        self.shard_id = 0
+        self.zip: zipfile.ZipFile = None
+        self.index_file = None
+        for line in (read_or_none(self.path(self.INDEX)) or b"").splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn write
+            if record["shard"] is None:
+                self.index.pop(record["name"], None)
+                continue
+            self.index[record["name"]] = (
+                record["shard"],
+                record["offset"],
+                record["size"],
+                record["mtime"],
+            )
+            self.shard_id = max(self.shard_id, record["shard"])
+
+    @classmethod
+    def is_shard_storage(cls, root: str) -> bool:
+        return os.path.isfile(os.path.join(root, cls.INDEX))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def shard_path(self, shard: int) -> str:
+        return self.path(self.SHARD % shard)
+
+    def __append_index(self, record: dict):
+        if not self.index_file:
+            os.makedirs(self.root, exist_ok=True)
+            self.index_file = open(self.path(self.INDEX), "a", encoding="utf-8")
+        self.index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.index_file.flush()
+
+    def __shard(self) -> zipfile.ZipFile:
+        while not self.zip:
+            path = self.shard_path(self.shard_id)
+            if os.path.exists(path) and (
+                os.path.getsize(path) >= self.shard_size or not zipfile.is_zipfile(path)
+            ):
+                # Full, or left unclosed by a crash
+                self.shard_id += 1
+                continue
+            os.makedirs(self.root, exist_ok=True)
+            self.zip = zipfile.ZipFile(path, "a", zipfile.ZIP_STORED, allowZip64=True)
+        return self.zip
+
+    def names(self):
+        return set(self.index)
+
+    def stat(self, name):
+        record = self.index.get(name, None)
+        if record is None:
+            raise FileNotFoundError(name)
+        return record[2], record[3]
+
+    def open(self, name):
+        record = self.index.get(name, None)
+        if record is None:
+            raise FileNotFoundError(name)
+        shard, offset, size, _ = record
+        return io.BufferedReader(
+            AbCacheRangeReader(open(self.shard_path(shard), "rb"), offset, size)
+        )
+
+    def put(self, name, src, size):
+        with self.lock:
+            shard = self.__shard()
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = size
+            with warnings.catch_warnings():
+                warnings.simplefilter(
+                    "ignore"
+                )  # Duplicate names. The index has the latest one
+                with shard.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst)
+            end = shard.fp.tell()
+            shard.fp.flush()
+            mtime = time.time_ns()
+            self.index[name] = (self.shard_id, end - info.compress_size, size, mtime)
+            self.__append_index(
+                {
+                    "name": name,
+                    "shard": self.shard_id,
+                    "offset": end - info.compress_size,
+                    "size": size,
+                    "mtime": mtime,
+                }
+            )
+            if end >= self.shard_size:
+                shard.close()
+                self.zip = None
+                self.shard_id += 1
+
+    def remove(self, name):
+        with self.lock:
+            if self.index.pop(name, None) is None:
+                raise FileNotFoundError(name)
+            self.__append_index({"name": name, "shard": None})
+
+    def read_meta(self, name):
+        return read_or_none(self.path(name))
+
+    def write_meta(self, name, data):
+        write_atomic(self.path(name), data)
+
+    def close(self):
+        with self.lock:
+            if self.zip:
+                self.zip.close()
+                self.zip = None
+            if self.index_file:
+                self.index_file.close()
+                self.index_file = None
+
+
+class AbCacheObjectStorage(AbCacheStorage):
+    """Bundles as objects under `url` of any fsspec filesystem.
+
+    Objects are only ever written whole (uploaded to a temporary then committed), and no
+    directories are created besides the prefix. A local directory works as a stand-in
+    for object stores. `s3://bucket/prefix` works with s3fs installed.
+    """
+
+    def __init__(self, url: str):
+        import fsspec
+
+        self.fs, self.root = fsspec.core.url_to_fs(url)
+        self.root = self.root.rstrip("/")
+
+    def key(self, name: str) -> str:
+        return self.root + "/" + name
+
+    def names(self):
+        prefix = self.root + "/"
+        try:
+            return {key[len(prefix) :] for key in self.fs.find(self.root)}
+        except FileNotFoundError:
+            return set()
+
+    def stat(self, name):
+        info = self.fs.info(self.key(name))
+        if info["type"] != "file":
+            raise FileNotFoundError(name)
+        mtime = (
+            info.get("mtime", None)
+            or info.get("LastModified", None)
+            or info.get("created", 0)
+        )
+        if hasattr(mtime, "timestamp"):
+            mtime = mtime.timestamp()
+        return info["size"], int(mtime * 1e9)
+
+    def open(self, name):
+        return self.fs.open(self.key(name), "rb")
+
+    def put(self, name, src, size):
+        key = self.key(name)
+        self.fs.makedirs(self.fs._parent(key), exist_ok=True)
+        f = self.fs.open(key, "wb", autocommit=False)
+        try:
+            shutil.copyfileobj(src, f)
+            f.close()
+            f.commit()
+        except Exception:
+            f.discard()
+            raise
+
+    def remove(self, name):
+        self.fs.rm_file(self.key(name))
+
+    def read_meta(self, name):
+        try:
+            return self.fs.cat_file(self.key(name))
+        except FileNotFoundError:
+            return None
+
+    def write_meta(self, name, data):
+        self.put(name, io.BytesIO(data), len(data))
+
+
+STORAGE_BACKENDS = {
+    "local": AbCacheLocalStorage,
+    "shards": AbCacheShardStorage,
+    "objects": AbCacheObjectStorage,
+}
+
+
+def open_storage(root: str) -> AbCacheStorage:
+    """Open an existing download directory for reading, with the backend it's written with."""
+    if AbCacheShardStorage.is_shard_storage(root):
+        return AbCacheShardStorage(root)
+    return AbCacheLocalStorage(root)
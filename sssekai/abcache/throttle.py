@@ -0,0 +1,121 @@
+"""Adaptive request throttling for AbCache sessions."""
+
+import time, threading
+from email.utils import parsedate_to_datetime
+from logging import getLogger
+
+logger = getLogger("abcache.throttle")
+
+THROTTLE_STATUS = {429, 503}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a `Retry-After` header (delay-seconds or an HTTP-date). None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AbCacheThrottle:
+    """AIMD concurrency limit shared by all requests of a session.
+
+    - At most `limit` requests are in flight. Others wait for a slot
+    - Each success raises the limit by `increase / limit`, i.e. about `increase` per round of requests,
+      up to `max_limit`
+    - Throttled responses (429, 503) multiply the limit by `decrease`, and pause new requests until
+      `Retry-After` has passed, or for an exponential backoff without one. The limit is only
+      decreased once per pause, as concurrent requests are likely throttled together
+    """
+
+    max_limit: int
+    min_limit: int
+    limit: float
+    in_flight: int
+
+    def __init__(
+        self,
+        max_limit: int = 10,
+        min_limit: int = 1,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.max_limit, self.min_limit = max_limit, min_limit
+        self.increase, self.decrease = increase, decrease
+        self.base_backoff, self.max_backoff = base_backoff, max_backoff
+        self.limit = max_limit
+        self.in_flight = 0
+        self.resume_at = 0  # time.monotonic() until which new requests are paused
+        self.consecutive = 0  # Throttled responses since the last success
+        self.cond = threading.Condition()
+
+    def resize(self, max_limit: int):
+        with self.cond:
+            unthrottled = self.limit >= self.max_limit
+            self.max_limit = max(max_limit, self.min_limit)
+            self.limit = (
+                self.max_limit if unthrottled else min(self.limit, self.max_limit)
+            )
+            self.cond.notify_all()
+
+    def acquire(self):
+        """Wait for a slot. Must be paired with `release`."""
+        with self.cond:
+            while True:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    self.cond.wait(pause)
+                elif self.in_flight >= int(self.limit):
+                    self.cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def success(self):
+        with self.cond:
+            self.consecutive = 0
+            if self.limit < self.max_limit:
+                self.limit = min(
+                    self.limit + self.increase / self.limit, self.max_limit
+                )
+                self.cond.notify_all()
+
+    def backoff(self, retry_after: float | None = None) -> float:
+        """Record a throttled response. Returns the seconds new requests are paused for."""
+        with self.cond:
+            now = time.monotonic()
+            self.consecutive += 1
+            delay = retry_after
+            if delay is None:
+                delay = min(
+                    self.base_backoff * (1 << min(self.consecutive - 1, 16)),
+                    self.max_backoff,
+                )
+            if now >= self.resume_at:
+                self.limit = max(self.limit * self.decrease, self.min_limit)
+                logger.warning(
+                    "Throttled. Pausing for %.1fs, concurrency limit lowered to %d"
+                    % (delay, self.limit)
+                )
+            self.resume_at = max(self.resume_at, now + delay)
+            return self.resume_at - now
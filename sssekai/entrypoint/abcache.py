@@ -1,13 +1,110 @@
-import os, re, json, time
-from sssekai.abcache import AbCache, AbCacheEntry, logger, REGION_JP_EN, REGION_ROW
+import os, re, sys, json, time, shutil, threading
+from typing import Tuple
+from sssekai.abcache import (
+    AbCache,
+    AbCacheConfig,
+    AbCacheEntry,
+    AbCacheIntegrityError,
+    logger,
+    REGION_JP_EN,
+    REGION_ROW,
+)
 from sssekai.abcache.fs import AbCacheFilesystem, AbCacheFile
+from sssekai.abcache.storage import (
+    AbCacheStorage,
+    AbCacheStorageWriter,
+    AbCacheLocalStorage,
+    STORAGE_BACKENDS,
+)
+from sssekai.profiling import span
 from concurrent.futures import ThreadPoolExecutor
 from requests import Session
 from tqdm import tqdm
 
+
+class AbCacheDownloadState:
+    """Persistent download states of a download storage.
+
+    Bundles that passed the integrity checks are recorded with their index hash, and
+    the size/mtime of what's stored. Bundles matching their records are known-good and
+    won't need to be downloaded or checked again.
+
+    Throughputs of the recent download runs are kept as well for estimating download times.
+    """
+
+    FILENAME = ".abcache_state.json"
+    THROUGHPUT_HISTORY = 16
+
+    storage: AbCacheStorage
+    verified: dict
+    throughput: list  # [[bytes, seconds], ...]
+
+    def __init__(self, storage: AbCacheStorage):
+        self.storage = storage
+        self.verified = dict()
+        self.throughput = list()
+        self.lock = threading.Lock()
+        try:
+            state = storage.read_meta(self.FILENAME)
+            if state:
+                state = json.loads(state)
+                self.verified = state.get("verified", dict())
+                self.throughput = state.get("throughput", list())
+        except Exception as e:
+            logger.warning("Ignoring corrupt download state %s: %s", self.FILENAME, e)
+
+    def is_verified(self, entry: AbCacheEntry) -> bool:
+        record = self.verified.get(entry.bundleName, None)
+        if not record or record["hash"] != entry.hash:
+            return False
+        try:
+            return [record["size"], record["mtime"]] == list(
+                self.storage.stat(entry.bundleName)
+            )
+        except OSError:
+            return False
+
+    def is_stale(self, entry: AbCacheEntry) -> bool:
+        record = self.verified.get(entry.bundleName, None)
+        return record is not None and record["hash"] != entry.hash
+
+    def mark_verified(self, entry: AbCacheEntry):
+        size, mtime = self.storage.stat(entry.bundleName)
+        with self.lock:
+            self.verified[entry.bundleName] = {
+                "hash": entry.hash,
+                "size": size,
+                "mtime": mtime,
+            }
+
+    def record_throughput(self, nbytes: int, seconds: float):
+        if nbytes > 0 and seconds > 0:
+            with self.lock:
+                self.throughput.append([nbytes, seconds])
+                self.throughput = self.throughput[-self.THROUGHPUT_HISTORY :]
+
+    @property
+    def estimated_throughput(self) -> float | None:
+        """Bytes per second over the recorded runs. None if nothing has been recorded."""
+        seconds = sum(t for _, t in self.throughput)
+        return sum(n for n, _ in self.throughput) / seconds if seconds else None
+
+    def save(self):
+        with self.lock:
+            state = {"verified": self.verified, "throughput": self.throughput}
+            self.storage.write_meta(self.FILENAME, json.dumps(state).encode("utf-8"))
+
+
 class AbCacheDownloader(ThreadPoolExecutor):
-    session: Session
+    session: AbCacheFilesystem
+    storage: AbCacheStorage
     progress: tqdm = None
+    state: AbCacheDownloadState = None
+    verify: bool = True
+    quarantine_prefix: str = None
+
+    RETRIES = 3
+    QUARANTINE = ".quarantine/"  # Where corrupt downloads are moved to by main_abcache
 
     def _ensure_progress(self):
         if not self.progress:
@@ -18,21 +115,26 @@ class AbCacheDownloader(ThreadPoolExecutor):
                 unit_divisor=1024,
             )
 
+    def _quarantine(self, src: AbCacheFile, f: AbCacheStorageWriter):
+        if self.quarantine_prefix:
+            name = self.quarantine_prefix + src.path.strip("/")
+            f.commit(name)
+            logger.critical("Quarantined %s -> %s", src.path, name)
+
     def _download(self, args):
         if self._shutdown:
             return
         self._ensure_progress()
-        RETRIES = 1
         src, dest = args
         src: AbCacheFile
         dest: str
-        tmp_dest = dest + ".tmp"
-        for _ in range(0, RETRIES):
+        for attempt in range(0, self.RETRIES):
             n_written = 0
+            if attempt:
+                # Files are read sequentially. Retries need a fresh stream.
+                src = src.fs.open(src.path)
             try:
-                if os.path.dirname(dest):
-                    os.makedirs(os.path.dirname(dest), exist_ok=True)                
-                with open(tmp_dest, "wb") as f:
+                with self.storage.create(dest) as f:
                     while block := src.read(65536):
                         n_block = f.write(block)
                         self.progress.update(n_block)
@@ -40,22 +142,44 @@ class AbCacheDownloader(ThreadPoolExecutor):
                         if self._shutdown:
                             self.progress.update(-n_written)
                             return
-                os.replace(tmp_dest, dest)
+                    if self.verify:
+                        try:
+                            src.verify()
+                        except AbCacheIntegrityError:
+                            if attempt == self.RETRIES - 1:
+                                self._quarantine(src, f)
+                            raise
+                    f.commit()
+                if self.verify and self.state:
+                    self.state.mark_verified(src.entry)
                 return
+            except AbCacheIntegrityError as e:
+                logger.error("While verifying %s : %s. Retrying" % (src.path, e))
+                self.progress.update(-n_written)
             except Exception as e:
                 logger.error("While downloading %s : %s. Retrying" % (src.path, e))
                 self.progress.update(-n_written)
-                os.remove(tmp_dest) if os.path.exists(tmp_dest) else None
-                time.sleep(1)                
+            time.sleep(1)
 
-        if _ == RETRIES - 1:
-            logger.critical("Did not download %s" % src.path)
+        logger.critical("Did not download %s" % src.path)
         self._ensure_progress()
 
     queue: list
 
-    def __init__(self, session, **kw) -> None:
+    def __init__(
+        self,
+        session,
+        storage: AbCacheStorage,
+        state: AbCacheDownloadState = None,
+        verify: bool = True,
+        quarantine_prefix: str = None,
+        **kw
+    ) -> None:
         self.session = session
+        self.storage = storage
+        self.state = state
+        self.verify = verify
+        self.quarantine_prefix = quarantine_prefix
         self.queue = []
         super().__init__(**kw)
 
@@ -66,13 +190,31 @@ class AbCacheDownloader(ThreadPoolExecutor):
         return super().__exit__(exc_type, exc_val, exc_tb)
 
     def add_link(self, file: AbCacheFile, dest: str):
+        """Queue a download of `file`, stored as `dest` in the storage."""
         self._ensure_progress()
         self.progress.total += file.size
         return self.queue.append((file, dest))
 
     def run_until_complete(self):
-        for _ in self.map(self._download, self.queue):
-            pass
+        self._ensure_progress()
+        t0, n0 = time.time(), self.progress.n
+        try:
+            for _ in self.map(self._download, self.queue):
+                pass
+        finally:
+            if self.state:
+                self.state.record_throughput(self.progress.n - n0, time.time() - t0)
+                self.state.save()
+
+
+def log_connection_stats(cache: AbCache):
+    for host, stats in cache.connection_stats().items():
+        requests, connections = stats["requests"], stats["connections"]
+        reused = 100 * (1 - connections / requests) if requests else 0
+        logger.info(
+            "Connections to %s: %d requests over %d connections (%.1f%% reused)"
+            % (host, requests, connections, reused)
+        )
 
 
 def dump_dict_by_keys(d: dict, dir: str, keep_compact: bool):
@@ -98,40 +240,466 @@ def dump_dict_by_keys(d: dict, dir: str, keep_compact: bool):
             logger.info("Saved %s", save_as)
 
 
-def main_abcache(args):
-    db_path = os.path.expanduser(args.db)
+def try_auth(cache: AbCache):
+    config = cache.config
+    try:
+        if not config.auth_available:
+            logger.warning("No *valid* auth info provided.")
+            # Register as anonymous user in this case
+            if config.app_region in REGION_JP_EN:
+                from sssekai.abcache.auth import register_as_anonymous_user_sega
+
+                logger.warning("Registering as an anonymous user on SEGA servers.")
+                register_as_anonymous_user_sega(cache)
+            else:
+                logger.warning("No *valid* auth info provided for ROW region.")
+                logger.warning(
+                    "Anonymous user registration is not supported for those regions. You may encounter errors."
+                )
+        else:
+            if config.auth_available:
+                logger.info(
+                    "Using cached auth credential. UserId=%s" % cache.SEKAI_USERID
+                )
+        return config.auth_available
+    except Exception as e:
+        logger.error("Failed to authenticate: %s", e)
+        return False
+
+
+def open_cache(
+    db_path: str, config: AbCacheConfig = None, proxy: str = None
+) -> AbCache | None:
+    """Load the cache database at `db_path`, and prepare it for requests.
+
+    Args:
+        db_path (str): Path to the cache database.
+        config (AbCacheConfig, optional): Replaces the loaded config. The database is reset if the region differs. If None, the database must be loadable.
+        proxy (str, optional): HTTP(S) proxy for all requests.
+
+    Returns:
+        AbCache | None: The cache. None if no `config` is given and the database could not be loaded.
+    """
     cache: AbCache = AbCache()
     try:
-        with open(db_path, "rb") as f:
+        with span("load"), open(db_path, "rb") as f:
             cache = AbCache.from_file(f)
     except Exception as e:
         logger.error("Failed to load cache from %s: %s", db_path, e)
         logger.warning("Force rebuilding cache from scratch.")
-        if args.no_update:
+        if config is None:
             logger.error(
                 "no_update is specified, but no valid cache file is found. AbCache will not exit."
             )
-            return
+            return None
+    if config is not None:
+        if cache.config.app_region != config.app_region:
+            logger.warning(
+                "Region differs. (%s->%s) Resetting database."
+                % (cache.config.app_region, config.app_region)
+            )
+            cache.database.reset()
+        config.version = cache.config.version
+        cache.config = config
+    if proxy:
+        logger.info("Overriding proxy: %s", proxy)
+        cache.proxies = {"http": proxy, "https": proxy}
+    if cache.config.app_region in {"jp"}:
+        # CloudFront cookies. Downloads are 403'd without fresh ones
+        cache.update_signatures()
+    return cache
+
 
+def update_and_save(cache: AbCache, db_path: str):
+    """Update the AssetBundle index (and client headers when needed), then save the cache to `db_path`."""
     config = cache.config
+    if config.need_client_header_update:
+        if config.app_region in REGION_JP_EN:
+            assert try_auth(
+                cache
+            ), "Cannot update client headers without auth info. NOTE: You can fill in the EN/JP override fields (`--app-asset-...`) to bypass auth."
+        cache.update_client_headers()
+    cache.update_abcache_index()
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with open(db_path, "wb") as f:
+        cache.save(f)
 
-    if not args.no_update:
-        if config.app_region != args.app_region:
-            logger.warning("Region differs. (%s->%s) Resetting database." % (config.app_region, args.app_region))
-            config.app_region = args.app_region
-            cache.database.reset()
-        config.app_version = args.app_version
-        config.app_platform = args.app_platform        
-        config.app_hash = args.app_appHash
-        config.row_ab_version = args.app_abVersion
-        config.asset_hash = args.app_asset_hash
-        config.asset_host = args.app_asset_host
-        config.asset_version = args.app_asset_version
-        config.auth_credential = args.auth_credential
-
-    if args.proxy:
-        logger.info("Overriding proxy: %s", args.proxy)
-        cache.proxies = {"http": args.proxy, "https": args.proxy}
+
+def select_bundles(
+    cache: AbCache,
+    filter: str = None,
+    filter_cache_diff: str = None,
+    ensure_deps: bool = False,
+    query: str = None,
+) -> Tuple[set, set]:
+    """Select bundle names from the index of `cache`.
+
+    Args:
+        cache (AbCache): The cache to select from.
+        filter (str, optional): Regex pattern matched against the bundle names.
+        filter_cache_diff (str, optional): Path to another cache database. Only bundles with different hashes from it are selected.
+        ensure_deps (bool, optional): Include the dependencies of the selected bundles.
+        query (str, optional): Query expression. See `sssekai.abcache.query` for the syntax.
+
+    Returns:
+        Tuple[set, set]: Selected bundle names with their dependencies, and without
+    """
+    exprs, diff_cache = [], None
+    if filter:
+        logger.info("Filtering bundles with regex pattern: %s", filter)
+        exprs.append("name ~ %s" % json.dumps(filter, ensure_ascii=False))
+    if filter_cache_diff:
+        logger.info("Filtering bundles with cache diff")
+        diff_path = os.path.abspath(os.path.expanduser(filter_cache_diff))
+        logger.info("Loading cache diff from %s", diff_path)
+        with open(diff_path, "rb") as f:
+            diff_cache = AbCache.from_file(f)
+        exprs.append('status != "unchanged"')
+    if query:
+        logger.info("Filtering bundles with query: %s", query)
+        exprs.append("(%s)" % query)
+    if not exprs:
+        logger.warning("No filter pattern specified. All bundles will be selected.")
+    bundles = set(cache.query(" and ".join(exprs), diff_cache))
+    basebundles = bundles.copy()
+    logger.info("Selected %d bundles", len(basebundles))
+    if ensure_deps:
+        for bundleName in basebundles:
+            cache.get_or_update_dependency_tree_flatten(bundleName, bundles)
+        logger.info("Added %d dependencies", len(bundles - basebundles))
+    return bundles, basebundles
+
+
+def plan_downloads(
+    cache: AbCache,
+    bundles: set,
+    storage: AbCacheStorage,
+    state: AbCacheDownloadState,
+    no_overwrite: bool,
+    verify: bool = True,
+):
+    """Split the selected bundles into ones to download, and ones already present.
+
+    Present files the download state has verified are skipped. Ones it hasn't, or that no longer
+    match its records, are downloaded again. Without `verify` nothing is ever recorded, and
+    `no_overwrite` skips the present files the download state doesn't mark as stale instead.
+
+    Returns:
+        (list, list): Bundle names to download, and bundle names present locally.
+    """
+    files = storage.names()
+    pending, present = list(), list()
+    for bundleName in sorted(bundles):
+        if bundleName in files:
+            present.append(bundleName)
+            entry = cache.get_entry_by_bundle_name(bundleName)
+            if state.is_verified(entry):
+                continue
+            if not verify and no_overwrite and not state.is_stale(entry):
+                continue
+        pending.append(bundleName)
+    return pending, present
+
+
+def download_plan(
+    cache: AbCache,
+    bundles: set,
+    basebundles: set,
+    pending: list,
+    present: list,
+    state: AbCacheDownloadState,
+) -> dict:
+    """The download plan of the selected bundles. See `write_download_plan`."""
+    entries = cache.abcache_index.bundles
+    size_of = lambda names: sum(entries[name].fileSize for name in names)
+    pending_size = size_of(pending)
+    throughput = state.estimated_throughput
+    plan = {
+        "selected": len(basebundles),
+        "dependencies": len(bundles - basebundles),
+        "present": len(present),
+        "verified": sum(state.is_verified(entries[name]) for name in present),
+        "pending": len(pending),
+        "selected_bytes": size_of(bundles),
+        "present_bytes": size_of(present),
+        "pending_bytes": pending_size,
+        "throughput": throughput,
+        "eta": pending_size / throughput if throughput else None,
+        "bundles": [
+            {
+                "bundleName": name,
+                "fileSize": entries[name].fileSize,
+                "dependency": name not in basebundles,
+            }
+            for name in pending
+        ],
+    }
+    return plan
+
+
+def write_download_plan(path: str, plan: dict):
+    """Write a JSON download plan to `path`. '-' for stdout."""
+    # json.dump() streams through the pure Python encoder. dumps() uses the C one
+    data = json.dumps(plan, ensure_ascii=False)
+    if path == "-":
+        sys.stdout.write(data)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+
+def load_sync_configs(path: str) -> list:
+    """Load the sync config list from a JSON file.
+
+    The file should contain a list of objects with `AbCacheConfig` fields, and optionally
+    `db` for the cache database path. i.e.
+        [{"app_region": "jp", "app_platform": "android", "app_version": "...", "app_hash": "...", "db": "~/.sssekai/jp.db"}, ...]
+
+    Returns:
+        list: List of (db_path, AbCacheConfig)
+    """
+    from sssekai.abcache import AbCacheConfig, fromdict
+
+    with open(os.path.expanduser(path), "r", encoding="utf-8") as f:
+        items = json.load(f)
+    configs = []
+    for item in items:
+        item = dict(item)
+        db_path = item.pop("db", None) or "~/.sssekai/abcache_%s_%s.db" % (
+            item["app_region"],
+            item.get("app_platform", "android"),
+        )
+        item.setdefault("app_platform", "android")
+        item.setdefault("app_version", "")
+        item.setdefault("app_hash", "")
+        configs.append((os.path.expanduser(db_path), fromdict(AbCacheConfig, item)))
+    return configs
+
+
+def download_bundles(
+    args,
+    cache: AbCache,
+    storage: AbCacheStorage,
+    download_dir: str,
+    bundles: set,
+    basebundles: set,
+):
+    """Plan, then download (or dump the plan of) the selected bundles into `storage`."""
+    state = AbCacheDownloadState(storage)
+    pending, present = plan_downloads(
+        cache,
+        bundles,
+        storage,
+        state,
+        args.download_no_overwrite,
+        not args.download_no_verify,
+    )
+    if args.download_plan:
+        plan = download_plan(cache, bundles, basebundles, pending, present, state)
+        write_download_plan(args.download_plan, plan)
+        return 0
+    cache.configure_pool(args.download_workers, block=True)
+    fs = AbCacheFilesystem(cache_obj=cache)
+    fs.readahead = args.download_readahead
+    with AbCacheDownloader(
+        fs,
+        storage,
+        state=state,
+        verify=not args.download_no_verify,
+        quarantine_prefix=AbCacheDownloader.QUARANTINE,
+        max_workers=args.download_workers,
+    ) as downloader:
+        logger.info(
+            "Downloading %d bundles to %s (%d present, %d skipped)"
+            % (len(pending), download_dir, len(present), len(bundles) - len(pending))
+        )
+        for bundleName in pending:
+            downloader.add_link(fs.open(bundleName), bundleName)
+        try:
+            downloader.run_until_complete()
+        except KeyboardInterrupt:
+            logger.warning("Download interrupted by user.")
+            downloader.shutdown(wait=False, cancel_futures=True)
+            return 1
+    log_connection_stats(cache)
+    return 0
+
+
+def main_abcache_sync(args):
+    """Refresh the indices of multiple configs concurrently, then download the union of
+    their selections into a shared, content-addressed store.
+
+    Bundles are deduplicated by their index hash. Objects are stored as `.objects/<hash[:2]>/<hash>`
+    in the download directory, and each config gets a hard-linked view at `<region>/<platform>/<bundleName>`.
+    Objects are never downloaded twice. With `--download-no-overwrite`, existing view files are kept as well.
+    """
+    if args.download_filter_cache_diff:
+        logger.error(
+            "--download-filter-cache-diff is not supported with --sync-configs. Use --download-query per sync run instead."
+        )
+        return 1
+    configs = load_sync_configs(args.sync_configs)
+    logger.info("Syncing %d configs", len(configs))
+
+    def _refresh(item):
+        db_path, config = item
+        try:
+            cache = open_cache(db_path, config, args.proxy)
+        except Exception as e:
+            logger.error(
+                "Cache setup failure (%s %s): %s. Skipping.",
+                config.app_region,
+                config.app_platform,
+                e,
+            )
+            return None
+        if not args.no_update:
+            try:
+                update_and_save(cache, db_path)
+            except Exception as e:
+                logger.warning(
+                    "Cache update failure (%s %s): %s",
+                    config.app_region,
+                    config.app_platform,
+                    e,
+                )
+        if cache.abcache_index is None:
+            logger.error(
+                "No index available for %s %s. Skipping.",
+                config.app_region,
+                config.app_platform,
+            )
+            return None
+        return cache
+
+    with ThreadPoolExecutor(max_workers=len(configs) or 1) as executor:
+        caches = [cache for cache in executor.map(_refresh, configs) if cache]
+    if not args.download_dir:
+        return 0
+
+    download_dir = os.path.expanduser(args.download_dir)
+    if args.download_storage != "local":
+        logger.warning("Views are hard links. Syncing with local storage instead.")
+    object_name = lambda entry: ".objects/%s/%s" % (entry.hash[:2], entry.hash)
+    object_path = lambda entry: os.path.join(download_dir, object_name(entry))
+    view_path = lambda cache, entry: os.path.join(
+        download_dir,
+        cache.config.app_region,
+        cache.config.app_platform,
+        entry.bundleName,
+    )
+    # Plan
+    objects = dict()  # hash : (fs, entry)
+    views = list()  # (object path, view path)
+    plans = list()  # Per config
+    total_size = 0
+    logger.info("Plan:")
+    for cache in caches:
+        cache.configure_pool(args.download_workers, block=True)
+        fs = AbCacheFilesystem(cache_obj=cache)
+        fs.readahead = args.download_readahead
+        bundles, _ = select_bundles(
+            cache,
+            args.download_filter,
+            None,
+            args.download_ensure_deps,
+            args.download_query,
+        )
+        size = 0
+        for bundleName in bundles:
+            entry = cache.get_entry_by_bundle_name(bundleName)
+            size += entry.fileSize
+            objects.setdefault(entry.hash, (fs, entry))
+            views.append((object_path(entry), view_path(cache, entry)))
+        total_size += size
+        plans.append(
+            {
+                "app_region": cache.config.app_region,
+                "app_platform": cache.config.app_platform,
+                "selected": len(bundles),
+                "selected_bytes": size,
+            }
+        )
+        logger.info(
+            "   - %s %s: %d bundles, %d bytes",
+            cache.config.app_region,
+            cache.config.app_platform,
+            len(bundles),
+            size,
+        )
+    pending = {
+        hash: (fs, entry)
+        for hash, (fs, entry) in objects.items()
+        if not os.path.exists(object_path(entry))
+    }
+    pending_size = sum(entry.fileSize for fs, entry in pending.values())
+    logger.info(
+        "Total: %d bundles (%d bytes), %d unique (%d bytes), %d to download (%d bytes)",
+        len(views),
+        total_size,
+        len(objects),
+        sum(entry.fileSize for fs, entry in objects.values()),
+        len(pending),
+        pending_size,
+    )
+    if args.download_plan:
+        plan = {
+            "configs": plans,
+            "selected": len(views),
+            "selected_bytes": total_size,
+            "unique": len(objects),
+            "unique_bytes": sum(entry.fileSize for fs, entry in objects.values()),
+            "pending": len(pending),
+            "pending_bytes": pending_size,
+            "bundles": [
+                {
+                    "bundleName": entry.bundleName,
+                    "hash": entry.hash,
+                    "fileSize": entry.fileSize,
+                }
+                for fs, entry in pending.values()
+            ],
+        }
+        write_download_plan(args.download_plan, plan)
+        return 0
+    # Execute
+    with AbCacheDownloader(
+        None,
+        AbCacheLocalStorage(download_dir),
+        verify=not args.download_no_verify,
+        quarantine_prefix=AbCacheDownloader.QUARANTINE,
+        max_workers=args.download_workers,
+    ) as downloader:
+        for fs, entry in pending.values():
+            downloader.add_link(fs.open(entry.bundleName), object_name(entry))
+        try:
+            downloader.run_until_complete()
+        except KeyboardInterrupt:
+            logger.warning("Download interrupted by user.")
+            downloader.shutdown(wait=False, cancel_futures=True)
+            return 1
+    for cache in caches:
+        log_connection_stats(cache)
+    for src, dst in views:
+        if not os.path.exists(src):
+            continue
+        if os.path.exists(dst):
+            if args.download_no_overwrite or os.path.samefile(src, dst):
+                continue
+            os.remove(dst)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+    return 0
+
+
+def main_abcache(args):
+    if args.sync_configs:
+        return main_abcache_sync(args)
+    db_path = os.path.expanduser(args.db)
 
     if args.download_filter_cache_diff:
         diff_path = os.path.abspath(os.path.expanduser(args.download_filter_cache_diff))
@@ -140,39 +708,28 @@ def main_abcache(args):
             diff_path != curr_path
         ), "Cache diff path must be different from current cache path! Make a copy of the diff cache if this is required."
 
-    def try_auth():
-        try:
-            if not config.auth_available:
-                logger.warning("No *valid* auth info provided.")
-                # Register as anonymous user in this case
-                if config.app_region in REGION_JP_EN:
-                    from sssekai.abcache.auth import register_as_anonymous_user_sega
-
-                    logger.warning("Registering as an anonymous user on SEGA servers.")
-                    register_as_anonymous_user_sega(cache)
-                else:
-                    logger.warning("No *valid* auth info provided for ROW region.")
-                    logger.warning(
-                        "Anonymous user registration is not supported for those regions. You may encounter errors."
-                    )
-            else:
-                if config.auth_available:
-                    logger.info(
-                        "Using cached auth credential. UserId=%s" % cache.SEKAI_USERID
-                    )
-            return config.auth_available
-        except Exception as e:
-            logger.error("Failed to authenticate: %s", e)
-            return False
-
-
-    if config.app_region in {"jp"}:
-        cache.update_signatures()
+    config = None
+    if not args.no_update:
+        config = AbCacheConfig(
+            args.app_region,
+            args.app_version,
+            args.app_platform,
+            args.app_appHash,
+            auth_credential=args.auth_credential,
+            row_ab_version=args.app_abVersion,
+            asset_host=args.app_asset_host,
+            asset_version=args.app_asset_version,
+            asset_hash=args.app_asset_hash,
+        )
+    cache = open_cache(db_path, config, args.proxy)
+    if cache is None:
+        return
+    config = cache.config
 
     if args.dump_master_data:
         if config.app_region in REGION_JP_EN:
             assert (
-                try_auth()
+                try_auth(cache)
             ), "Cannot dump master data without valid auth info in EN/JP servers."
         cache.update_client_headers()
         master_data_path = os.path.expanduser(args.dump_master_data)
@@ -186,7 +743,7 @@ def main_abcache(args):
         return
 
     if args.dump_user_data:
-        assert try_auth(), "Cannot dump user data without valid auth info."
+        assert try_auth(cache), "Cannot dump user data without valid auth info."
         cache.update_client_headers()
         user_data_path = os.path.expanduser(args.dump_user_data)
         os.makedirs(user_data_path, exist_ok=True)
@@ -199,17 +756,8 @@ def main_abcache(args):
 
     try:
         if not args.no_update:
-            if config.need_client_header_update:
-                if config.app_region in REGION_JP_EN:
-                    assert (
-                        try_auth()
-                    ), "Cannot update client headers without auth info. NOTE: You can fill in the EN/JP override fields (`--app-asset-...`) to bypass auth."
-                cache.update_client_headers()
-            cache.update_abcache_index()
-            if os.path.dirname(db_path):
-                os.makedirs(os.path.dirname(db_path), exist_ok=True)
-            with open(db_path, "wb") as f:
-                cache.save(f)
+            with span("update"):
+                update_and_save(cache, db_path)
     except Exception as e:
         logger.warning("Cache update failure: %s", e)        
         logger.warning("Continuing with possibly stale cache. To explicitly do this, use --no-update.")
@@ -226,74 +774,19 @@ def main_abcache(args):
         
     if args.download_dir:
         download_dir = os.path.expanduser(args.download_dir)
-        bundles = set()
-
-        def _iter_bundles():
-            filter_pred = []
-            if args.download_filter:
-                logger.info(
-                    "Filtering bundles with regex pattern: %s", args.download_filter
-                )
-                pattern = re.compile(args.download_filter)
-                filter_pred.append(lambda bundle: pattern.match(bundle.bundleName))
-            if args.download_filter_cache_diff:
-                logger.info("Filtering bundles with cache diff")
-                diff_path = args.download_filter_cache_diff
-                diff_path = os.path.abspath(os.path.expanduser(diff_path))
-                logger.info("Loading cache diff from %s", diff_path)
-                diff_cache = AbCache.from_file(open(diff_path, "rb"))
-
-                def __diff_pred(bundle: AbCacheEntry):
-                    diff = diff_cache.abcache_index.bundles.get(bundle.bundleName, None)
-                    if diff is not None:
-                        if diff.hash != bundle.hash:
-                            return True
-                        else:
-                            logger.debug(
-                                "Skipped %s due to cache diff hit (hash)",
-                                bundle.bundleName,
-                            )
-                            return False
-                    else:
-                        return True
-
-                filter_pred.append(__diff_pred)
-            if filter_pred:
-                for name, entry in cache.abcache_index.bundles.items():
-                    if all(pred(entry) for pred in filter_pred):
-                        yield name
-            else:
-                logger.warning(
-                    "No filter pattern specified. All bundles will be downloaded."
-                )
-                for name, entry in cache.abcache_index.bundles.items():
-                    yield name
-
-        for bundleName in _iter_bundles():
-            bundles.add(bundleName)
-        basebundles = bundles.copy()
-        logger.info("Selected %d bundles to download", len(basebundles))
-        if args.download_ensure_deps:
-            for bundleName in basebundles:
-                cache.get_or_update_dependency_tree_flatten(bundleName, bundles)
-            logger.info("Added dependencies:")
-            for dep in bundles - basebundles:
-                logger.info("   - %s", dep)
-        fs = AbCacheFilesystem(cache_obj=cache)
-        with AbCacheDownloader(fs, max_workers=args.download_workers) as downloader:
-            logger.info("Downloading %d bundles to %s" % (len(bundles), download_dir))
-            for bundleName in bundles:
-                dst = os.path.join(download_dir, bundleName)                
-                if args.download_no_overwrite and os.path.exists(dst):
-                    logger.info("Skipping existing bundle %s", bundleName)
-                else:
-                    downloader.add_link(
-                        fs.open(bundleName), os.path.join(download_dir, bundleName)
-                    )
-            try:
-                downloader.run_until_complete()
-            except KeyboardInterrupt:
-                logger.warning("Download interrupted by user.")
-                downloader.shutdown(wait=False, cancel_futures=True)
-                return 1
+        with span("select"):
+            bundles, basebundles = select_bundles(
+                cache,
+                args.download_filter,
+                args.download_filter_cache_diff,
+                args.download_ensure_deps,
+                args.download_query,
+            )
+        with span("download"), STORAGE_BACKENDS[args.download_storage](
+            download_dir
+        ) as storage:
+            return download_bundles(
+                args, cache, storage, download_dir, bundles, basebundles
+            )
     return 0
+
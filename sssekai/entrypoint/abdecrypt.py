@@ -1,26 +1,47 @@
 import os
 from pathlib import Path
 from logging import getLogger
+from sssekai.profiling import span
 
 logger = getLogger('abdecrypt')
 
 def main_abdecrypt(args):
     from sssekai.crypto.AssetBundle import decrypt_iter
+    from sssekai.abcache.storage import AbCacheShardStorage
+    from sssekai.entrypoint.abcache import AbCacheDownloadState, AbCacheDownloader
 
     args.outdir = Path(os.path.abspath(args.outdir))
     args.indir = Path(os.path.abspath(args.indir))
     args.outdir.mkdir(parents=True, exist_ok=True)
-    tree = os.walk(args.indir)
     assert args.indir != args.outdir, "Input and output directories must be different"
+
+    def decrypt(src, name, out_path: Path):
+        next_bytes = lambda nbytes: src.read(nbytes)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        logger.info("Decrypting %s -> %s", name, out_path.as_posix())
+        with span("decrypt"), open(out_path, "wb") as dest:
+            for block in decrypt_iter(next_bytes):
+                dest.write(block)
+
+    if AbCacheShardStorage.is_shard_storage(args.indir):
+        # Read directly out of the shards
+        with AbCacheShardStorage(args.indir) as storage:
+            for name in sorted(storage.names()):
+                if name.startswith(AbCacheDownloader.QUARANTINE):
+                    continue  # Failed verification
+                with storage.open(name) as src:
+                    decrypt(src, name, args.outdir / name)
+        return
+    tree = os.walk(args.indir)
     for root, dirs, files in tree:
+        if Path(root) == args.indir:
+            # Failed verification
+            dirs[:] = [d for d in dirs if d + "/" != AbCacheDownloader.QUARANTINE]
         for fname in files:
+            if fname == AbCacheDownloadState.FILENAME:
+                continue
             file = Path(root) / fname
             if file.is_file():                
                 with open(file, "rb") as src:
-                    next_bytes = lambda nbytes: src.read(nbytes)
                     out_path = args.outdir / file.relative_to(args.indir)
-                    out_path.parent.mkdir(parents=True, exist_ok=True)
-                    logger.info("Decrypting %s -> %s", file.as_posix(), out_path.as_posix())
-                    with open(out_path, "wb") as dest:
-                        for block in decrypt_iter(next_bytes):
-                            dest.write(block)
+                    decrypt(src, file.as_posix(), out_path)
@@ -96,13 +96,25 @@ def main_abserve(args):
 
     db_path = os.path.expanduser(os.path.normpath(args.db))
     fs = fsspec.filesystem("abcache", fo=db_path)
+    fs.readahead = args.readahead
     if args.proxy:
         logger.info("Overriding proxy: %s", args.proxy)
         fs.cache.proxies = {"http": args.proxy, "https": args.proxy}
+    if args.refresh_interval:
+        logger.info("Refreshing index every %d seconds", args.refresh_interval)
+        fs.start_refresh(args.refresh_interval)
     if args.fuse:
-        import fsspec.fuse
+        from sssekai.abcache.fuse import mount
 
-        fsspec.fuse.run(fs, "", args.fuse)
+        fs.cache.configure_pool(args.fuse_workers, block=True)
+        mount(
+            fs,
+            args.fuse,
+            args.fuse_cache_dir,
+            workers=args.fuse_workers,
+            prefetch_deps=args.fuse_prefetch_deps,
+            attr_timeout=args.fuse_attr_timeout,
+        )
     else:
         with ThreadingHTTPServer(
             (args.host, args.port), AbServeHTTPRequestHandler
@@ -1,4 +1,5 @@
 from sssekai.unity.AssetBundle import load_assetbundle
+from sssekai.profiling import span
 from os import path, makedirs
 from logging import getLogger
 import json
@@ -11,18 +12,20 @@ def main_live2dextract(args):
         from UnityPy.enums import ClassIDType
 
         makedirs(args.outdir, exist_ok=True)
-        env = load_assetbundle(f)
+        with span("load"):
+            env = load_assetbundle(f)
         monobehaviors = dict()
         textures = dict()
         animations = dict()
-        for obj in env.objects:
-            data = obj.read()
-            if obj.type in {ClassIDType.MonoBehaviour}:
-                monobehaviors[data.m_Name] = data
-            if obj.type in {ClassIDType.Texture2D}:
-                textures[data.m_Name] = data
-            if obj.type in {ClassIDType.AnimationClip}:
-                animations[data.m_Name] = data
+        with span("parse"):
+            for obj in env.objects:
+                data = obj.read()
+                if obj.type in {ClassIDType.MonoBehaviour}:
+                    monobehaviors[data.m_Name] = data
+                if obj.type in {ClassIDType.Texture2D}:
+                    textures[data.m_Name] = data
+                if obj.type in {ClassIDType.AnimationClip}:
+                    animations[data.m_Name] = data
         modelData = monobehaviors.get("BuildModelData", None)
         if not modelData:
             logger.warning("BuildModelData absent. Not extracting Live2D models!")
@@ -43,7 +46,9 @@ def main_live2dextract(args):
                             ".physics3"
                         ):
                             out_name += ".json"
-                        with open(path.join(args.outdir, out_name), "wb") as fout:
+                        with span("write"), open(
+                            path.join(args.outdir, out_name), "wb"
+                        ) as fout:
                             logger.info("Extracting Live2D Asset %s" % out_name)
                             fout.write(data.m_Script.encode("utf-8", "surrogateescape"))
             # Textures always needs conversion and is placed under specific folders
@@ -55,7 +60,10 @@ def main_live2dextract(args):
                 out_name = path.join(out_folder, name)
                 logger.info("Extracting Texture %s" % out_name)
                 name_wo_ext = ".".join(name.split(".")[:-1])
-                textures[name_wo_ext].image.save(out_name)
+                with span("convert"):
+                    image = textures[name_wo_ext].image
+                with span("write"):
+                    image.save(out_name)
         # Animations are serialized into AnimationClip
         if not args.no_anim:
             from sssekai.unity.constant.SekaiLive2DPathNames import NAMES_CRC_TBL
@@ -64,11 +72,13 @@ def main_live2dextract(args):
 
             for clipName, clip in animations.items():
                 logger.info("Extracting Animation %s" % clipName)
-                anim = AnimationHelper.from_clip(clip)
-                data = to_motion3(anim, NAMES_CRC_TBL, clip)
-                json.dump(
-                    data,
-                    open(path.join(args.outdir, clipName + ".motion3.json"), "w"),
-                    indent=4,
-                    ensure_ascii=False,
-                )
+                with span("convert"):
+                    anim = AnimationHelper.from_clip(clip)
+                    data = to_motion3(anim, NAMES_CRC_TBL, clip)
+                with span("write"):
+                    json.dump(
+                        data,
+                        open(path.join(args.outdir, clipName + ".motion3.json"), "w"),
+                        indent=4,
+                        ensure_ascii=False,
+                    )
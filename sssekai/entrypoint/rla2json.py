@@ -1,79 +1,127 @@
 from logging import getLogger
 from sssekai.unity.AssetBundle import load_assetbundle
-from UnityPy.enums import ClassIDType
-from sssekai.fmt.rla import read_archive_rla_frames, read_rla_frames
-import os, io, json, base64
+from sssekai.fmt.rla import (
+    iter_archive_rla_packets,
+    read_rla_frames,
+    read_rla_frames_parallel,
+)
+from sssekai.fmt.rla_index import (
+    RLA_TICKS_PER_SECOND,
+    read_rla_archive_bundle,
+    rla_split_names,
+)
+from sssekai.fmt.rla_audio import RLAAudioTrackWriter
+from sssekai.fmt.rla_output import make_frame_writer
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from sssekai.profiling import span, iter_span
+import os
 
 logger = getLogger(__name__)
 
 
 def main_rla2json(args):
-    def __dump_from_frame_gen(frame_gen):
-        outdir = args.outdir
-        os.makedirs(outdir, exist_ok=True)
-        ensure_dir = lambda x: (
-            (
-                os.makedirs(os.path.dirname(x), exist_ok=True)
-                if os.path.dirname(x)
-                else None
+    executor = None
+    workers = args.workers if args.workers is not None else 1
+    if workers != 1:
+        # Shared by all split files
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(workers)
+        logger.info("Decoding with %d workers" % workers)
+
+    frames = make_frame_writer(args.format or "json", args.outdir)
+    audio = None
+
+    def __read_frames(packets, version):
+        if executor:
+            return read_rla_frames_parallel(
+                packets,
+                version,
+                args.strict,
+                frames.columnar,
+                executor=executor,
+                workers=workers,
+                types=args.types,
             )
-            or x
+        return read_rla_frames(
+            packets, version, args.strict, frames.columnar, types=args.types
         )
-        for tick, frame in frame_gen:
+
+    def __dump_from_frame_gen(frame_gen, seconds=None):
+        for tick, frame in iter_span("decode", frame_gen):
             print("tick: %16s, type: %32s" % (tick, frame["type"]), end="\r")
-            match frame["type"]:
-                case "SoundData":
-                    if frame["encoding"] == "hca":
-                        with open(
-                            ensure_dir(
-                                os.path.join(outdir, "SoundData", str(tick) + ".hca"),
-                            ),
-                            "wb",
-                        ) as f:
+            with span("write"):
+                match frame["type"]:
+                    case "SoundData" if audio and seconds:
+                        audio.add(seconds(tick), frame)
+                    case "SoundData" if audio:
+                        audio.add_tick(tick, frame)  # Archive packet ticks
+                    case "SoundData":
+                        if frame["encoding"] == "hca":
                             raw_data = frame["data"]
                             start = raw_data.find(b"\xff\xff")
-                            f.write(raw_data[start:])
-                    else:
-                        raise ValueError("unsupported encoding: %s" % frame["encoding"])
-                case _:
-                    with open(
-                        ensure_dir(
-                            os.path.join(outdir, frame["type"], str(tick) + ".json")
-                        ),
-                        "w",
-                        encoding="utf-8",
-                    ) as f:
-                        json.dump(frame, f, ensure_ascii=False, indent=4)
+                            frames.write_file(
+                                raw_data[start:], "SoundData", str(tick) + ".hca"
+                            )
+                        else:
+                            raise ValueError(
+                                "unsupported encoding: %s" % frame["encoding"]
+                            )
+                    case _:
+                        frames.add(tick, frame)
 
-    if os.path.isfile(args.input):
-        with open(args.input, "rb") as f:
-            datas = dict()
-            rla_env = load_assetbundle(f)
-            for obj in rla_env.objects:
-                if obj.type in {ClassIDType.TextAsset}:
-                    data = obj.read()
-                    datas[data.m_Name] = data.m_Script.encode(
-                        "utf-8", "surrogateescape"
+    try:
+        if args.audio:
+            template = None
+            if args.hca_template:
+                with open(args.hca_template, "rb") as f:
+                    template = f.read()
+            os.makedirs(args.outdir, exist_ok=True)
+            audio = RLAAudioTrackWriter(
+                os.path.join(args.outdir, "SoundData.%s" % args.audio),
+                args.audio,
+                template,
+                ticks_per_second=args.ticks_per_second or RLA_TICKS_PER_SECOND,
+            )
+        if os.path.isfile(args.input):
+            with open(args.input, "rb") as f:
+                with span("load"):
+                    rla_env = load_assetbundle(f)
+                with span("parse"):
+                    header, datas = read_rla_archive_bundle(rla_env)
+                version = tuple(map(int, header["version"].split(".")))
+                logger.info("Version: %d.%d" % version)
+                logger.info("Count: %d" % len(header["splitFileIds"]))
+                for sname in rla_split_names(header):
+                    frame_gen = __read_frames(
+                        iter_archive_rla_packets(datas[sname]), version
                     )
-            header = datas.get("sekai.rlh", None)
-            assert header, "RLH Header file not found!"
-            version = tuple(map(int, header["version"].split(".")))
-            logger.info("Version: %d.%d" % version)
-            logger.info("Count: %d" % len(header["splitFileIds"]))
-            splitSeconds = header["splitSeconds"]
-            for sid in header["splitFileIds"]:
-                sname = "sekai_%02d_%08d" % (splitSeconds, sid)
-                script = datas[sname + ".rla"]
-                frame_gen = read_archive_rla_frames(
-                    io.BytesIO(script), version, args.strict
-                )
-                __dump_from_frame_gen(frame_gen)
-    else:
-        logger.info("Reading from directory")
-        packet_gen = (
-            (file, open(os.path.join(args.input, file), "rb").read())
-            for file in os.listdir(args.input)
-        )
-        version = tuple(map(int, args.version.split(".")))
-        frame_gen = read_rla_frames(packet_gen, version, args.strict)
-        __dump_from_frame_gen(frame_gen)
+                    __dump_from_frame_gen(frame_gen)
+        else:
+            logger.info("Reading from directory")
+            packet_gen = (
+                (file, open(os.path.join(args.input, file), "rb").read())
+                for file in os.listdir(args.input)
+            )
+            version = tuple(map(int, args.version.split(".")))
+            frame_gen = __read_frames(packet_gen, version)
+            # Loose packets are named after their receive time in ms, i.e. 1740309585940-0.bin
+            __dump_from_frame_gen(
+                frame_gen,
+                lambda tick: (
+                    int(tick.split("-")[0]) / 1000
+                    if tick.split("-")[0].isdigit()
+                    else None
+                ),
+            )
+    finally:
+        # Also on errors, so the writer threads end and what's decoded is flushed
+        with ExitStack() as stack:
+            if executor:
+                stack.callback(executor.shutdown, cancel_futures=True)
+            if audio:
+                stack.callback(audio.close)
+            with span("flush"):
+                frames.close()
+    if audio:
+        logger.info("Audio track written to %s" % audio.output)
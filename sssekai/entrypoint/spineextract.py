@@ -2,6 +2,7 @@ import os
 from sssekai.unity.AssetBundle import load_assetbundle
 from UnityPy.enums import ClassIDType
 from logging import getLogger
+from sssekai.profiling import span
 
 logger = getLogger(__name__)
 
@@ -10,8 +11,10 @@ def main_spineextract(args):
     outdir = args.outdir
     os.makedirs(outdir, exist_ok=True)
     with open(args.infile, "rb") as f:
-        env = load_assetbundle(f)
-        objects = [(pobj, pobj.read()) for pobj in env.objects]
+        with span("load"):
+            env = load_assetbundle(f)
+        with span("parse"):
+            objects = [(pobj, pobj.read()) for pobj in env.objects]
         binaries = {
             obj.m_Name: obj
             for pobj, obj in objects
@@ -45,7 +48,10 @@ def main_spineextract(args):
                     logger.info("...has Texture %s" % tex)
                     textureobj = textures.get(tex, None)
                     if textureobj:
-                        textureobj.image.save(os.path.join(outdir, spine, tex + ".png"))
+                        with span("convert"):
+                            image = textureobj.image
+                        with span("write"):
+                            image.save(os.path.join(outdir, spine, tex + ".png"))
                     else:
                         logger.warning("No texture found for %s" % tex)
             else:
@@ -2,18 +2,21 @@ from sssekai.unity.AssetBundle import load_assetbundle
 from UnityPy.enums import ClassIDType
 from os import path, remove, makedirs
 from logging import getLogger
+from sssekai.profiling import span
 
 logger = getLogger(__name__)
 
 
 def main_usmdemux(args):
     with open(args.infile, "rb") as f:
-        env = load_assetbundle(f)
+        with span("load"):
+            env = load_assetbundle(f)
         datas = dict()
-        for obj in env.objects:
-            if obj.type in {ClassIDType.MonoBehaviour, ClassIDType.TextAsset}:
-                data = obj.read()
-                datas[data.m_Name] = data
+        with span("parse"):
+            for obj in env.objects:
+                if obj.type in {ClassIDType.MonoBehaviour, ClassIDType.TextAsset}:
+                    data = obj.read()
+                    datas[data.m_Name] = data
         movieInfo = datas.get("MovieBundleBuildData", None)
         assert movieInfo, "Invalid AssetBundle. No MovieBundleBuildData found!"
         # movieInfo = movieInfo.read_typetree()
@@ -21,7 +24,7 @@ def main_usmdemux(args):
         logger.info("USM: %s" % usm_name)        
         usm_out = path.abspath(args.outfile)
         makedirs(path.dirname(usm_out), exist_ok=True)        
-        with open(usm_out, "wb") as usmstream:
+        with span("write"), open(usm_out, "wb") as usmstream:
             for data in movieInfo.movieBundleDatas:
                 usm = data.usmFileName[: -len(".bytes")]
                 usm = datas[usm]
@@ -1,9 +1,15 @@
 from base64 import b64decode, b64encode
-from struct import unpack as s_unpack
+from struct import Struct, unpack as s_unpack
 from io import BytesIO
-from collections import defaultdict
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from bisect import bisect_left
+from array import array
+from mmap import mmap
 from typing import Generator, Tuple, TypeVar, List
-import math, gzip
+import os, math, gzip
 import msgpack
 
 RLA_VERSIONS = [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7)]
@@ -32,6 +38,47 @@ class SSEMissingSplitPacketException(Exception):
         super().__init__(f"Missing %d split packet(s): %s" % (len(missing), missing))
 
 
+# They really want you to believe it's Base64...
+# [4 bytes: RTVL][6 bytes : length in hex][Base64 T/F][Split T/F][3 bytes: Signature][data, Base64]
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^ 15 bytes
+# Split packets follow with (space padded, decimal) fields:
+# [5: splitId][5: splitIndex][5: splitNum][10: dataLength][10: totalDataLength][data]
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^ 35 bytes
+# Sekai_Streaming_StreamingCommon__cctor
+RTVL_HEADER = Struct("4s6scc3s")
+RTVL_SPLIT_HEADER = Struct("5s5s5s10s10s")
+RTVL_DATA_OFFSET = RTVL_HEADER.size
+RTVL_SPLIT_DATA_OFFSET = RTVL_HEADER.size + RTVL_SPLIT_HEADER.size
+RTVL_MAX_LENGTH = 0xFFFFFF  # Largest encoded length of a packet
+RTVL_SPLIT_MAX_PREALLOCATE = 16 << 20  # Largest split group buffer allocated up front
+
+
+def decode_buffer_header(buffer: bytes) -> tuple:
+    """Decodes the header of a 'RTVL' SSE Message payload, without touching its data.
+
+    Args:
+        buffer (bytes): Encoded buffer. Only the first 50 bytes are read.
+
+    Returns:
+        (encoded length, base64 T/F, header signature, (splitId, splitIndex, splitNum, dataLength, totalDataLength) or None)
+    """
+    magic, encoded_length, is_base64_encoded, is_split, header_signature = (
+        RTVL_HEADER.unpack_from(buffer)
+    )
+    assert magic == b"RTVL", "bad header"
+    split_info = None
+    if is_split == b"T":
+        split_info = tuple(
+            map(int, RTVL_SPLIT_HEADER.unpack_from(buffer, RTVL_DATA_OFFSET))
+        )
+    return (
+        int(encoded_length, 16),
+        is_base64_encoded == b"T",
+        int(header_signature, 10),
+        split_info,
+    )
+
+
 # Sekai_Streaming_StreamingCommon__CheckHeader
 def decode_buffer_base64(buffer: bytes) -> tuple[int, bytes]:
     """Decodes the 'RTVL' SSE Message payload into a header signature and data.
@@ -45,50 +92,22 @@ def decode_buffer_base64(buffer: bytes) -> tuple[int, bytes]:
     Returns:
         ((splitId, splitIndex, splitNum, dataLength, totalDataLength, base64) or None, decoder signature, data in decoded bytes)
     """
-    # They really want you to believe it's Base64...
-    # [4 bytes: RTVL][6 bytes : length in hex][Base64 T/F][Split T/F][3 bytes: Signature][data, Base64]
-    # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^ 15 bytes
-    # Sekai_Streaming_StreamingCommon__cctor
-    SYM_HEADER = b"RTVL"
-    SYM_TRUE = b"T"
-    SYM_FALSE = b"F"
-    stream = BytesIO(buffer)
-    assert stream.read(4) == SYM_HEADER, "bad header"
-    encoded_length = stream.read(6)
-    encoded_length = int(encoded_length, 16)
-    is_base64_encoded = stream.read(1) == SYM_TRUE
-    is_split = stream.read(1) == SYM_TRUE
-    header_signature = int(stream.read(3).decode(), 10)
-    data = stream.read()
-    current_length = len(data) + 15
+    encoded_length, is_base64_encoded, header_signature, split_info = (
+        decode_buffer_header(buffer)
+    )
+    current_length = len(buffer)
     if current_length != encoded_length:
         raise SSEDataLengthOutOfRangeException(encoded_length, current_length)
-    if is_split:
-        __sizes_pre = (0, 5, 10, 15, 25, 35)
-        splitInfo = data[: __sizes_pre[-1]]
-        splitId, splitIndex, splitNum, dataLength, totalDataLength = map(
-            int,
-            (
-                splitInfo[__sizes_pre[i] : __sizes_pre[i + 1]].decode()
-                for i in range(len(__sizes_pre) - 1)
-            ),
-        )
-        data = data[__sizes_pre[-1] :]
+    view = memoryview(buffer)
+    if split_info:
         return (
-            (
-                splitId,
-                splitIndex,
-                splitNum,
-                dataLength,
-                totalDataLength,
-                is_base64_encoded,
-            ),
+            (*split_info, is_base64_encoded),
             header_signature,
-            data,
+            bytes(view[RTVL_SPLIT_DATA_OFFSET:]),
         )
     else:
-        if is_base64_encoded:
-            data = b64decode(data)
+        data = view[RTVL_DATA_OFFSET:]
+        data = b64decode(data) if is_base64_encoded else bytes(data)
         return None, header_signature, data
 
 
@@ -114,17 +133,451 @@ def decode_buffer_payload(buffer: bytes) -> tuple[int, bytes]:
     return decoder_signature, stream.read()
 
 
+# region Compiled decoder
+# The payloads are decoded by a reader program, generated once per (version, decoder signature)
+# from the schema below. Each value is prefixed by a 2-bit code in the bitmask (see `SCALAR_CODES`),
+# which selects its width in the data stream, or a constant.
+#
+# Schema nodes:
+#   "<scalar>"                  : See SCALAR_CODES. Also "mask" - a single bit of the bitmask
+#   "vector3", "quaternion"     : Tuples of 3 and 4 floats
+#   "rad3"                      : Tuple of 3 ushorts in 0.01 degrees, converted to radians
+#   "centi_short"               : short * 0.01
+#   "string"                    : Optional UTF-8 string, with its length as a tagged 'tiny int'
+#   "bytes", "msgpack"          : Raw data (or msgpack of) with its length as an int
+#   ("array", node)             : int count, then the elements. Truncated on errors with strict=False
+#   ("repeat", node)            : int count, then the elements
+#   ("optional", node)          : Present if the 2-bit code is 2, otherwise None
+#   ("const", value)            : Constant. Reads nothing
+#   ("expr", source)            : Python expression over the header fields. Reads nothing
+#   ("struct", [(key, node[, min_version]), ...]) : Dict of the fields available in the version
+
+# Code -> (bytes read, or a constant). Readers: "u8", "s8", "u16", "u32", "u64", "f32"
+SCALAR_CODES = {
+    "byte": ("0", "1", "-1", "u8"),  # ReadByte
+    "ushort": ("0.0", "0.0", "u8", "u16"),  # ReadUShort
+    "short": ("0.0", "0.0", "s8", "u16"),  # ReadShort
+    "int": ("0", "u8", "s8", "u32"),  # ReadInt
+    "long": ("0", "u8", "u16", "u64"),  # ReadLong
+    "float": ("0.0", "0.0", "3.4028e38", "f32"),  # ReadSingle
+}
+
+RLA_POSE_DATA = (
+    "struct",
+    [
+        ("bodyPosition", "vector3"),
+        ("bodyRotation", "rad3"),  # Eulers
+        ("musicItemPropPosition", "vector3", (1, 1)),
+        ("musicItemPropRotation", "rad3", (1, 1)),
+        ("boneDatas", ("array", "rad3")),  # Eulers [0, 2pi]
+        ("shapeDatas", ("array", "float")),  # [0,100]
+        ("propBoneDatas", ("array", "rad3"), (1, 1)),  # Eulers [0, 2pi]
+        ("heightOffset", "centi_short"),
+        ("isActive", "mask"),
+        ("useActiveFx", "mask"),
+        ("isEyeLookAt", "mask", (1, 4)),
+    ],
+)
+
+RLA_STAGE_STATUS = (
+    "struct",
+    [
+        ("liveState", "byte"),
+        ("lightIntensity", "float"),
+        ("gayaVolume", "float"),
+        ("cheerVolume", "float"),
+        ("characterSpotlightIndex", "int"),
+        ("characterSpotlightIntensity", "float"),
+        ("stageSetlistIndex", "int"),
+        ("musicSetlistIndex", "int"),
+        ("musicTargetTime", "long"),
+        ("musicStartTime", "float"),
+        ("seId", "int"),
+        ("seStartTime", "long"),
+        ("timeStamp", "long"),
+        ("unk0", "byte"),
+        ("unk1", "byte"),
+        ("playTimelineId", "int"),
+        ("screenFadeColorR", "byte", (1, 4)),
+        ("screenFadeColorG", "byte", (1, 4)),
+        ("screenFadeColorB", "byte", (1, 4)),
+        ("screenFade", "float", (1, 4)),
+        ("characterFormationRotate", "int", (1, 4)),
+        ("stageCenterPosition", "vector3", (1, 4)),
+        ("playerAvatarStartPosition", "vector3", (1, 4)),
+        ("characterVisible", "mask", (1, 5)),
+        ("eyeLookAtTargetPositionOffset", "vector3", (1, 5)),
+        ("eyeLookAtAngleLimit", "vector3", (1, 5)),
+        ("isPreloadReverseCharacter", "mask", (1, 5)),
+        ("eyeLookAtUvLimit", "quaternion", (1, 6)),
+        ("preloadReserveFirstCharacterDelay", "float", (1, 7)),
+        ("preloadReserveCharacterInterval", "float", (1, 7)),
+    ],
+)
+
+RLA_CHARACTER_STATUS = (
+    "struct",
+    [
+        ("costumeIndex", "int"),
+        ("visible", "mask", (1, 6)),
+        ("useFx", "mask", (1, 2)),
+        ("timeStamp", "long"),
+    ],
+)
+
 # Sekai_Streaming_StreamingData__Deserialize
+RLA_HEADER = [
+    ("compressType", "int"),
+    ("sequenceNo", "int"),
+    ("targetTime", "long"),
+]
+
+# decoder signature : schema
+RLA_SCHEMAS = {
+    # Sekai_Streaming_MotionData
+    0: (
+        "struct",
+        [
+            ("type", ("const", "MotionData")),
+            ("timeStamps", ("optional", ("array", "long"))),
+            ("poses", ("array", RLA_POSE_DATA)),
+        ],
+    ),
+    # Sekai_Streaming_MotionCaptureData
+    1: (
+        "struct",
+        [
+            ("type", ("const", "MotionCaptureData")),
+            (
+                "data",
+                (
+                    "array",
+                    (
+                        "struct",
+                        [("id", "int"), ("timestamp", "long"), ("pose", RLA_POSE_DATA)],
+                    ),
+                ),
+            ),
+        ],
+    ),
+    # Sekai_Streaming_SoundData
+    2: (
+        "struct",
+        [
+            ("type", ("const", "SoundData")),
+            ("channels", "int"),
+            ("sampleRate", "int"),
+            # HCA w/o metadata, or raw sampling data
+            ("encoding", ("expr", '"hca" if compressType == 1 else "raw"')),
+            ("data", "bytes"),
+        ],
+    ),
+    # Sekai_Streaming_StatusData
+    3: (
+        "struct",
+        [
+            ("type", ("const", "StatusData")),
+            ("stageStatus", ("array", RLA_STAGE_STATUS)),
+            ("characterStatus", ("repeat", ("array", RLA_CHARACTER_STATUS))),
+        ],
+    ),
+    # Sekai_Streaming_VirtualLiveMessageData
+    4: (
+        "struct",
+        [
+            ("type", ("const", "VirtualLiveMessageData")),
+            ("messageId", "int"),
+            ("userId", "string"),
+            # CP_BinarySerializer__Deserialize_OtherRoomMessageData
+            # CP_BinarySerializer__Deserialize_OtherRoomActionData
+            # NOTE: The msgpack payload does not contain the message type
+            ("data", "msgpack"),
+        ],
+    ),
+    # Sekai_Streaming_ComplementInfoData
+    5: (
+        "struct",
+        [
+            ("type", ("const", "ComplementInfoData")),
+            ("infoType", "int"),
+            ("infoData", "string"),
+        ],
+    ),
+}
+
+
+class RLADecoderCompiler:
+    """Generates the Python source of a reader program for a schema.
+
+    The program reads from `buf` (memoryview, of `size` bytes) at `pos`, and the bitmask at bit `m`,
+    through `bits` (one byte per bit) and `codes` (the 2-bit code starting at each bit). Reads past
+    the end behave as with a stream: integers are truncated, and floats and masks raise. `pos` and `m`
+    are advanced before each read, so that reads after a truncated array see the same state as well.
+
+    With `columnar`, "rad3" values are left as raw ushorts (0.01 degrees), and arrays of them are
+    flattened into lists of 3 * count values, for bulk conversion later on.
+    """
+
+    def __init__(self, version: tuple, columnar: bool = False):
+        self.version = version
+        self.columnar = columnar
+        self.lines = list()
+        self.depth = 1
+        self.count = 0
+
+    def var(self, prefix="v") -> str:
+        self.count += 1
+        return "%s%d" % (prefix, self.count)
+
+    def emit(self, line: str):
+        self.lines.append("    " * self.depth + line)
+
+    def indent(self, line: str):
+        self.emit(line)
+        self.depth += 1
+
+    def dedent(self):
+        self.depth -= 1
+
+    def read(self, reader: str, v: str):
+        match reader:
+            case "u8":
+                self.emit("%s = buf[pos] if pos < size else 0" % v)
+                self.emit("pos += 1")
+            case "s8":
+                self.emit("%s = ((buf[pos] ^ 128) - 128) if pos < size else 0" % v)
+                self.emit("pos += 1")
+            case "u16" | "u32" | "u64":
+                n = int(reader[1:]) // 8
+                self.emit('%s = from_bytes(buf[pos : pos + %d], "little")' % (v, n))
+                self.emit("pos += %d" % n)
+            case "f32":
+                self.emit("pos += 4")
+                self.emit("%s = unpack_f32(buf, pos - 4)[0]" % v)
+            case _:
+                self.emit("%s = %s" % (v, reader))  # Constant
+
+    def code(self) -> str:
+        c = self.var("c")
+        self.emit("m += 2")
+        self.emit("%s = codes[m - 2]" % c)
+        return c
+
+    def scalar(self, kind: str, v: str):
+        branches = SCALAR_CODES[kind]
+        c = self.code()
+        for i, code in enumerate((3, 2, 1)):
+            self.indent(("if %s == %d:" if not i else "elif %s == %d:") % (c, code))
+            self.read(branches[code], v)
+            self.dedent()
+        self.indent("else:")
+        self.read(branches[0], v)
+        self.dedent()
+
+    def length(self, v: str):
+        # Negative lengths read the rest of the stream
+        self.scalar("int", v)
+        self.indent("if %s < 0:" % v)
+        self.emit("%s = max(size - pos, 0)" % v)
+        self.dedent()
+
+    def node(self, node, v: str):
+        """Emit code reading `node` into the variable `v`"""
+        if isinstance(node, str):
+            match node:
+                case "mask":
+                    self.emit("m += 1")
+                    self.emit("%s = bits[m - 1] == 1" % v)
+                case "vector3" | "quaternion":
+                    items = [self.var() for _ in range(3 if node == "vector3" else 4)]
+                    for item in items:
+                        self.scalar("float", item)
+                    self.emit("%s = (%s)" % (v, ", ".join(items)))
+                case "rad3":
+                    items = [self.var() for _ in range(3)]
+                    for item in items:
+                        self.scalar("ushort", item)
+                    if not self.columnar:
+                        items = ["%s * 0.01 * DEG_TO_RAD" % x for x in items]
+                    self.emit("%s = (%s)" % (v, ", ".join(items)))
+                case "centi_short":
+                    self.scalar("short", v)
+                    self.emit("%s = %s * 0.01" % (v, v))
+                case "string":
+                    c = self.code()
+                    self.indent("if %s:" % c)
+                    t = self.var("t")
+                    self.read("u8", t)
+                    self.indent("if %s == 43:  # '+'" % t)
+                    self.read("u16", v)
+                    self.dedent()
+                    self.indent("elif %s == 42:  # '*'" % t)
+                    self.read("s8", v)
+                    self.dedent()
+                    self.indent("elif %s == 41:  # ')'" % t)
+                    self.read("u8", v)
+                    self.dedent()
+                    self.indent("else:")
+                    self.emit("raise KeyError(chr(%s))" % t)
+                    self.dedent()
+                    self.indent("if %s < 0:" % v)
+                    self.emit("%s = max(size - pos, 0)" % v)
+                    self.dedent()
+                    self.emit("pos += %s" % v)
+                    self.emit('%s = str(buf[pos - %s : pos], "utf-8")' % (v, v))
+                    self.dedent()
+                    self.indent("else:")
+                    self.emit("%s = None" % v)
+                    self.dedent()
+                case "bytes" | "msgpack":
+                    self.length(v)
+                    self.emit("pos += %s" % v)
+                    self.emit("%s = bytes(buf[pos - %s : pos])" % (v, v))
+                    if node == "msgpack":
+                        self.emit("%s = unpackb(%s)" % (v, v))
+                case _:
+                    self.scalar(node, v)
+            return
+        kind, arg = node
+        match kind:
+            case "const":
+                self.emit("%s = %r" % (v, arg))
+            case "expr":
+                self.emit("%s = %s" % (v, arg))
+            case "optional":
+                c = self.code()
+                self.indent("if %s == 2:" % c)
+                self.node(arg, v)
+                self.dedent()
+                self.indent("else:")
+                self.emit("%s = None" % v)
+                self.dedent()
+            case "array" | "repeat":
+                n, item = self.var("n"), self.var()
+                self.scalar("int", n)
+                self.emit("%s = []" % v)
+                if kind == "array":
+                    self.indent("try:")
+                self.indent("for _ in range(%s):" % n)
+                self.node(arg, item)
+                if self.columnar and arg == "rad3":
+                    self.emit("%s += %s" % (v, item))  # Flattened
+                else:
+                    self.emit("%s.append(%s)" % (v, item))
+                self.dedent()
+                if kind == "array":
+                    self.dedent()
+                    self.indent("except Exception:")
+                    self.indent("if strict:")
+                    self.emit("raise")
+                    self.dedent()
+                    self.dedent()
+            case "struct":
+                fields = [
+                    (key, field)
+                    for key, field, *since in arg
+                    if not since or self.version >= since[0]
+                ]
+                items = [self.var() for _ in fields]
+                for (key, field), item in zip(fields, items):
+                    self.node(field, item)
+                self.emit(
+                    "%s = {%s}"
+                    % (
+                        v,
+                        ", ".join(
+                            "%r: %s" % (k, x) for (k, _), x in zip(fields, items)
+                        ),
+                    )
+                )
+            case _:
+                raise ValueError("unknown schema node %s" % kind)
+
+    def compile(self, decoder_signature: int) -> str:
+        """Source of `decode(buf, size, bits, codes, pos, m, strict, buffer)` for the signature"""
+        self.emit("signature = 0")
+        self.scalar("byte", "signature")
+        self.emit('assert signature == %d, "bad signature"' % decoder_signature)
+        for key, field in RLA_HEADER:
+            self.node(field, key)
+        schema = RLA_SCHEMAS.get(decoder_signature, None)
+        if schema:
+            self.node(schema, "result")
+        else:
+            self.emit('result = {"type": "Unknown", "data": buffer}')
+        self.emit("return result")
+        return "\n".join(
+            ["def decode(buf, size, bits, codes, pos, m, strict, buffer):"] + self.lines
+        )
+
+
+@lru_cache(maxsize=None)
+def compile_streaming_data_decoder(
+    version: tuple, decoder_signature: int, columnar: bool = False
+):
+    """Compiled reader program of the streaming data payload. See `RLADecoderCompiler`."""
+    source = RLADecoderCompiler(version, columnar).compile(decoder_signature)
+    scope = {
+        "from_bytes": int.from_bytes,
+        "unpack_f32": Struct("<f").unpack_from,
+        "unpackb": msgpack.unpackb,
+        "DEG_TO_RAD": math.pi / 180,
+    }
+    exec(
+        compile(
+            source, "<rla decoder %d.%d:%d>" % (*version, decoder_signature), "exec"
+        ),
+        scope,
+    )
+    return scope["decode"]
+
+
+# Bits of each byte, LSB first
+BITMASK_BITS = [bytes((i >> j) & 1 for j in range(8)) for i in range(256)]
+
+
+def expand_bitmask(bitmask) -> Tuple[bytes, bytes]:
+    """(bits, codes) of the bitmask. bits[i] is the i-th bit, and codes[i] is the 2-bit code `bit i | bit i+1 << 1`"""
+    bits = b"".join(map(BITMASK_BITS.__getitem__, bitmask))
+    if len(bits) < 2:
+        return bits, b""
+    n = len(bits) - 1
+    # Each byte is 0 or 1, so (b << 1) never carries into the next byte
+    codes = int.from_bytes(bits[:-1], "little") | (
+        int.from_bytes(bits[1:], "little") << 1
+    )
+    return bits, codes.to_bytes(n, "little")
+
+
+# decoder signature : frame type
+RLA_FRAME_TYPES = {
+    signature: schema[1][0][1][1] for signature, schema in RLA_SCHEMAS.items()
+}
+# frame type : decoder signature
+RLA_SIGNATURES = {name: signature for signature, name in RLA_FRAME_TYPES.items()}
+
+
+def rla_signatures(types) -> set:
+    """Decoder signatures of frame types (i.e. "SoundData") or signatures. None for all"""
+    if types is None:
+        return None
+    return {RLA_SIGNATURES.get(t, t) for t in types}
+
+
 def decode_streaming_data(
-    version: tuple, decoder_signature, buffer, strict=True
+    version: tuple, decoder_signature, buffer, strict=True, columnar=False
 ) -> dict:
     """Decodes the streaming data payload into a dictionary.
 
+    Uses a reader program compiled per version and decoder signature. Checked for identical
+    output against the interpreter it replaced, in `tests/rla_reference.py`.
+
     Args:
         version (tuple): RLA version
         decoder_signature (int): Decoder signature
         buffer (bytes): Decoded payload data
         strict (bool, optional): If False, incomplete packets will be returned as is. Defaults to True.
+        columnar (bool, optional): Leave Euler angles in raw 0.01 degree units, and flatten arrays of them. See `sssekai.fmt.rla_columnar`. Defaults to False.
 
     Raises:
         Exception: If the packet is incomplete and strict is True.
@@ -132,299 +585,335 @@ def decode_streaming_data(
     Returns:
         dict: Parsed streaming data payload
     """
-    stream = BytesIO(buffer)
-    n_mask_offset = read_int(stream, 4)
-    n_init_pos = stream.tell()
-    stream.seek(n_mask_offset)
-    n_mask_length = read_int(stream, 2)
-    bitmask = stream.read(n_mask_length)
-    # assert not stream.read() # EOF
-    stream.seek(n_init_pos)
-    # CP_Serialize_SerializableValueSet
-    mask_i = -1
-
-    def get_next_mask():
-        nonlocal mask_i
-        mask_i += 1
-        return bitmask[mask_i // 8] & (1 << (mask_i % 8)) != 0
-
-    get_next_pred = lambda: get_next_mask() | (get_next_mask() << 1)
-    get_next_byte = lambda: [
-        lambda: 0,
-        lambda: 1,
-        lambda: -1,
-        lambda: read_int(stream, 1),
-    ][
-        get_next_pred()
-    ]()  # ReadByte
-    get_next_ushort = lambda: [
-        lambda: 0.0,
-        lambda: 0.0,
-        lambda: read_int(stream, 1),
-        lambda: read_int(stream, 2),
-    ][
-        get_next_pred()
-    ]()  # ReadUShort
-    get_next_short = lambda: [
-        lambda: 0.0,
-        lambda: 0.0,
-        lambda: read_int(stream, 1, True),
-        lambda: read_int(stream, 2),
-    ][
-        get_next_pred()
-    ]()  # ReadShort
-    get_next_int = lambda: [
-        lambda: 0,
-        lambda: read_int(stream, 1),
-        lambda: read_int(stream, 1, True),
-        lambda: read_int(stream, 4),
-    ][
-        get_next_pred()
-    ]()  # ReadInt
-    get_next_long = lambda: [
-        lambda: 0,
-        lambda: read_int(stream, 1),
-        lambda: read_int(stream, 2),
-        lambda: read_int(stream, 8),
-    ][
-        get_next_pred()
-    ]()  # ReadLong
-    get_next_float = lambda: [
-        lambda: 0.0,
-        lambda: 0.0,
-        lambda: 3.4028e38,
-        lambda: read_float(stream),
-    ][
-        get_next_pred()
-    ]()  # ReadSingle
-    get_next_vector3 = lambda: (
-        get_next_float(),
-        get_next_float(),
-        get_next_float(),
-    )  # ReadVector3
-    get_next_ushort_vector3 = lambda: (
-        get_next_ushort() * 0.01,
-        get_next_ushort() * 0.01,
-        get_next_ushort() * 0.01,
-    )  # ReadUShortVector3
-    get_next_quaternion = lambda: (
-        get_next_float(),
-        get_next_float(),
-        get_next_float(),
-        get_next_float(),
-    )  # ReadQuaternion
-    get_next_tiny_int = lambda type: {
-        "+": lambda: read_int(stream, 2),
-        "*": lambda: read_int(stream, 1, True),
-        ")": lambda: read_int(stream, 1),
-    }[
-        type
-    ]()  # ReadTinyInt
-    get_next_string = lambda: (
-        stream.read(get_next_tiny_int(chr(read_int(stream, 1)))).decode()
-        if get_next_pred()
-        else None
-    )  # ReadString
-
-    # HACK: Workaround for incomplete packets.
-    def gen_exception_handler(generator):
+    buf = memoryview(buffer)
+    size = len(buf)
+    mask_offset = int.from_bytes(buf[:4], "little")
+    mask_length = int.from_bytes(buf[mask_offset : mask_offset + 2], "little")
+    bitmask = buf[mask_offset + 2 : mask_offset + 2 + mask_length]
+    bits, codes = expand_bitmask(bitmask)
+    decode = compile_streaming_data_decoder(version, decoder_signature, columnar)
+    return decode(buf, size, bits, codes, min(size, 4), 0, strict, buffer)
+
+
+# endregion
+
+
+result = defaultdict(dict)
+
+T = TypeVar("T")
+
+
+class RLASplitBuffer:
+    """Reassembly buffer of a split group.
+
+    Chunks are written in place into a buffer preallocated to `totalDataLength`, at offsets
+    implied by the fixed chunk size all but the last chunk share, and received chunks are
+    tracked in a bitmap. Groups not split that way (or with inconsistent lengths) fall back to
+    joining the chunks in `splitIndex` order. So do groups whose `totalDataLength` is more
+    than `splitNum` chunks of `dataLength`, or than `RTVL_SPLIT_MAX_PREALLOCATE`, as a corrupt
+    header must not be trusted with an allocation.
+    """
+
+    __slots__ = (
+        "timestamp",
+        "signature",
+        "count",
+        "total",
+        "base64",
+        "received",
+        "chunk",
+        "tail",
+        "buffer",
+        "parts",
+    )
+
+    def __init__(
+        self,
+        timestamp,
+        signature: int,
+        count: int,
+        total: int,
+        base64=True,
+        length: int = RTVL_MAX_LENGTH,
+    ):
+        self.timestamp = timestamp  # Of the first chunk received
+        self.signature = signature
+        self.count = count  # splitNum
+        self.total = total  # totalDataLength
+        self.base64 = base64
+        self.received = 0  # Bitmap of the splitIndex received
+        self.chunk = None  # Length of all but the last chunk
+        self.tail = None  # Length of the last chunk
+        self.buffer = self.parts = None
+        if self.preallocation(count, total, length) is not None:
+            self.buffer = bytearray(total)
+        else:
+            self.parts = dict()  # splitIndex : data, once fallen back
+
+    @staticmethod
+    def preallocation(
+        count: int, total: int, length: int = RTVL_MAX_LENGTH
+    ) -> int | None:
+        """Bytes a group of `count` chunks of up to `length` bytes allocates before any chunk
+        arrives. None if it joins its chunks instead"""
+        bound = min(count * min(length, RTVL_MAX_LENGTH), RTVL_SPLIT_MAX_PREALLOCATE)
+        return total if 0 <= total <= bound else None
+
+    @property
+    def complete(self) -> bool:
+        return self.received == (1 << self.count) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held"""
+        if self.parts is None:
+            return len(self.buffer)
+        return sum(len(data) for data in self.parts.values())
+
+    def __fallback(self):
+        parts = dict()
+        for index in range(self.count):
+            if self.received >> index & 1:
+                if index == self.count - 1:
+                    offset, length = self.total - self.tail, self.tail
+                else:
+                    offset, length = index * self.chunk, self.chunk
+                parts[index] = bytes(self.buffer[offset : offset + length])
+        self.parts, self.buffer = parts, None
+
+    def add(self, index: int, data: bytes):
+        """Adds the chunk `data` of `splitIndex`. Repeated chunks replace the earlier ones"""
+        assert 0 <= index < self.count, "bad split index"
+        if self.parts is None:
+            length = len(data)
+            if index == self.count - 1:
+                offset = self.total - length
+                if self.chunk is not None:
+                    consistent = offset == index * self.chunk
+                else:  # Checked once the other chunks arrive, unless there are none
+                    consistent = index > 0 or offset == 0
+            else:
+                offset = index * length
+                consistent = (self.chunk is None or length == self.chunk) and (
+                    self.tail is None
+                    or self.total - self.tail == (self.count - 1) * length
+                )
+            if consistent and offset >= 0 and offset + length <= self.total:
+                if index == self.count - 1:
+                    self.tail = length
+                else:
+                    self.chunk = length
+                self.buffer[offset : offset + length] = data
+            else:
+                self.__fallback()
+        if self.parts is not None:
+            self.parts[index] = bytes(data)
+        self.received |= 1 << index
+
+    def mark(self, index: int):
+        """Marks the chunk of `splitIndex` as received, without its data. For groups of a
+        negative `total`, which allocate nothing, only used to find where groups end"""
+        assert 0 <= index < self.count, "bad split index"
+        self.received |= 1 << index
+
+    def join(self, strict=True) -> bytes:
+        """The (base64 decoded) payload of a complete group"""
+        if self.parts is None:
+            buffer = self.buffer
+        else:
+            buffer = b"".join(self.parts[index] for index in sorted(self.parts))
+        if strict:
+            assert len(buffer) == self.total, "incomplete split packet"
+        return b64decode(buffer) if self.base64 else bytes(buffer)
+
+
+def iter_rla_payloads(
+    reader: Generator[Tuple[T, bytes], None, None], strict=True, signatures=None
+) -> Generator[Tuple[T, int, bytes], None, None]:
+    """Frames a stream of rla fragments, and reassembles split data. No payloads are decoded.
+
+    Args:
+        reader (Generator[Tuple[T, bytes], None, None]): A generator that yields a tuple of timestamp and buffer data
+        strict (bool, optional): If False, corrupt and incomplete packets are skipped. Defaults to True.
+        signatures (set, optional): Decoder signatures to keep. Other packets are skipped by their header, before any decoding. Defaults to None (all).
+
+    Yields:
+        Generator[Tuple[T, int, bytes], None, None]: Timestamp, header signature and (base64 decoded) payload of each packet. See `decode_rla_payload`.
+    """
+    __buffers = dict()  # splitId : RLASplitBuffer
+
+    for timestamp, buffer in reader:
         try:
-            for item in generator:
-                yield item
+            encoded_length, base64, header_signature, split_info = decode_buffer_header(
+                buffer
+            )
+            if signatures is not None and header_signature not in signatures:
+                continue
+            if len(buffer) != encoded_length:
+                raise SSEDataLengthOutOfRangeException(encoded_length, len(buffer))
+            view = memoryview(buffer)
+            if not split_info:
+                data = view[RTVL_DATA_OFFSET:]
+                yield timestamp, header_signature, (
+                    b64decode(data) if base64 else bytes(data)
+                )
+                continue
+            splitId, splitIndex, splitNum, dataLength, totalDataLength = split_info
+            group = __buffers.get(splitId, None)
+            if group is None:
+                group = __buffers[splitId] = RLASplitBuffer(
+                    timestamp,
+                    header_signature,
+                    splitNum,
+                    totalDataLength,
+                    base64,
+                    dataLength,
+                )
+            group.add(splitIndex, view[RTVL_SPLIT_DATA_OFFSET:])
         except Exception as e:
-            # XXX: This shouldn't happen unless the packet is corrupted.
             if strict:
                 raise e
-            else:
-                return
+            # Otherwise fail silently
+            continue
+        if group.complete:
+            del __buffers[splitId]
+            yield timestamp, header_signature, group.join(strict)
 
-    gen_get_next_array = lambda reader: (
-        reader() for _ in range(get_next_int())
-    )  # ReadArray<T>
-    get_next_array = lambda reader: list(
-        gen_exception_handler(gen_get_next_array(reader))
-    )
-    # Sekai_Streaming_StreamingData__Deserialize
-    assert get_next_byte() == decoder_signature, "bad signature"
-    compress_type = get_next_int()
-    sequence_no = get_next_int()
-    target_time = get_next_long()
-    # StreamingData$$ReadValue implementations
-    deg_to_rad = lambda value: tuple(deg * (math.pi / 180) for deg in value)
-    get_next_deg_as_rad = lambda: deg_to_rad(
-        get_next_ushort_vector3()
-    )  # Eulers [0, 2pi]
-    get_next_pose_data = lambda: {
-        "bodyPosition": get_next_vector3(),
-        "bodyRotation": get_next_deg_as_rad(),  # Eulers
-        **(
-            {
-                "musicItemPropPosition": get_next_vector3(),
-                "musicItemPropRotation": get_next_deg_as_rad(),
-            }
-            if version >= (1, 1)
-            else {}
-        ),
-        "boneDatas": get_next_array(get_next_deg_as_rad),  # Eulers [0, 2pi]
-        "shapeDatas": get_next_array(get_next_float),  # [0,100]
-        **(
-            {"propBoneDatas": get_next_array(get_next_deg_as_rad)}  # Eulers [0, 2pi]
-            if version >= (1, 1)
-            else {}
-        ),
-        "heightOffset": get_next_short() * 0.01,
-        "isActive": get_next_mask(),
-        "useActiveFx": get_next_mask(),
-        **({"isEyeLookAt": get_next_mask()} if version >= (1, 4) else {}),
-    }
-    match decoder_signature:
-        case 0:
-            # Sekai_Streaming_MotionData
-            timeStamps = get_next_array(get_next_long) if get_next_pred() == 2 else None
-            poses = get_next_array(get_next_pose_data)
-            return {"type": "MotionData", "timeStamps": timeStamps, "poses": poses}
-        case 1:
-            # Sekai_Streaming_MotionCaptureData
-            read_character_capture_data = lambda: {
-                "id": get_next_int(),
-                "timestamp": get_next_long(),
-                "pose": get_next_pose_data(),
-            }
-            data = get_next_array(read_character_capture_data)
-            return {"type": "MotionCaptureData", "data": data}
-        case 2:
-            # Sekai_Streaming_SoundData
-            channels = get_next_int()
-            sample_rate = get_next_int()
-            data_length = get_next_int()
-            if compress_type != 1:
-                data = stream.read(data_length)  # Raw sampling data
-                return {
-                    "type": "SoundData",
-                    "channels": channels,
-                    "sampleRate": sample_rate,
-                    "encoding": "raw",
-                    "data": data,
-                }
-            else:
-                data = stream.read(data_length)  # HCA w/o metadata
-                return {
-                    "type": "SoundData",
-                    "channels": channels,
-                    "sampleRate": sample_rate,
-                    "encoding": "hca",
-                    "data": data,
-                }
-        case 3:
-            # Sekai_Streaming_StatusData
-            read_stage_status = lambda: {
-                "liveState": get_next_byte(),
-                "lightIntensity": get_next_float(),
-                "gayaVolume": get_next_float(),
-                "cheerVolume": get_next_float(),
-                "characterSpotlightIndex": get_next_int(),
-                "characterSpotlightIntensity": get_next_float(),
-                "stageSetlistIndex": get_next_int(),
-                "musicSetlistIndex": get_next_int(),
-                "musicTargetTime": get_next_long(),
-                "musicStartTime": get_next_float(),
-                "seId": get_next_int(),
-                "seStartTime": get_next_long(),
-                "timeStamp": get_next_long(),
-                "unk0": get_next_byte(),
-                "unk1": get_next_byte(),
-                "playTimelineId": get_next_int(),
-                **(
-                    {
-                        "screenFadeColorR": get_next_byte(),
-                        "screenFadeColorG": get_next_byte(),
-                        "screenFadeColorB": get_next_byte(),
-                        "screenFade": get_next_float(),
-                        "characterFormationRotate": get_next_int(),
-                        "stageCenterPosition": get_next_vector3(),
-                        "playerAvatarStartPosition": get_next_vector3(),
-                    }
-                    if version >= (1, 4)
-                    else {}
-                ),
-                **(
-                    {
-                        "characterVisible": get_next_mask(),
-                        "eyeLookAtTargetPositionOffset": get_next_vector3(),
-                        "eyeLookAtAngleLimit": get_next_vector3(),
-                        "isPreloadReverseCharacter": get_next_mask(),
-                    }
-                    if version >= (1, 5)
-                    else {}
-                ),
-                **(
-                    {
-                        "eyeLookAtUvLimit": get_next_quaternion(),
-                    }
-                    if version >= (1, 6)
-                    else {}
-                ),
-                **(
-                    {
-                        "preloadReserveFirstCharacterDelay": get_next_float(),
-                        "preloadReserveCharacterInterval": get_next_float(),
-                    }
-                    if version >= (1, 7)
-                    else {}
-                ),
-            }
-            read_character_status = lambda: {
-                "costumeIndex": get_next_int(),
-                **({"visible": get_next_mask()} if version >= (1, 6) else {}),
-                **({"useFx": get_next_mask()} if version >= (1, 2) else {}),
-                "timeStamp": get_next_long(),
-            }
-            stage_status_list = get_next_array(read_stage_status)
-            stage_status_length = get_next_int()
-            charcter_status_list = [
-                get_next_array(read_character_status)
-                for _ in range(stage_status_length)
-            ]
-            return {
-                "type": "StatusData",
-                "stageStatus": stage_status_list,
-                "characterStatus": charcter_status_list,
-            }
-        case 4:
-            # Sekai_Streaming_VirtualLiveMessageData
-            message_id = get_next_int()
-            user_id = get_next_string()
-            data_length = get_next_int()
-            data = stream.read(data_length)
-            # CP_BinarySerializer__Deserialize_OtherRoomMessageData
-            # CP_BinarySerializer__Deserialize_OtherRoomActionData
-            # NOTE: The msgpack payload does not contain the message type
-            data = msgpack.unpackb(data)
-            return {
-                "type": "VirtualLiveMessageData",
-                "messageId": message_id,
-                "userId": user_id,
-                "data": data,
-            }
-        case 5:
-            # Sekai_Streaming_ComplementInfoData
-            info_type = get_next_int()
-            info_data = get_next_string()
-            return {
-                "type": "ComplementInfoData",
-                "infoType": info_type,
-                "infoData": info_data,
-            }
-    return {"type": "Unknown", "data": buffer}
+    if __buffers and strict:
+        missing = [(group.timestamp, splitId) for splitId, group in __buffers.items()]
+        raise SSEMissingSplitPacketException(missing)
 
 
-result = defaultdict(dict)
+def iter_rla_frame_packets(
+    reader: Generator[Tuple[T, bytes], None, None],
+) -> Generator[Tuple[T, int, List[int]], None, None]:
+    """Frames a stream of rla fragments as `iter_rla_payloads` does with strict=False, by the
+    packet headers alone. Nothing is reassembled or decoded.
 
-T = TypeVar("T")
+    Split groups are complete once every `splitIndex` is received, so repeated chunks don't
+    complete them early. Corrupt packets and incomplete groups are left out.
+
+    Yields:
+        Generator[Tuple[T, int, List[int]], None, None]: Timestamp and header signature of each frame, and the positions (in `reader`) of the packets it's reassembled from, repeated chunks included.
+    """
+    __groups = dict()  # splitId : (RLASplitBuffer, [position])
+
+    for position, (timestamp, buffer) in enumerate(reader):
+        try:
+            encoded_length, _, header_signature, split_info = decode_buffer_header(
+                buffer
+            )
+            if len(buffer) != encoded_length:
+                continue
+            if not split_info:
+                yield timestamp, header_signature, [position]
+                continue
+            splitId, splitIndex, splitNum = split_info[:3]
+            entry = __groups.get(splitId, None)
+            if entry is None:
+                group = RLASplitBuffer(timestamp, header_signature, splitNum, -1)
+                entry = __groups[splitId] = (group, list())
+            group, members = entry
+            group.mark(splitIndex)
+        except Exception:
+            continue
+        members.append(position)
+        if group.complete:
+            del __groups[splitId]
+            yield timestamp, header_signature, members
+
+
+def decode_rla_payload(
+    version: tuple, header_signature: int, data: bytes, strict=True, columnar=False
+) -> dict:
+    """Decodes a payload from `iter_rla_payloads` into a frame. See `decode_streaming_data`."""
+    decoder_signature, data = decode_buffer_payload(data)
+    assert (
+        header_signature == decoder_signature
+    ), "mismatching signature (header/decoder). packet may be corrupt"
+    return decode_streaming_data(version, decoder_signature, data, strict, columnar)
+
+
+def decode_rla_payload_batch(
+    version: tuple, strict: bool, columnar: bool, batch: List[Tuple[int, bytes]]
+) -> List[dict]:
+    """`decode_rla_payload` over a batch of (header signature, payload). Runs in worker processes."""
+    return [
+        decode_rla_payload(version, header_signature, data, strict, columnar)
+        for header_signature, data in batch
+    ]
+
+
+class RLAFrame(Mapping):
+    """A frame, decoded on first access. Its type is known without decoding.
+
+    Keys can also be accessed as attributes, i.e. `frame.data` is `frame["data"]`. Which decodes
+    the frame, as does `hasattr(frame, key)`. Frames are decoded before being pickled or copied.
+    """
+
+    __slots__ = ("version", "signature", "payload", "strict", "columnar", "frame")
+
+    def __init__(self, version, signature, payload, strict=True, columnar=False):
+        self.version, self.signature, self.payload = version, signature, payload
+        self.strict, self.columnar = strict, columnar
+        self.frame = None
+
+    def decode(self) -> dict:
+        """The decoded frame. Decodes the payload once"""
+        if self.frame is None:
+            self.frame = decode_rla_payload(
+                self.version, self.signature, self.payload, self.strict, self.columnar
+            )
+            self.payload = None
+        return self.frame
+
+    @property
+    def type(self) -> str:
+        # As decoded, for signatures without a schema
+        return RLA_FRAME_TYPES.get(self.signature, "Unknown")
+
+    def __getitem__(self, key):
+        if key == "type" and self.frame is None:
+            return self.type
+        return self.decode()[key]
+
+    def __getattr__(self, name):
+        # Slots are looked up here until set, i.e. while unpickling. Never keys
+        if name in RLAFrame.__slots__ or name.startswith("__"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getstate__(self):
+        return self.decode()
+
+    def __setstate__(self, frame):
+        self.frame = frame
+
+    def __reduce__(self):
+        args = (self.version, self.signature, None, self.strict, self.columnar)
+        return RLAFrame, args, self.__getstate__()
+
+    def __iter__(self):
+        return iter(self.decode())
+
+    def __len__(self):
+        return len(self.decode())
+
+    def __repr__(self):
+        state = "decoded" if self.frame is not None else "pending"
+        return "<RLAFrame %s (%s)>" % (self.type, state)
 
 
 def read_rla_frames(
-    reader: Generator[Tuple[T, bytes], None, None], version=(1, 0), strict=True
+    reader: Generator[Tuple[T, bytes], None, None],
+    version=(1, 0),
+    strict=True,
+    columnar=False,
+    types=None,
+    lazy=False,
 ) -> Generator[Tuple[T, dict], None, None]:
     """Parses a stream of rla fragments and automatically processes split data
 
@@ -434,6 +923,9 @@ def read_rla_frames(
         reader (Generator[Tuple[T, bytes], None, None]): A generator that yields a tuple of timestamp and buffer data
         version (tuple, optional): RLA version, found in respective RLH (JSON) header files. range: see RLA_VERSIONS. Defaults to (1,0).
         strict (bool, optional): If False, incomplete packets will be returned as is. Defaults to True.
+        columnar (bool, optional): See `decode_streaming_data`. Defaults to False.
+        types (Iterable, optional): Frame types (i.e. "SoundData") or decoder signatures to keep. Others are skipped before decoding. Defaults to None (all).
+        lazy (bool, optional): Yield `RLAFrame`s, decoded on access. Defaults to False.
 
     Yields:
         Generator[Tuple[T, dict], None, None]: A generator that yields a tuple of timestamp and parsed frame data. Timestamp format is provided by the reader.
@@ -441,76 +933,200 @@ def read_rla_frames(
     assert (
         version >= RLA_VERSIONS[0] and version <= RLA_VERSIONS[-1]
     ), "unsupported version"
-    __buffers = defaultdict(
-        list
-    )  # splitIndex:([timestamp, splitInfo, header_signature, data])
-
-    def decode_buffer(header_signature, data):
-        decoder_signature, data = decode_buffer_payload(data)
-        assert (
-            header_signature == decoder_signature
-        ), "mismatching signature (header/decoder). packet may be corrupt"
-        payload = decode_streaming_data(version, decoder_signature, data, strict)
-        return payload
+    payloads = iter_rla_payloads(reader, strict, rla_signatures(types))
+    for timestamp, header_signature, data in payloads:
+        if lazy:
+            yield timestamp, RLAFrame(version, header_signature, data, strict, columnar)
+        else:
+            yield timestamp, decode_rla_payload(
+                version, header_signature, data, strict, columnar
+            )
 
-    for timestamp, buffer in reader:
+
+def read_rla_frames_parallel(
+    reader: Generator[Tuple[T, bytes], None, None],
+    version=(1, 0),
+    strict=True,
+    columnar=False,
+    executor: Executor = None,
+    workers: int = None,
+    batch_size: int = 256,
+    types=None,
+) -> Generator[Tuple[T, dict], None, None]:
+    """`read_rla_frames`, with the payloads decoded in a process pool.
+
+    Packets are framed and reassembled here, then decoded by the workers in batches. Frames are
+    yielded in the same order as `read_rla_frames`, and so are the exceptions.
+
+    Args:
+        reader (Generator[Tuple[T, bytes], None, None]): A generator that yields a tuple of timestamp and buffer data
+        version (tuple, optional): RLA version. Defaults to (1,0).
+        strict (bool, optional): If False, incomplete packets will be returned as is. Defaults to True.
+        columnar (bool, optional): See `decode_streaming_data`. Defaults to False.
+        executor (Executor, optional): Pool to decode with, i.e. one shared across files. Defaults to None, where a ProcessPoolExecutor of `workers` is used.
+        workers (int, optional): Number of workers. Also bounds the batches in flight. Defaults to None (CPU count).
+        batch_size (int, optional): Payloads per batch. Defaults to 256.
+        types (Iterable, optional): See `read_rla_frames`. Defaults to None (all).
+
+    Yields:
+        Generator[Tuple[T, dict], None, None]: A generator that yields a tuple of timestamp and parsed frame data.
+    """
+    assert (
+        version >= RLA_VERSIONS[0] and version <= RLA_VERSIONS[-1]
+    ), "unsupported version"
+    workers = workers or os.cpu_count() or 1
+    owned = executor is None
+    if owned:
+        executor = ProcessPoolExecutor(workers)
+    pending = deque()  # (timestamps, future)
+    batch, timestamps = list(), list()
+
+    def submit():
+        nonlocal batch, timestamps
+        if batch:
+            future = executor.submit(
+                decode_rla_payload_batch, version, strict, columnar, batch
+            )
+            pending.append((timestamps, future))
+            batch, timestamps = list(), list()
+
+    def drain(limit):
+        while len(pending) > limit:
+            timestamps, future = pending.popleft()
+            yield from zip(timestamps, future.result())
+
+    try:
+        error = None
         try:
-            split_info, header_signature, data = decode_buffer_base64(buffer)
+            for timestamp, header_signature, data in iter_rla_payloads(
+                reader, strict, rla_signatures(types)
+            ):
+                batch.append((header_signature, data))
+                timestamps.append(timestamp)
+                if len(batch) >= batch_size:
+                    submit()
+                    yield from drain(workers * 2)
         except Exception as e:
-            if strict:
-                raise e
-            # Otherwise fail silently
-        if split_info:
-            splitId, splitIndex, splitNum, dataLength, totalDataLength, base64 = (
-                split_info
-            )
-            __buffers[splitId].append((timestamp, split_info, header_signature, data))
-            if len(__buffers[splitId]) == splitNum:
-                buffer = b"".join(
-                    data
-                    for _, _, _, data in sorted(
-                        __buffers[splitId], key=lambda x: x[1][1]
-                    )  # splitIndex
-                )
-                if strict:
-                    assert len(buffer) == totalDataLength, "incomplete split packet"
-                del __buffers[splitId]
-                if base64:
-                    buffer = b64decode(buffer)
-                yield timestamp, decode_buffer(header_signature, buffer)
-        else:
-            yield timestamp, decode_buffer(header_signature, data)
+            # Frames before the error are yielded first
+            error = e
+        submit()
+        yield from drain(0)
+        if error:
+            raise error
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if owned:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-    if __buffers and strict:
-        missing = [(payload[0][0], splitId) for splitId, payload in __buffers.items()]
-        raise SSEMissingSplitPacketException(missing)
+
+class RLAArchiveIndex:
+    """Framing index of a RLA file: the tick, offset and length of every packet, from one scan.
+
+    Packets are memoryview slices of the archive, and are not copied. Counting frames and
+    seeking by tick need no decoding.
+
+    Usage:
+        index = RLAArchiveIndex(script)  # bytes, bytearray, memoryview or mmap
+        frames = read_rla_frames(index.packets(index.find(tick)), version)
+    """
+
+    HEADER = Struct("<QI")  # tick, length
+
+    def __init__(self, buffer):
+        self.view = view = memoryview(buffer).cast("B")
+        self.ticks = array("Q")
+        self.offsets = array("q")
+        self.lengths = array("q")
+        add_tick, add_offset, add_length = (
+            self.ticks.append,
+            self.offsets.append,
+            self.lengths.append,
+        )
+        unpack_from, header_size = self.HEADER.unpack_from, self.HEADER.size
+        size, offset = len(view), 0
+        while offset + header_size <= size:
+            tick, length = unpack_from(view, offset)
+            if not tick:
+                break
+            offset += header_size
+            if offset + length > size:
+                length = size - offset  # Truncated packets are kept, as with streams
+            add_tick(tick)
+            add_offset(offset)
+            add_length(length)
+            offset += length
+        self.is_sorted = all(map(int.__le__, self.ticks, self.ticks[1:]))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def __getitem__(self, index: int) -> Tuple[int, memoryview]:
+        offset = self.offsets[index]
+        return self.ticks[index], self.view[offset : offset + self.lengths[index]]
+
+    def __iter__(self):
+        return self.packets()
+
+    def packets(
+        self, start=0, stop=None
+    ) -> Generator[Tuple[int, memoryview], None, None]:
+        """Yields (tick, buffer) of the packets in [start, stop), in file order"""
+        view, window = self.view, slice(start, stop)
+        for tick, offset, length in zip(
+            self.ticks[window], self.offsets[window], self.lengths[window]
+        ):
+            yield tick, view[offset : offset + length]
+
+    def find(self, tick: int) -> int:
+        """Index of the first packet at or after `tick`. Requires packets sorted by tick"""
+        assert self.is_sorted, "packets are not sorted by tick"
+        return bisect_left(self.ticks, tick)
+
+    def frame_count(self) -> int:
+        """Number of frames once split packets are reassembled. Only the packet headers are read
+
+        Counted by `iter_rla_frame_packets`, as `RLASplitIndex.build` does.
+        """
+        return sum(1 for _ in iter_rla_frame_packets(self.packets()))
+
+    def release(self):
+        """Releases the view, i.e. before closing a mmap. Slices handed out must be released first"""
+        self.view.release()
+
+
+def iter_archive_rla_packets(src) -> Generator[Tuple[int, bytes], None, None]:
+    """Frames the packets of a RLA file. Yields (tick, buffer) of each packet
+
+    Bytes-like sources (bytes, memoryview, mmap) are framed with `RLAArchiveIndex`, without copying.
+    """
+    if not hasattr(src, "read") or isinstance(src, mmap):
+        yield from RLAArchiveIndex(src)
+        return
+    while tick := read_int(src, 8):
+        buffer_length = read_int(src, 4)
+        buffer = src.read(buffer_length)
+        yield tick, buffer
 
 
 def read_archive_rla_frames(
-    src: BytesIO, version=(1, 0), strict=True
+    src: BytesIO, version=(1, 0), strict=True, columnar=False, types=None, lazy=False
 ) -> Generator[Tuple[int, dict], None, None]:
     """Parses the Sekai RLA file format used in 'streaming_live/archive' assets.
 
     The frames are sorted by the frame ticks.
 
     Args:
-        src (BytesIO): Source RLA file stream
+        src (BytesIO): Source RLA file stream, or its bytes (bytes, memoryview, mmap). See `iter_archive_rla_packets`
         version (tuple, optional): RLA version, found in respective RLH (JSON) header files. range: see RLA_VERSIONS. Defaults to (1,0).
         strict (bool, optional): If False, incomplete packets will be returned as is. Defaults to True.
+        columnar (bool, optional): See `decode_streaming_data`. Defaults to False.
+        types (Iterable, optional): See `read_rla_frames`. Defaults to None (all).
+        lazy (bool, optional): See `read_rla_frames`. Defaults to False.
 
     Yields:
         Generator[Tuple[int, dict], None, None]: A generator that yields a tuple of timestamp and parsed frame data
     """
-
-    def __packet_gen():
-        nonlocal tick
-
-        while tick := read_int(src, 8):
-            if tick:
-                buffer_length = read_int(src, 4)
-                buffer = src.read(buffer_length)
-                yield tick, buffer
-
-    packets = __packet_gen()
-    for tick, frame in read_rla_frames(packets, version, strict):
+    packets = iter_archive_rla_packets(src)
+    for tick, frame in read_rla_frames(packets, version, strict, columnar, types, lazy):
         yield tick, frame
@@ -0,0 +1,389 @@
+"""Assembly of RLA SoundData frames into one continuous audio track.
+
+SoundData frames carry HCA blocks without the HCA header. The codec parameters of the header
+cannot be recovered from the blocks, so playable output needs a template: any HCA file encoded
+with the same settings, i.e. one from the live's own ACB. Its header is reused, with the block
+count patched and the CRC16 recomputed.
+
+Frames are written as they come (reordered within a small window), so the track is never held
+in memory. Gaps between frames (missing packets) are detected from their ticks and durations,
+filled with silence to keep the track aligned to the stream, and recorded in a JSON sidecar,
+`<output>.json`. HCA output is padded with silent blocks, so it's aligned to within half a block
+(512 samples). WAV output is padded with exact sample counts.
+
+Usage:
+    archive = RLAArchive.open("streaming_live/archive/...")
+    with RLAAudioTrackWriter(
+        "live.hca",
+        template=open("bgm.hca", "rb").read(),
+        ticks_per_second=archive.ticks_per_second,
+    ) as track:
+        for tick, frame in archive.frames(types=["SoundData"]):
+            track.add_tick(tick, frame)
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from logging import getLogger
+from struct import Struct
+from typing import BinaryIO
+import heapq, json
+
+from sssekai.fmt.rla_index import RLA_TICKS_PER_SECOND
+
+logger = getLogger(__name__)
+
+HCA_SAMPLES_PER_BLOCK = 1024
+HCA_BLOCK_SYNC = b"\xff\xff"
+HCA_AUDIO_FORMATS = ["hca", "wav"]
+
+WAV_HEADER = Struct("<4sI4s4sIHHIIHH4sI")
+
+
+def _crc16_table():
+    table = list()
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+HCA_CRC16_TABLE = _crc16_table()
+
+
+def hca_crc16(data: bytes) -> int:
+    """CRC16 of HCA headers and blocks (poly 0x8005). 0 over a block including its checksum"""
+    crc, table = 0, HCA_CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) ^ table[(crc >> 8) ^ byte]) & 0xFFFF
+    return crc
+
+
+@lru_cache(maxsize=4)
+def hca_silent_block(block_size: int) -> bytes:
+    """A HCA block that decodes to silence.
+
+    All scalefactors are zero, so no spectra are read. Zero bytes (and the sync) are left as is
+    by HCA ciphers, so the block is valid for encrypted streams too.
+    """
+    block = bytearray(block_size)
+    block[:2] = HCA_BLOCK_SYNC
+    block[-2:] = hca_crc16(block[:-2]).to_bytes(2, "big")
+    return bytes(block)
+
+
+def find_hca_blocks(data: bytes, block_size: int = None) -> tuple:
+    """Locates the HCA blocks of a SoundData payload.
+
+    Args:
+        data (bytes): SoundData `data`
+        block_size (int, optional): Known block size. Defaults to None, where it's detected from the spacing of block syncs, confirmed by their CRC16.
+
+    Returns:
+        (offset of the first block, block size, block count). Block size is 0 if none is found
+    """
+    start = data.find(HCA_BLOCK_SYNC)
+    if start < 0:
+        return 0, 0, 0
+    if not block_size:
+        size, end = 0, len(data)
+        position = data.find(HCA_BLOCK_SYNC, start + 2)
+        while True:
+            candidate = (position if position >= 0 else end) - start
+            if candidate > 2 and hca_crc16(data[start : start + candidate]) == 0:
+                size = candidate
+                break
+            if position < 0:
+                break
+            position = data.find(HCA_BLOCK_SYNC, position + 1)
+        if not size:
+            return start, 0, 0
+        block_size = size
+    return start, block_size, (len(data) - start) // block_size
+
+
+@dataclass
+class HCAHeader:
+    """A HCA header, as a template for headerless blocks"""
+
+    data: bytes
+    channels: int
+    sample_rate: int
+    block_count: int
+    block_size: int
+    fmt_offset: int  # Offset of the 'fmt' chunk
+
+    @classmethod
+    def parse(cls, hca: bytes) -> "HCAHeader":
+        """Parses the header of a HCA file (or of its first bytes)"""
+        # HCA\0. Chunk names are masked, as the high bits are set in encrypted headers
+        magic = int.from_bytes(hca[:4], "big") & 0x7F7F7F7F
+        assert magic == 0x48434100, "not a HCA file"
+        header_size = int.from_bytes(hca[6:8], "big")
+        data = bytes(hca[:header_size])
+        assert len(data) == header_size, "truncated HCA header"
+        channels = sample_rate = block_count = block_size = fmt_offset = None
+        offset = 8
+        while offset + 4 <= header_size:
+            chunk = (
+                int.from_bytes(data[offset : offset + 4], "big") & 0x7F7F7F7F
+            ).to_bytes(4, "big")
+            match chunk:
+                case b"fmt\x00":
+                    fmt_offset = offset
+                    channels = data[offset + 4]
+                    sample_rate = int.from_bytes(data[offset + 5 : offset + 8], "big")
+                    block_count = int.from_bytes(data[offset + 8 : offset + 12], "big")
+                    offset += 16
+                case b"comp":
+                    block_size = int.from_bytes(data[offset + 4 : offset + 6], "big")
+                    offset += 16
+                case b"dec\x00":
+                    block_size = int.from_bytes(data[offset + 4 : offset + 6], "big")
+                    offset += 12
+                case b"loop":
+                    offset += 16
+                case b"vbr\x00":
+                    offset += 8
+                case b"ath\x00" | b"ciph":
+                    offset += 6
+                case b"rva\x00":
+                    offset += 8
+                case _:  # 'pad', 'comm', or the CRC
+                    break
+        assert fmt_offset is not None and block_size, "missing fmt/comp chunks"
+        return cls(data, channels, sample_rate, block_count, block_size, fmt_offset)
+
+    def patched(self, block_count: int, delay: int = None, padding: int = 0) -> bytes:
+        """The header for `block_count` blocks, with the CRC16 recomputed.
+
+        Encoder delay is kept unless given; padding is zeroed by default.
+        """
+        data = bytearray(self.data)
+        offset = self.fmt_offset
+        data[offset + 8 : offset + 12] = block_count.to_bytes(4, "big")
+        if delay is not None:
+            data[offset + 12 : offset + 14] = delay.to_bytes(2, "big")
+        data[offset + 14 : offset + 16] = padding.to_bytes(2, "big")
+        data[-2:] = hca_crc16(data[:-2]).to_bytes(2, "big")
+        return bytes(data)
+
+
+class RLAAudioTrackWriter:
+    """Streams SoundData frames into one HCA (or WAV) file, with gap detection.
+
+    Args:
+        output (str): Output file. The sidecar is written to `<output>.json`
+        format (str, optional): "hca", or "wav" (needs sssekai[criware]). Defaults to "hca".
+        template (bytes, optional): A HCA file encoded with the same settings. Without it, "hca" output is the bare blocks, which needs a header prepended to be played. Defaults to None.
+        tolerance (float, optional): Seconds of slack before a gap between frames is reported. Defaults to 0.05.
+        reorder (int, optional): Frames buffered to put them in time order. Defaults to 16.
+        ticks_per_second (int, optional): Unit of the ticks given to `add_tick`. Defaults to RLA_TICKS_PER_SECOND.
+    """
+
+    def __init__(
+        self,
+        output: str,
+        format: str = "hca",
+        template: bytes = None,
+        tolerance: float = 0.05,
+        reorder: int = 16,
+        ticks_per_second: int = RLA_TICKS_PER_SECOND,
+    ):
+        assert format in HCA_AUDIO_FORMATS, "unknown format %s" % format
+        self.output, self.format = output, format
+        self.header = HCAHeader.parse(template) if template else None
+        self.tolerance, self.reorder = tolerance, reorder
+        self.ticks_per_second = ticks_per_second
+        self.channels = self.sample_rate = self.block_size = None
+        self.blocks = 0  # Blocks written, including silent ones
+        self.remainder = 0.0  # Samples of silence owed, short of a whole block
+        self.samples = 0  # Samples (per channel) written, or spanned by HCA blocks
+        self.frames = 0
+        self.skipped = 0  # Frames out of order, or of mismatching format
+        self.gaps = list()
+        self.pending = list()  # Heap of (seconds or 0, order, frame, seconds)
+        self.end = None  # Seconds at the end of the last frame
+        self.previous = None  # Last block written, primes the WAV decoder
+        self.file: BinaryIO = None
+        if format == "wav":
+            assert self.header, "WAV output needs a HCA template"
+            try:
+                from PyCriCodecsEx.hca import HCA
+
+                self.hca_decoder = HCA
+            except ImportError as e:
+                logger.error(
+                    "Please install sssekai[criware] through your Python package manager to decode HCA audio"
+                )
+                raise e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, seconds: float, frame: dict):
+        """Adds a SoundData frame at `seconds`. None (unknown time) disables gap detection"""
+        if frame["type"] != "SoundData":
+            return
+        if frame["encoding"] != "hca":
+            raise ValueError("unsupported encoding: %s" % frame["encoding"])
+        heapq.heappush(self.pending, (seconds or 0, self.frames, frame, seconds))
+        self.frames += 1
+        if len(self.pending) > self.reorder:
+            self.__write(*heapq.heappop(self.pending)[2:])
+
+    def add_tick(self, tick: int, frame: dict):
+        """Adds a SoundData frame at the archive packet `tick`, in units of `ticks_per_second`"""
+        self.add(tick / self.ticks_per_second, frame)
+
+    def __open(self, frame: dict, block_size: int):
+        self.channels, self.sample_rate = frame["channels"], frame["sampleRate"]
+        self.block_size = block_size
+        if self.header:
+            assert (
+                self.header.channels == self.channels
+                and self.header.sample_rate == self.sample_rate
+                and self.header.block_size == block_size
+            ), "template is of %dch %dHz %dB blocks, stream is of %dch %dHz %dB" % (
+                self.header.channels,
+                self.header.sample_rate,
+                self.header.block_size,
+                self.channels,
+                self.sample_rate,
+                block_size,
+            )
+        self.file = open(self.output, "wb")
+        if self.format == "wav":
+            self.file.write(bytes(WAV_HEADER.size))
+        elif self.header:
+            self.file.write(self.header.patched(0))
+
+    def __silence(self, seconds: float):
+        self.previous = None
+        if self.format == "wav":
+            samples = int(round(seconds * self.sample_rate))
+            self.file.write(bytes(samples * self.channels * 2))
+            self.samples += samples
+            return
+        # Rounded to whole blocks. The remainder is carried over, so it never accumulates
+        self.remainder += seconds * self.sample_rate
+        count = int(round(self.remainder / HCA_SAMPLES_PER_BLOCK))
+        self.remainder -= count * HCA_SAMPLES_PER_BLOCK
+        self.file.write(hca_silent_block(self.block_size) * count)
+        self.blocks += count
+        self.samples += count * HCA_SAMPLES_PER_BLOCK
+
+    def __write(self, frame: dict, seconds: float):
+        data = frame["data"]
+        start, block_size, count = find_hca_blocks(
+            data, self.block_size or (self.header and self.header.block_size)
+        )
+        if not count:
+            logger.warning("No HCA blocks found in frame at %s" % seconds)
+            self.skipped += 1
+            return
+        if self.file is None:
+            self.__open(frame, block_size)
+        elif (frame["channels"], frame["sampleRate"]) != (
+            self.channels,
+            self.sample_rate,
+        ):
+            logger.warning("Skipped frame at %s of another format" % seconds)
+            self.skipped += 1
+            return
+        duration = count * HCA_SAMPLES_PER_BLOCK / self.sample_rate
+        if seconds is not None and self.end is not None:
+            delta = seconds - self.end
+            if delta > self.tolerance:
+                self.gaps.append(
+                    {
+                        "seconds": self.end,
+                        "duration": delta,
+                        "block": self.blocks,
+                    }
+                )
+                logger.warning("Gap of %.3fs at %.3fs" % (delta, self.end))
+                self.__silence(delta)
+            elif delta < -self.tolerance and delta + duration <= 0:
+                logger.warning("Skipped frame at %.3fs, already covered" % seconds)
+                self.skipped += 1
+                return
+        blocks = data[start : start + count * block_size]
+        if self.format == "wav":
+            self.__decode(blocks, count)
+        else:
+            self.file.write(blocks)
+            self.samples += count * HCA_SAMPLES_PER_BLOCK
+        self.blocks += count
+        self.previous = blocks[-block_size:]
+        if seconds is not None:
+            self.end = seconds + duration
+
+    def __decode(self, blocks: bytes, count: int):
+        # Blocks overlap by half a block in the MDCT, so the last block written primes
+        # the decoder. Its samples are decoded again, and dropped.
+        prime = self.previous or b""
+        primed = 1 if prime else 0
+        hca = self.header.patched(count + primed, delay=0, padding=0)
+        wav = self.hca_decoder(hca + prime + blocks).decode()
+        data = wav.find(b"data") + 8
+        skip = primed * HCA_SAMPLES_PER_BLOCK * self.channels * 2
+        self.file.write(wav[data + skip :])
+        self.samples += count * HCA_SAMPLES_PER_BLOCK
+
+    def close(self):
+        """Writes the buffered frames, finalizes the header, and writes the sidecar"""
+        while self.pending:
+            self.__write(*heapq.heappop(self.pending)[2:])
+        if self.file is None:
+            logger.warning("No audio frames written to %s" % self.output)
+            return
+        if self.format == "wav":
+            size = self.samples * self.channels * 2
+            self.file.seek(0)
+            self.file.write(
+                WAV_HEADER.pack(
+                    b"RIFF",
+                    size + WAV_HEADER.size - 8,
+                    b"WAVE",
+                    b"fmt ",
+                    16,
+                    1,
+                    self.channels,
+                    self.sample_rate,
+                    self.sample_rate * self.channels * 2,
+                    self.channels * 2,
+                    16,
+                    b"data",
+                    size,
+                )
+            )
+        elif self.header:
+            self.file.seek(0)
+            self.file.write(self.header.patched(self.blocks))
+        else:
+            logger.warning(
+                "%s holds bare HCA blocks. Supply a template to make it playable"
+                % self.output
+            )
+        self.file.close()
+        with open(self.output + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def summary(self) -> dict:
+        return {
+            "format": self.format if self.header else "hca-blocks",
+            "channels": self.channels,
+            "sampleRate": self.sample_rate,
+            "blockSize": self.block_size,
+            "blocks": self.blocks,
+            "samples": self.samples,
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "gaps": self.gaps,
+        }
@@ -0,0 +1,261 @@
+"""Columnar (NumPy) motion tracks of RLA MotionData and MotionCaptureData frames.
+
+Poses are decoded without per-bone tuples (see `decode_streaming_data(..., columnar=True)`),
+accumulated per character into preallocated arrays, and converted to radians in one pass.
+
+Usage:
+    tracks = read_archive_rla_motion_tracks(src, version)
+    for id, track in tracks.items():
+        track.seconds(), track.boneDatas  # (frames,), (frames, bones, 3)
+"""
+
+from dataclasses import dataclass, fields
+from logging import getLogger
+from typing import Dict, Iterable, Tuple, TypeVar
+from io import BytesIO
+import math
+
+from sssekai.fmt.rla import read_rla_frames, read_archive_rla_frames
+
+logger = getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    logger.error(
+        "Please install sssekai[rla] through your Python package manager to use columnar RLA decoding"
+    )
+    raise e
+
+T = TypeVar("T")
+
+DEG_TO_RAD = math.pi / 180
+
+# Pose key : column kind
+#   vector3 : (frames, 3)
+#   rad3    : (frames, 3), raw 0.01 degrees -> radians
+#   rad3[]  : (frames, n, 3), flattened raw 0.01 degrees -> radians. Ragged
+#   float[] : (frames, n). Ragged
+#   float   : (frames,)
+#   mask    : (frames,) bool
+RLA_POSE_COLUMNS = {
+    "bodyPosition": "vector3",
+    "bodyRotation": "rad3",
+    "musicItemPropPosition": "vector3",
+    "musicItemPropRotation": "rad3",
+    "boneDatas": "rad3[]",
+    "shapeDatas": "float[]",
+    "propBoneDatas": "rad3[]",
+    "heightOffset": "float",
+    "isActive": "mask",
+    "useActiveFx": "mask",
+    "isEyeLookAt": "mask",
+}
+
+
+@dataclass
+class RLAMotionTrack:
+    """Poses of one character, one row per sample. Eulers are in radians.
+
+    Ragged columns (boneDatas, shapeDatas, propBoneDatas) are as wide as the largest sample, and
+    padded with NaN. Their element counts per sample are in `counts`. Columns absent in the RLA
+    version are None.
+    """
+
+    id: int  # Character id (MotionCaptureData), or index of the pose (MotionData)
+    ticks: np.ndarray  # (frames,) Ticks of the frames, as given by the reader
+    timeStamps: np.ndarray  # (frames,) uint64. 0 where absent
+    counts: Dict[str, np.ndarray]  # Ragged column : (frames,) element counts
+    bodyPosition: np.ndarray = None
+    bodyRotation: np.ndarray = None
+    musicItemPropPosition: np.ndarray = None
+    musicItemPropRotation: np.ndarray = None
+    boneDatas: np.ndarray = None
+    shapeDatas: np.ndarray = None
+    propBoneDatas: np.ndarray = None
+    heightOffset: np.ndarray = None
+    isActive: np.ndarray = None
+    useActiveFx: np.ndarray = None
+    isEyeLookAt: np.ndarray = None
+
+    def __len__(self):
+        return len(self.timeStamps)
+
+    def seconds(self) -> np.ndarray:
+        """Time of each sample in seconds since the first, assuming .NET ticks (100ns) as timestamps"""
+        if not len(self):
+            return np.zeros(0)
+        return (self.timeStamps - self.timeStamps[0]).astype(np.int64) / 1e7
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """All present columns, i.e. for `np.savez(path, **track.arrays())`"""
+        arrays = {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if isinstance(getattr(self, f.name), np.ndarray)
+        }
+        arrays.update({key + "Counts": count for key, count in self.counts.items()})
+        return arrays
+
+
+class RLAMotionTrackBuilder:
+    """Accumulates the poses of one character into preallocated columns, grown geometrically."""
+
+    def __init__(self, id: int, capacity: int = 256):
+        self.id = id
+        self.n = 0
+        self.capacity = capacity
+        self.ticks = list()
+        self.timeStamps = np.zeros(capacity, np.uint64)
+        self.columns = dict()  # key : ndarray
+        self.counts = dict()  # key : ndarray
+
+    @staticmethod
+    def __resized(array: np.ndarray, rows: int, width: int = None, fill=np.nan):
+        shape = (rows,) + ((width,) if width is not None else array.shape[1:])
+        resized = np.full(shape, fill, array.dtype)
+        n, w = min(len(array), rows), None if width is None else array.shape[1]
+        if w is None:
+            resized[:n] = array[:n]
+        else:
+            resized[:n, :w] = array[:n]
+        return resized
+
+    def __reserve(self, capacity: int):
+        self.timeStamps = self.__resized(self.timeStamps, capacity, fill=0)
+        for key, column in self.columns.items():
+            fill = False if column.dtype == bool else np.nan
+            self.columns[key] = self.__resized(column, capacity, fill=fill)
+        for key, count in self.counts.items():
+            self.counts[key] = self.__resized(count, capacity, fill=0)
+        self.capacity = capacity
+
+    def __column(self, key: str, kind: str, width: int = 0) -> np.ndarray:
+        column = self.columns.get(key, None)
+        if column is None:
+            match kind:
+                case "vector3" | "rad3":
+                    column = np.full((self.capacity, 3), np.nan)
+                case "float":
+                    column = np.full(self.capacity, np.nan)
+                case "mask":
+                    column = np.zeros(self.capacity, bool)
+                case _:  # Ragged
+                    column = np.full((self.capacity, width), np.nan)
+                    self.counts[key] = np.zeros(self.capacity, np.int32)
+            self.columns[key] = column
+        elif kind.endswith("[]") and width > column.shape[1]:
+            column = self.columns[key] = self.__resized(
+                column, self.capacity, max(width, column.shape[1] * 2)
+            )
+        return column
+
+    def add(self, tick, timeStamp: int, pose: dict):
+        """Append a pose, as decoded with `columnar=True`"""
+        if self.n == self.capacity:
+            self.__reserve(self.capacity * 2)
+        i = self.n
+        self.ticks.append(tick)
+        self.timeStamps[i] = timeStamp
+        for key, value in pose.items():
+            kind = RLA_POSE_COLUMNS.get(key, None)
+            if kind is None:
+                continue
+            if kind.endswith("[]"):
+                column = self.__column(key, kind, len(value))
+                column[i, : len(value)] = value
+                self.counts[key][i] = len(value) // (3 if kind == "rad3[]" else 1)
+            else:
+                self.__column(key, kind)[i] = value
+        self.n += 1
+
+    def build(self) -> RLAMotionTrack:
+        n = self.n
+        ticks = np.asarray(self.ticks)
+        timeStamps = self.timeStamps[:n].copy()
+        columns = dict()
+        for key, column in self.columns.items():
+            kind = RLA_POSE_COLUMNS[key]
+            column = column[:n].copy()
+            if kind.endswith("[]"):
+                stride = 3 if kind == "rad3[]" else 1
+                width = int(self.counts[key][:n].max()) * stride if n else 0
+                column = column[:, :width]
+            if kind.startswith("rad3"):
+                # Same operations as the row decoder, for identical results
+                column *= 0.01
+                column *= DEG_TO_RAD
+            if kind == "rad3[]":
+                column = column.reshape(n, column.shape[1] // 3, 3)
+            columns[key] = column
+        counts = {key: count[:n].copy() for key, count in self.counts.items()}
+        if n and np.any(np.diff(timeStamps) < 0):
+            order = np.argsort(timeStamps, kind="stable")
+            ticks, timeStamps = ticks[order], timeStamps[order]
+            columns = {key: column[order] for key, column in columns.items()}
+            counts = {key: count[order] for key, count in counts.items()}
+        return RLAMotionTrack(self.id, ticks, timeStamps, counts, **columns)
+
+
+class RLAMotionTrackCollector:
+    """Collects the poses of MotionData and MotionCaptureData frames, one at a time. Other frames are skipped."""
+
+    def __init__(self):
+        self.builders = dict()  # id : RLAMotionTrackBuilder
+
+    def builder(self, id) -> RLAMotionTrackBuilder:
+        if id not in self.builders:
+            self.builders[id] = RLAMotionTrackBuilder(id)
+        return self.builders[id]
+
+    def add(self, tick, frame: dict):
+        """Adds a frame, decoded with `columnar=True`"""
+        match frame["type"]:
+            case "MotionData":
+                timeStamps = frame["timeStamps"] or []
+                for index, pose in enumerate(frame["poses"]):
+                    timeStamp = timeStamps[index] if index < len(timeStamps) else 0
+                    self.builder(index).add(tick, timeStamp, pose)
+            case "MotionCaptureData":
+                for data in frame["data"]:
+                    self.builder(data["id"]).add(tick, data["timestamp"], data["pose"])
+
+    def build(self) -> Dict[int, RLAMotionTrack]:
+        return {id: self.builders[id].build() for id in sorted(self.builders)}
+
+
+def build_rla_motion_tracks(
+    frames: Iterable[Tuple[T, dict]],
+) -> Dict[int, RLAMotionTrack]:
+    """Collects the poses of MotionData and MotionCaptureData frames into tracks per character.
+
+    Other frames are skipped.
+
+    Args:
+        frames (Iterable[Tuple[T, dict]]): Ticks and frames, decoded with `columnar=True`
+
+    Returns:
+        Dict[int, RLAMotionTrack]: Character id (MotionCaptureData) or pose index (MotionData) : track, sorted by timestamps
+    """
+    collector = RLAMotionTrackCollector()
+    for tick, frame in frames:
+        collector.add(tick, frame)
+    return collector.build()
+
+
+def read_rla_motion_tracks(
+    reader: Iterable[Tuple[T, bytes]], version=(1, 0), strict=True
+) -> Dict[int, RLAMotionTrack]:
+    """Motion tracks of a stream of rla fragments. See `read_rla_frames` and `build_rla_motion_tracks`"""
+    return build_rla_motion_tracks(
+        read_rla_frames(reader, version, strict, columnar=True)
+    )
+
+
+def read_archive_rla_motion_tracks(
+    src: BytesIO, version=(1, 0), strict=True
+) -> Dict[int, RLAMotionTrack]:
+    """Motion tracks of a RLA file. See `read_archive_rla_frames` and `build_rla_motion_tracks`"""
+    return build_rla_motion_tracks(
+        read_archive_rla_frames(src, version, strict, columnar=True)
+    )
@@ -0,0 +1,340 @@
+"""Persistent seek index of RLA archives ('streaming_live/archive' bundles).
+
+Every frame of every split file is indexed by its tick, decoder signature, and the packets it
+is reassembled from. Time windows and frame types can then be decoded without decoding (or
+reassembling) anything before them. The index is saved as a JSON sidecar next to the archive,
+and rebuilt when the archive changes.
+
+Usage:
+    archive = RLAArchive.open("streaming_live/archive/...")
+    t0 = archive.tick_at(45 * 60)
+    for tick, frame in archive.frames(t0, archive.tick_at(46 * 60), types=["SoundData"]):
+        ...
+
+The tick unit is an option (`ticks_per_second`), to be shared with `RLAAudioTrackWriter` so
+seeking and gap padding agree on it.
+"""
+
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Dict, Generator, Iterable, List, Tuple
+import os, json
+
+from sssekai.fmt.rla import (
+    RLAArchiveIndex,
+    iter_rla_frame_packets,
+    read_rla_frames,
+    rla_signatures,
+)
+
+logger = getLogger(__name__)
+
+RLA_INDEX_VERSION = 1
+RLA_INDEX_SUFFIX = ".rlaidx.json"
+# Assumed to be .NET ticks (100ns). No captured archive has been checked against it
+RLA_TICKS_PER_SECOND = 10_000_000
+
+
+@dataclass
+class RLASplitIndex:
+    """Packets and frames of one split (.rla) file"""
+
+    name: str
+    size: int  # Byte size of the split file
+    # Packets, in file order
+    ticks: array = field(default_factory=lambda: array("Q"))
+    offsets: array = field(default_factory=lambda: array("q"))
+    lengths: array = field(default_factory=lambda: array("q"))
+    packet_frames: array = field(
+        default_factory=lambda: array("q")
+    )  # Frame of each packet. -1 if corrupt, or of an incomplete split group
+    # Frames, in the order `read_rla_frames` yields them
+    frame_ticks: array = field(default_factory=lambda: array("Q"))
+    frame_signatures: array = field(default_factory=lambda: array("h"))
+    frame_first: array = field(default_factory=lambda: array("q"))  # First packet
+    frame_last: array = field(default_factory=lambda: array("q"))  # Completing packet
+
+    COLUMNS = {
+        "ticks": "Q",
+        "offsets": "q",
+        "lengths": "q",
+        "packet_frames": "q",
+        "frame_ticks": "Q",
+        "frame_signatures": "h",
+        "frame_first": "q",
+        "frame_last": "q",
+    }
+
+    def __post_init__(self):
+        ticks = self.frame_ticks
+        self.is_sorted = all(map(int.__le__, ticks, ticks[1:]))
+
+    @classmethod
+    def build(cls, name: str, buffer) -> "RLASplitIndex":
+        """Indexes a split file. Only the packet headers are read, and corrupt packets are left out"""
+        packets = RLAArchiveIndex(buffer)
+        index = cls(name, len(packets.view))
+        index.ticks, index.offsets, index.lengths = (
+            packets.ticks,
+            packets.offsets,
+            packets.lengths,
+        )
+        index.packet_frames = array("q", [-1]) * len(packets)
+        # Frames end where the decoder completes them. Corrupt packets are skipped by
+        # non-strict readers, and raised by strict ones
+        for tick, signature, group in iter_rla_frame_packets(packets):
+            frame = len(index.frame_ticks)
+            for member in group:
+                index.packet_frames[member] = frame
+            index.frame_ticks.append(tick)
+            index.frame_signatures.append(signature)
+            index.frame_first.append(group[0])
+            index.frame_last.append(group[-1])
+        packets.release()
+        index.__post_init__()
+        return index
+
+    def __len__(self):
+        return len(self.frame_ticks)
+
+    def select(
+        self, t0: int = None, t1: int = None, signatures: set = None
+    ) -> List[int]:
+        """Frames with ticks in [t0, t1) and one of `signatures`. None for no bound"""
+        ticks = self.frame_ticks
+        lo, hi = 0, len(ticks)
+        if self.is_sorted:
+            lo = lo if t0 is None else bisect_left(ticks, t0)
+            hi = hi if t1 is None else bisect_left(ticks, t1)
+        return [
+            frame
+            for frame in range(lo, hi)
+            if (t0 is None or ticks[frame] >= t0)
+            and (t1 is None or ticks[frame] < t1)
+            and (signatures is None or self.frame_signatures[frame] in signatures)
+        ]
+
+    def packets(
+        self, buffer, frames: List[int]
+    ) -> Generator[Tuple[int, memoryview], None, None]:
+        """Yields (tick, buffer) of the packets making up `frames`, in file order"""
+        if not frames:
+            return
+        view, selected = memoryview(buffer).cast("B"), set(frames)
+        lo = min(self.frame_first[frame] for frame in frames)
+        hi = max(self.frame_last[frame] for frame in frames)
+        for packet in range(lo, hi + 1):
+            if self.packet_frames[packet] in selected:
+                offset = self.offsets[packet]
+                yield self.ticks[packet], view[offset : offset + self.lengths[packet]]
+
+    def todict(self) -> dict:
+        return {"name": self.name, "size": self.size} | {
+            column: getattr(self, column).tolist() for column in self.COLUMNS
+        }
+
+    @classmethod
+    def fromdict(cls, data: dict) -> "RLASplitIndex":
+        return cls(
+            data["name"],
+            data["size"],
+            **{
+                column: array(typecode, data[column])
+                for column, typecode in cls.COLUMNS.items()
+            },
+        )
+
+
+@dataclass
+class RLASeekIndex:
+    """Seek index of a RLA archive, in the split order of its RLH header"""
+
+    header: dict
+    splits: List[RLASplitIndex]
+    source: dict = field(default_factory=dict)  # Fingerprint of the archive file
+
+    @classmethod
+    def build(cls, header: dict, scripts: Dict[str, bytes], source: dict = None):
+        return cls(
+            header,
+            [
+                RLASplitIndex.build(name, scripts[name])
+                for name in rla_split_names(header)
+            ],
+            source or dict(),
+        )
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": RLA_INDEX_VERSION,
+                    "header": self.header,
+                    "source": self.source,
+                    "splits": [split.todict() for split in self.splits],
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RLASeekIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["version"] == RLA_INDEX_VERSION, "unsupported index version"
+        return cls(
+            data["header"],
+            [RLASplitIndex.fromdict(split) for split in data["splits"]],
+            data["source"],
+        )
+
+
+def rla_split_names(header: dict) -> List[str]:
+    """TextAsset names of the split files of a RLH header, in order"""
+    return [
+        "sekai_%02d_%08d.rla" % (header["splitSeconds"], sid)
+        for sid in header["splitFileIds"]
+    ]
+
+
+def rla_source_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_rla_archive_bundle(env) -> Tuple[dict, Dict[str, bytes]]:
+    """RLH header and scripts (name : bytes) of the TextAssets of a loaded archive bundle"""
+    from UnityPy.enums import ClassIDType
+    from sssekai.unity.AssetBundle import read_textasset_bytes
+
+    scripts = dict()
+    for obj in env.objects:
+        if obj.type in {ClassIDType.TextAsset}:
+            name, script = read_textasset_bytes(obj)
+            scripts[name] = script
+    header = scripts.get("sekai.rlh", None)
+    assert header, "RLH Header file not found!"
+    return json.loads(bytes(header)), scripts
+
+
+class RLAArchive:
+    """A RLA archive with its seek index. See `RLAArchive.open`"""
+
+    def __init__(
+        self,
+        header: dict,
+        scripts: Dict[str, bytes],
+        index: RLASeekIndex,
+        ticks_per_second: int = RLA_TICKS_PER_SECOND,
+    ):
+        self.header = header
+        self.scripts = scripts
+        self.index = index
+        self.version = tuple(map(int, header["version"].split(".")))
+        self.ticks_per_second = ticks_per_second
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        sidecar: str = None,
+        save=True,
+        ticks_per_second: int = RLA_TICKS_PER_SECOND,
+    ) -> "RLAArchive":
+        """Loads an archive bundle, and its sidecar index (`<path>.rlaidx.json` by default).
+
+        The index is (re)built if the sidecar is missing, unreadable, or of another archive,
+        and saved if `save` is set. `ticks_per_second` is the unit of the packet ticks, see
+        `tick_at`.
+        """
+        from sssekai.unity.AssetBundle import load_assetbundle
+
+        sidecar = sidecar or path + RLA_INDEX_SUFFIX
+        source = rla_source_fingerprint(path)
+        with open(path, "rb") as f:
+            header, scripts = read_rla_archive_bundle(load_assetbundle(f))
+        index = None
+        if os.path.isfile(sidecar):
+            try:
+                index = RLASeekIndex.load(sidecar)
+                assert index.source == source, "archive changed"
+                assert all(
+                    split.size == len(scripts[split.name]) for split in index.splits
+                ), "split size mismatch"
+            except Exception as e:
+                logger.warning("Rebuilding index %s: %s" % (sidecar, e))
+                index = None
+        if index is None:
+            index = RLASeekIndex.build(header, scripts, source)
+            if save:
+                index.save(sidecar)
+                logger.debug("Saved index to %s" % sidecar)
+        return cls(header, scripts, index, ticks_per_second)
+
+    @classmethod
+    def from_scripts(
+        cls,
+        header: dict,
+        scripts: Dict[str, bytes],
+        ticks_per_second: int = RLA_TICKS_PER_SECOND,
+    ) -> "RLAArchive":
+        """An archive of already loaded scripts, with an index built in memory"""
+        index = RLASeekIndex.build(header, scripts)
+        return cls(header, scripts, index, ticks_per_second)
+
+    def __len__(self):
+        """Number of frames"""
+        return sum(len(split) for split in self.index.splits)
+
+    @property
+    def first_tick(self) -> int:
+        return min(
+            (split.frame_ticks[0] for split in self.index.splits if len(split)),
+            default=0,
+        )
+
+    @property
+    def last_tick(self) -> int:
+        return max(
+            (split.frame_ticks[-1] for split in self.index.splits if len(split)),
+            default=0,
+        )
+
+    def tick_at(self, seconds: float) -> int:
+        """Tick `seconds` after the first frame, in units of `ticks_per_second`"""
+        return self.first_tick + int(seconds * self.ticks_per_second)
+
+    def frames(
+        self,
+        t0: int = None,
+        t1: int = None,
+        types: Iterable = None,
+        strict=True,
+        columnar=False,
+        lazy=False,
+    ) -> Generator[Tuple[int, dict], None, None]:
+        """Decodes the frames with ticks in [t0, t1), optionally only of some types.
+
+        Only the packets of the selected frames are reassembled and decoded.
+
+        Args:
+            t0 (int, optional): First tick, inclusive. Defaults to None (from the start).
+            t1 (int, optional): Last tick, exclusive. Defaults to None (to the end).
+            types (Iterable, optional): Frame types (i.e. "SoundData") or decoder signatures. Defaults to None (all).
+            strict (bool, optional): See `read_rla_frames`. Defaults to True.
+            columnar (bool, optional): See `decode_streaming_data`. Defaults to False.
+            lazy (bool, optional): See `read_rla_frames`. Defaults to False.
+
+        Yields:
+            Generator[Tuple[int, dict], None, None]: Tick and frame, in split order
+        """
+        signatures = rla_signatures(types)
+        for split in self.index.splits:
+            if not len(split):
+                continue
+            frames = split.select(t0, t1, signatures)
+            packets = split.packets(self.scripts[split.name], frames)
+            yield from read_rla_frames(
+                packets, self.version, strict, columnar, lazy=lazy
+            )
@@ -0,0 +1,201 @@
+"""Output formats of decoded RLA frames.
+
+- json: one pretty-printed file per frame, `<type>/<tick>.json`
+- ndjson: one stream per frame type, `<type>.ndjson`. A JSON object per line, with its tick
+- msgpack: one stream per frame type, `<type>.msgpack`. A [tick, frame] array per frame
+- npz: motion frames as columnar tracks in `motion.npz` (needs sssekai[rla]), other frames as ndjson
+
+Frames are serialized by the caller, and written by a background thread through large
+buffers, so decoding and disk I/O overlap.
+"""
+
+from base64 import b64encode
+from logging import getLogger
+from queue import Queue
+import os, json, threading
+import msgpack
+
+logger = getLogger(__name__)
+
+RLA_OUTPUT_FORMATS = ["json", "ndjson", "msgpack", "npz"]
+
+
+class BackgroundWriter:
+    """Writes to files from a background thread. At most `max_pending` writes are queued.
+
+    Streams (`append`) are kept open until `close`. Errors are raised on the next call.
+    """
+
+    def __init__(self, max_pending: int = 1024, buffering: int = 1 << 20):
+        self.queue = Queue(max_pending)
+        self.buffering = buffering
+        self.files = dict()  # path : file
+        self.error = None
+        self.thread = threading.Thread(
+            target=self.__run, name="sssekai-writer", daemon=True
+        )
+        self.thread.start()
+
+    def __run(self):
+        while (item := self.queue.get()) is not None:
+            if self.error:
+                continue
+            path, data, append = item
+            try:
+                if append:
+                    file = self.files.get(path, None)
+                    if file is None:
+                        file = self.files[path] = open(path, "wb", self.buffering)
+                    file.write(data)
+                else:
+                    with open(path, "wb") as f:
+                        f.write(data)
+            except Exception as e:
+                self.error = e
+
+    def __check(self):
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, path: str, data: bytes):
+        """Writes `data` as the file at `path`"""
+        self.__check()
+        self.queue.put((path, data, False))
+
+    def append(self, path: str, data: bytes):
+        """Appends `data` to the stream at `path`, truncated on first use"""
+        self.__check()
+        self.queue.put((path, data, True))
+
+    def close(self):
+        """Flushes all writes, and closes the streams"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        for file in self.files.values():
+            file.close()
+        self.files.clear()
+        self.__check()
+
+
+def json_default(value):
+    """Bytes (i.e. msgpack payloads) as Base64 strings"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b64encode(value).decode()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+class RLAFrameWriter:
+    """Writes frames to `outdir` in one of `RLA_OUTPUT_FORMATS`. Use `make_frame_writer`."""
+
+    columnar = False  # Whether frames are to be decoded with `columnar=True`
+
+    def __init__(self, outdir: str):
+        self.outdir = outdir
+        self.writer = BackgroundWriter()
+        self.dirs = set()
+        os.makedirs(outdir, exist_ok=True)
+
+    def path(self, *parts) -> str:
+        path = os.path.join(self.outdir, *parts)
+        directory = os.path.dirname(path)
+        if directory not in self.dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.dirs.add(directory)
+        return path
+
+    def add(self, tick, frame: dict):
+        raise NotImplementedError
+
+    def write_file(self, data: bytes, *parts):
+        """Writes `data` as a file of its own at `parts` under `outdir`, i.e. raw audio"""
+        self.writer.write(self.path(*parts), data)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JSONFrameWriter(RLAFrameWriter):
+    def add(self, tick, frame: dict):
+        data = json.dumps(frame, ensure_ascii=False, indent=4, default=json_default)
+        self.writer.write(
+            self.path(frame["type"], str(tick) + ".json"), data.encode("utf-8")
+        )
+
+
+class NDJSONFrameWriter(RLAFrameWriter):
+    def add(self, tick, frame: dict):
+        data = json.dumps(
+            {"tick": tick, **frame},
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=json_default,
+        )
+        self.writer.append(
+            self.path(frame["type"] + ".ndjson"), data.encode("utf-8") + b"\n"
+        )
+
+
+class MsgpackFrameWriter(RLAFrameWriter):
+    def __init__(self, outdir: str):
+        super().__init__(outdir)
+        self.packer = msgpack.Packer()
+
+    def add(self, tick, frame: dict):
+        self.writer.append(
+            self.path(frame["type"] + ".msgpack"), self.packer.pack([tick, frame])
+        )
+
+
+class NPZFrameWriter(NDJSONFrameWriter):
+    """Motion frames into columnar tracks, saved as `motion.npz` with `<id>/<column>` keys"""
+
+    columnar = True
+
+    def __init__(self, outdir: str):
+        super().__init__(outdir)
+        from sssekai.fmt.rla_columnar import RLAMotionTrackCollector
+
+        self.motion = RLAMotionTrackCollector()
+
+    def add(self, tick, frame: dict):
+        if frame["type"] in {"MotionData", "MotionCaptureData"}:
+            self.motion.add(tick, frame)
+        else:
+            super().add(tick, frame)
+
+    def close(self):
+        super().close()
+        if not self.motion.builders:
+            return
+        import numpy as np
+
+        tracks = self.motion.build()
+        arrays = {
+            "%s/%s" % (id, key): array
+            for id, track in tracks.items()
+            for key, array in track.arrays().items()
+        }
+        np.savez(self.path("motion.npz"), **arrays)
+        logger.info("Saved %d motion tracks to motion.npz" % len(tracks))
+
+
+RLA_FRAME_WRITERS = {
+    "json": JSONFrameWriter,
+    "ndjson": NDJSONFrameWriter,
+    "msgpack": MsgpackFrameWriter,
+    "npz": NPZFrameWriter,
+}
+
+
+def make_frame_writer(format: str, outdir: str) -> RLAFrameWriter:
+    """A writer of frames to `outdir` in `format`. See `RLA_OUTPUT_FORMATS`"""
+    assert format in RLA_FRAME_WRITERS, "unknown format %s" % format
+    return RLA_FRAME_WRITERS[format](outdir)
@@ -0,0 +1,379 @@
+"""Live RLA ingestion from a Server-Sent Events stream of 'RTVL' messages.
+
+Messages are read with asyncio (no extra dependencies), split packets are reassembled with
+bounded memory, and decoded frames are handed out as an async iterator. Reassembly and decoding
+run in the loop's default executor, so large frames don't stall the event loop. The reader stops
+reading from the socket while the frame queue is full, so a slow consumer pushes back on
+the server instead of buffering without bound.
+
+Usage:
+    async with RLASSEIngestor(url, version=(1, 6), types=["MotionCaptureData"]) as ingestor:
+        async for timestamp, frame in ingestor:
+            ...
+"""
+
+from base64 import b64decode
+from logging import getLogger
+from typing import AsyncGenerator, Dict, Tuple
+from urllib.parse import urlsplit
+import asyncio, ssl, time
+
+from sssekai.fmt.rla import (
+    RLA_VERSIONS,
+    RTVL_DATA_OFFSET,
+    RTVL_SPLIT_DATA_OFFSET,
+    RLASplitBuffer,
+    SSEDataLengthOutOfRangeException,
+    SSEMissingSplitPacketException,
+    decode_buffer_header,
+    decode_rla_payload,
+    rla_signatures,
+)
+
+logger = getLogger(__name__)
+
+SSE_HEADER = b"RTVL"
+SSE_MAX_LINE = 16 << 20  # Longest SSE line accepted, in bytes
+
+
+class RLASplitReassembler:
+    """Reassembles split packets, with bounded memory.
+
+    Incomplete split groups are dropped once older than `timeout` seconds, and the oldest ones
+    are evicted while all pending groups hold more than `max_pending` bytes. Groups may hold their
+    whole `totalDataLength` from the first chunk on, see `RLASplitBuffer`. Room for it is made
+    before it's allocated, and groups that can't fit at all are rejected as corrupt. In strict
+    mode evictions raise `SSEMissingSplitPacketException` instead.
+    """
+
+    def __init__(
+        self,
+        strict=False,
+        timeout: float = 30.0,
+        max_pending: int = 64 << 20,
+        signatures: set = None,
+        clock=time.monotonic,
+    ):
+        self.strict = strict
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.signatures = signatures
+        self.clock = clock
+        # splitId : (first seen, RLASplitBuffer)
+        self.pending: Dict[int, Tuple[float, RLASplitBuffer]] = dict()
+        self.pending_bytes = 0
+        self.dropped = 0  # Split groups dropped
+
+    def __drop(self, splitIds: list, reason: str):
+        missing = [
+            (self.pending[splitId][1].timestamp, splitId) for splitId in splitIds
+        ]
+        if self.strict:
+            raise SSEMissingSplitPacketException(missing)
+        for splitId in splitIds:
+            self.pending_bytes -= self.pending.pop(splitId)[1].nbytes
+        self.dropped += len(splitIds)
+        logger.warning(
+            "Dropped %d split group(s) (%s): %s" % (len(missing), reason, missing)
+        )
+
+    def __evict(self, limit: int):
+        """Evicts the oldest groups while all of them hold more than `limit` bytes"""
+        evicted, size = list(), self.pending_bytes
+        for splitId, (_, group) in self.pending.items():
+            if size <= limit:
+                break
+            evicted.append(splitId)
+            size -= group.nbytes
+        if evicted:
+            self.__drop(evicted, "over memory limit")
+
+    def expire(self):
+        """Drops split groups older than `timeout`"""
+        deadline = self.clock() - self.timeout
+        expired = [
+            splitId for splitId, group in self.pending.items() if group[0] < deadline
+        ]
+        if expired:
+            self.__drop(expired, "timed out")
+
+    def feed(self, timestamp, buffer: bytes) -> Tuple[object, int, bytes]:
+        """Feeds a 'RTVL' message.
+
+        Returns:
+            (timestamp, header signature, payload) of a complete packet, or None
+        """
+        self.expire()
+        try:
+            encoded_length, base64, header_signature, split_info = decode_buffer_header(
+                buffer
+            )
+            if self.signatures is not None and header_signature not in self.signatures:
+                return None
+            if len(buffer) != encoded_length:
+                raise SSEDataLengthOutOfRangeException(encoded_length, len(buffer))
+            view = memoryview(buffer)
+            if not split_info:
+                data = view[RTVL_DATA_OFFSET:]
+                return (
+                    timestamp,
+                    header_signature,
+                    (b64decode(data) if base64 else bytes(data)),
+                )
+            splitId, splitIndex, splitNum, dataLength, totalDataLength = split_info
+            entry = self.pending.get(splitId, None)
+            if entry is None:
+                size = RLASplitBuffer.preallocation(
+                    splitNum, totalDataLength, dataLength
+                )
+                if size and size > self.max_pending:
+                    raise ValueError("split group of %d bytes over memory limit" % size)
+                self.__evict(self.max_pending - (size or 0))
+                group = RLASplitBuffer(
+                    timestamp,
+                    header_signature,
+                    splitNum,
+                    totalDataLength,
+                    base64,
+                    dataLength,
+                )
+                entry = self.pending[splitId] = (self.clock(), group)
+                self.pending_bytes += group.nbytes
+            group = entry[1]
+            size = group.nbytes
+            group.add(splitIndex, view[RTVL_SPLIT_DATA_OFFSET:])
+            self.pending_bytes += group.nbytes - size
+        except Exception as e:
+            if self.strict:
+                raise e
+            return None
+        if group.complete:
+            del self.pending[splitId]
+            self.pending_bytes -= group.nbytes
+            return timestamp, group.signature, group.join(self.strict)
+        self.__evict(self.max_pending)
+        return None
+
+    def close(self):
+        """Drops (or in strict mode, raises on) the incomplete split groups left"""
+        if self.pending:
+            self.__drop(list(self.pending), "stream ended")
+
+
+async def open_sse_stream(
+    url: str, headers: dict = None
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+    """Sends a GET request for an event stream.
+
+    Returns:
+        (reader, writer, chunked): The reader is positioned at the response body
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, port, ssl=ssl.create_default_context() if secure else None
+    )
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    request = {
+        "Host": parts.netloc,
+        "Accept": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "Connection": "close",
+    } | (headers or dict())
+    writer.write(
+        ("GET %s HTTP/1.1\r\n" % path).encode()
+        + b"".join(("%s: %s\r\n" % kv).encode() for kv in request.items())
+        + b"\r\n"
+    )
+    await writer.drain()
+    status = (await reader.readline()).decode("latin-1").split(" ", 2)
+    response = dict()
+    while line := (await reader.readline()).strip():
+        key, _, value = line.decode("latin-1").partition(":")
+        response[key.strip().lower()] = value.strip()
+    if len(status) < 2 or status[1] != "200":
+        await close_sse_stream(writer)
+        raise ConnectionError("SSE request failed: %s" % " ".join(status).strip())
+    chunked = response.get("transfer-encoding", "").lower() == "chunked"
+    return reader, writer, chunked
+
+
+async def close_sse_stream(writer: asyncio.StreamWriter):
+    """Closes the connection of `open_sse_stream`, and waits until it's closed"""
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass  # Broken already
+
+
+async def iter_sse_lines(
+    reader: asyncio.StreamReader, chunked=False, max_line=SSE_MAX_LINE
+) -> AsyncGenerator[bytes, None]:
+    """Lines of a (possibly chunked) response body, without line endings"""
+    buffer = bytearray()
+    while True:
+        if chunked:
+            size = (await reader.readline()).split(b";")[0].strip()
+            if not size:
+                break  # Closed without the terminating chunk
+            size = int(size, 16)
+            try:
+                block = await reader.readexactly(size) if size else b""
+            except asyncio.IncompleteReadError as e:
+                block = e.partial  # Closed mid-chunk. Ends on the next read
+            await reader.readline()  # CRLF after the chunk
+        else:
+            block = await reader.read(1 << 16)
+        if not block:
+            break
+        buffer += block
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start:end]).rstrip(b"\r")
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line:
+            raise ValueError("SSE line longer than %d bytes" % max_line)
+    if buffer:
+        yield bytes(buffer)
+
+
+async def iter_sse_rla_packets(
+    url: str, headers: dict = None, max_line=SSE_MAX_LINE
+) -> AsyncGenerator[Tuple[int, bytes], None]:
+    """Yields (timestamp, buffer) of the 'RTVL' messages of an event stream.
+
+    Timestamps are the receive time in milliseconds, like the names of loose packet files.
+    """
+    reader, writer, chunked = await open_sse_stream(url, headers)
+    try:
+        data = list()
+        async for line in iter_sse_lines(reader, chunked, max_line):
+            if not line:  # Dispatch
+                if data:
+                    message = b"\n".join(data)
+                    data.clear()
+                    if message.startswith(SSE_HEADER):
+                        yield int(time.time() * 1000), message
+                continue
+            if line.startswith(b":"):  # Comment
+                continue
+            field, _, value = line.partition(b":")
+            if field == b"data":
+                data.append(value[1:] if value.startswith(b" ") else value)
+    finally:
+        await close_sse_stream(writer)
+
+
+class RLASSEIngestor:
+    """Decoded frames of a live 'RTVL' event stream, as an async iterator of (timestamp, frame).
+
+    Args:
+        url (str): Event stream URL (http or https)
+        version (tuple, optional): RLA version. Defaults to (1,6).
+        strict (bool, optional): Raise on corrupt frames and lost split groups, instead of skipping them. Defaults to False.
+        columnar (bool, optional): See `decode_streaming_data`. Defaults to False.
+        types (Iterable, optional): See `read_rla_frames`. Defaults to None (all).
+        headers (dict, optional): Extra request headers. Defaults to None.
+        max_frames (int, optional): Decoded frames buffered ahead of the consumer. Defaults to 256.
+        split_timeout (float, optional): Seconds before an incomplete split group is dropped. Defaults to 30.
+        max_pending (int, optional): Bytes of incomplete split groups held at most. Defaults to 64MiB.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        version=(1, 6),
+        strict=False,
+        columnar=False,
+        types=None,
+        headers: dict = None,
+        max_frames: int = 256,
+        split_timeout: float = 30.0,
+        max_pending: int = 64 << 20,
+    ):
+        assert (
+            version >= RLA_VERSIONS[0] and version <= RLA_VERSIONS[-1]
+        ), "unsupported version"
+        self.url, self.headers = url, headers
+        self.version, self.strict, self.columnar = version, strict, columnar
+        self.reassembler = RLASplitReassembler(
+            strict, split_timeout, max_pending, rla_signatures(types)
+        )
+        self.queue = asyncio.Queue(max_frames)
+        self.task = None
+        self.done = False
+
+    def __decode(self, timestamp, buffer: bytes) -> Tuple[int, dict]:
+        """(timestamp, frame) of a complete packet, or None. Run in the executor, one at a time"""
+        packet = self.reassembler.feed(timestamp, buffer)
+        if packet is None:
+            return None
+        timestamp, header_signature, data = packet
+        try:
+            frame = decode_rla_payload(
+                self.version, header_signature, data, self.strict, self.columnar
+            )
+        except Exception as e:
+            if self.strict:
+                raise e
+            logger.debug("Skipped corrupt frame at %s: %s" % (timestamp, e))
+            return None
+        return timestamp, frame
+
+    async def __produce(self):
+        loop = asyncio.get_running_loop()
+        try:
+            async for timestamp, buffer in iter_sse_rla_packets(self.url, self.headers):
+                item = await loop.run_in_executor(
+                    None, self.__decode, timestamp, buffer
+                )
+                if item is not None:
+                    await self.queue.put(item)  # Waits while full
+            self.reassembler.close()
+            await self.queue.put(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.put(e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.__produce())
+
+    async def aclose(self):
+        """Stops reading and closes the connection"""
+        self.done = True
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def __aiter__(self):
+        self.start()
+        return self
+
+    async def __anext__(self) -> Tuple[int, dict]:
+        if self.done:
+            raise StopAsyncIteration
+        item = await self.queue.get()
+        if item is None:
+            self.done = True
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            self.done = True
+            raise item
+        return item
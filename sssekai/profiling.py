@@ -0,0 +1,182 @@
+"""Lightweight phase timing, and whole-run profiling of subcommands.
+
+Entrypoints mark their phases with `span`, i.e.
+    with span("load"):
+        env = load_assetbundle(f)
+    for frame in iter_span("decode", frames):
+        ...
+Spans nest (recorded as "parent/child"), and may be entered many times; the wall-clock
+time, count and extremes are accumulated per phase. Spans cost a dictionary lookup when no
+profile is running.
+
+`Profile` runs a block under cProfile (saved as a pstats file) or a sampling profiler
+(saved as collapsed stacks, i.e. for flamegraph.pl / speedscope), and writes the phase
+summary as JSON alongside.
+"""
+
+import sys, json, time, threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+PROFILE_MODES = ["cprofile", "sample"]
+
+
+class PhaseRecorder:
+    """Accumulated wall-clock timings of (nested) spans. Thread-safe."""
+
+    def __init__(self):
+        self.phases = dict()  # path : [count, total, min, max]
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.t0 = time.perf_counter()
+
+    def stack(self) -> list:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = list()
+        return self.local.stack
+
+    def record(self, path: str, elapsed: float):
+        with self.lock:
+            phase = self.phases.get(path, None)
+            if phase is None:
+                self.phases[path] = [1, elapsed, elapsed, elapsed]
+            else:
+                phase[0] += 1
+                phase[1] += elapsed
+                phase[2] = min(phase[2], elapsed)
+                phase[3] = max(phase[3], elapsed)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "wall": time.perf_counter() - self.t0,
+                "phases": {
+                    path: {"count": count, "total": total, "min": lo, "max": hi}
+                    for path, (count, total, lo, hi) in self.phases.items()
+                },
+            }
+
+
+_recorder: PhaseRecorder = None
+
+
+@contextmanager
+def span(name: str):
+    """Time the block as phase `name`. Nested spans are recorded as "parent/name"."""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    stack = recorder.stack()
+    stack.append(name)
+    path = "/".join(stack)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(path, time.perf_counter() - t0)
+        stack.pop()
+
+
+def iter_span(name: str, it: Iterable) -> Iterator:
+    """Iterate `it`, timing each step as phase `name`. For lazy decoders, where the work happens per `next()`."""
+    it = iter(it)
+    while True:
+        with span(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads every `interval` seconds, from a background thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()  # Collapsed stack : count
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def collapse(frame) -> str:
+        stack = list()
+        while frame:
+            code = frame.f_code
+            stack.append(
+                "%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno)
+            )
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def __run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[self.collapse(frame)] += 1
+
+    def enable(self):
+        self.thread = threading.Thread(
+            target=self.__run, name="sssekai-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def disable(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def dump_stats(self, filename: str):
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write("%s %d\n" % (stack, count))
+
+
+class Profile:
+    """Profile a block, and record its spans. Outputs are written on exit:
+    - `<output>.pstats` (cprofile): load with `pstats.Stats`, or i.e. snakeviz
+    - `<output>.stacks` (sample): collapsed stacks, one per line with its sample count
+    - `<output>.phases.json`: phase summary of the spans
+    """
+
+    def __init__(self, output: str, mode: str = "cprofile", interval: float = 0.005):
+        assert mode in PROFILE_MODES, "unknown profile mode %s" % mode
+        self.output, self.mode, self.interval = output, mode, interval
+        self.recorder = None
+        self.profiler = None
+
+    def __enter__(self):
+        global _recorder
+        self.recorder = _recorder = PhaseRecorder()
+        if self.mode == "cprofile":
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = SamplingProfiler(self.interval)
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _recorder
+        self.profiler.disable()
+        _recorder = None
+        stats = self.output + (".pstats" if self.mode == "cprofile" else ".stacks")
+        self.profiler.dump_stats(stats)
+        summary = self.recorder.summary()
+        summary["mode"] = self.mode
+        summary["stats"] = stats
+        with open(self.output + ".phases.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        logger.info(
+            "Profile written to %s, phases to %s.phases.json" % (stats, self.output)
+        )
+        for path, phase in sorted(summary["phases"].items()):
+            logger.info(
+                "Phase %-32s %8.3fs (%d times)" % (path, phase["total"], phase["count"])
+            )
@@ -6,8 +6,37 @@ import UnityPy
 
 
 def load_assetbundle(file: BytesIO) -> UnityPy.Environment:
+    """Load a (possibly encrypted) AssetBundle from a readable binary file object.
+
+    Bundles stored by `sssekai.abcache.storage` backends can be loaded with `storage.open(name)`.
+    """
     UnityPy.config.FALLBACK_UNITY_VERSION = sssekai_get_unity_version()
     stream = BytesIO()
     for block in decrypt_iter(lambda nbytes: file.read(nbytes)):
         stream.write(block)
     return UnityPy.load(stream)
+
+
+def read_textasset_bytes(obj) -> tuple[str, bytes | memoryview]:
+    """Reads the name and script of a TextAsset object, as bytes.
+
+    The script is sliced from the bundle's buffer where possible, instead of being decoded
+    into `m_Script` and encoded back. Falls back to `m_Script.encode("utf-8", "surrogateescape")`.
+
+    Args:
+        obj (ObjectReader): TextAsset object, i.e. from `env.objects`
+
+    Returns:
+        tuple[str, bytes | memoryview]: m_Name, m_Script
+    """
+    reader = obj.reader
+    view = getattr(reader, "view", None)
+    if view is not None:
+        obj.reset()
+        name = reader.read_aligned_string()
+        length = reader.read_int()
+        start = reader.Position
+        if 0 <= length and start + length <= obj.byte_start + obj.byte_size:
+            return name, view[start : start + length]
+    data = obj.read()
+    return data.m_Name, data.m_Script.encode("utf-8", "surrogateescape")
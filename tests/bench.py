@@ -0,0 +1,592 @@
+"""Benchmarks of the hot paths, with machine-readable results.
+
+Run with:
+    python -m tests.bench [-o results.json] [-c baseline.json] [-k pattern] [-n repeat]
+
+Each benchmark is run `repeat` times, and the best run is reported as a rate (units per
+second), or as latency where lower is better. Results are written as JSON, i.e.
+    {"meta": {...}, "results": {"decrypt_iter": {"value": 812.3, "unit": "MB/s", "higher_is_better": true, "times": [...]}}}
+With `--compare`, results are compared against a previous run, and the exit code is non-zero
+if any benchmark regressed more than `--threshold`.
+
+Samples under `tests/` are used where available. Others are synthetic, and served
+offline by `tests/mock_server.py` for the network paths.
+"""
+
+import os, io, re, sys, json, time, pickle, logging, warnings, platform, argparse, subprocess
+from typing import Callable, Tuple
+from base64 import b64encode
+from . import sample_file_path, TEMP_DIR
+from .mock_server import MockSekaiServer, make_unityfs, obfuscate
+
+BENCHMARKS = dict()  # name : (setup, unit, higher_is_better)
+
+
+def benchmark(name: str, unit: str, higher_is_better: bool = True):
+    """Register a benchmark. The decorated setup function returns `(run, amount)`.
+
+    `run` is timed, and `amount` is the work done per run in `unit`s. With `amount` of None,
+    the run time itself (or the value `run` returns, if any) is reported in `unit`s.
+    """
+
+    def wrapper(setup: Callable[[], Tuple[Callable, float]]):
+        BENCHMARKS[name] = (setup, unit, higher_is_better)
+        return setup
+
+    return wrapper
+
+
+# region Synthetic data
+def synthetic_index(count: int) -> dict:
+    return MockSekaiServer("tw", bundle_count=count, bundle_size=256).index()
+
+
+def synthetic_bundles(count: int):
+    from sssekai.abcache import AbCacheIndex, fromdict
+
+    return fromdict(AbCacheIndex, synthetic_index(count)).bundles
+
+
+def sample_clips(count: int = None):
+    from UnityPy.enums import ClassIDType
+    from sssekai.unity.AssetBundle import load_assetbundle
+
+    with open(sample_file_path("live2d", "21miku_motion_base"), "rb") as f:
+        env = load_assetbundle(f)
+    clips = [obj.read() for obj in env.objects if obj.type == ClassIDType.AnimationClip]
+    return clips[:count]
+
+
+RLA_SAMPLES = [
+    (["1740309585940-0.bin", "1740309585941-0.bin"], (1, 6)),
+    (["1728191806276-0.bin"], (1, 5)),
+    (["1718434788237-0.bin"], (1, 4)),
+]
+
+
+def synthetic_rla_archive(count: int) -> bytes:
+    """A RLA file of `count` copies of the 1.4 sample packet"""
+    with open(sample_file_path("rla", "1718434788237-0.bin"), "rb") as f:
+        data = f.read()
+    header = len(data).to_bytes(4, "little")
+    return b"".join(
+        (tick + 1).to_bytes(8, "little") + header + data for tick in range(count)
+    )
+
+
+# endregion
+
+
+# region Benchmarks
+@benchmark("decrypt_iter", "MB/s")
+def bench_decrypt_iter():
+    from sssekai.crypto.AssetBundle import decrypt_iter
+    import random
+
+    data = obfuscate(make_unityfs(32 << 20, random.Random(0)))
+
+    def run():
+        src = io.BytesIO(data)
+        for block in decrypt_iter(src.read):
+            pass
+
+    return run, len(data) / 1e6
+
+
+@benchmark("fromdict_index", "bundles/s")
+def bench_fromdict_index():
+    from sssekai.abcache import AbCacheIndex, fromdict
+
+    index = synthetic_index(20000)
+    return lambda: fromdict(AbCacheIndex, index), len(index["bundles"])
+
+
+@benchmark("pickle_database_load", "bundles/s")
+def bench_pickle_database_load():
+    from sssekai.abcache import SSSekaiDatabase, AbCacheIndex, fromdict
+
+    database = SSSekaiDatabase(
+        sekai_abcache_index=fromdict(AbCacheIndex, synthetic_index(20000))
+    )
+    data = pickle.dumps(database)
+    return lambda: pickle.loads(data), 20000
+
+
+@benchmark("dir_cache_build", "bundles/s")
+def bench_dir_cache_build():
+    from sssekai.abcache.fs import AbCacheDirectoryIndex
+
+    bundles = synthetic_bundles(20000)
+
+    def run():
+        dirs = AbCacheDirectoryIndex(bundles)
+        dirs.find("/", withdirs=True)
+
+    return run, len(bundles)
+
+
+def synthetic_split_packets(count: int, chunks: int = 8) -> list:
+    """`count` copies of the 1.4 sample packet, each re-split into `chunks` RTVL packets"""
+    from sssekai.fmt.rla import decode_buffer_base64
+
+    with open(sample_file_path("rla", "1718434788237-0.bin"), "rb") as f:
+        _, signature, payload = decode_buffer_base64(f.read())
+    data = b64encode(payload)
+    size = -(-len(data) // chunks)
+    packets = list()
+    for splitId in range(count):
+        for index in range(chunks):
+            chunk = data[index * size : (index + 1) * size]
+            header = b"%5d%5d%5d%10d%10d" % (
+                splitId,
+                index,
+                chunks,
+                len(chunk),
+                len(data),
+            )
+            packet = b"TT%03d" % signature + header + chunk
+            packets.append((splitId, b"RTVL%06X" % (len(packet) + 10) + packet))
+    return packets
+
+
+@benchmark("iter_rla_payloads_split", "packets/s")
+def bench_iter_rla_payloads_split():
+    # Motion capture bursts come split in many small packets
+    from sssekai.fmt.rla import iter_rla_payloads
+
+    packets = synthetic_split_packets(1000)
+
+    def run():
+        for _ in iter_rla_payloads(iter(packets)):
+            pass
+
+    return run, len(packets)
+
+
+@benchmark("read_rla_frames", "frames/s")
+def bench_read_rla_frames():
+    from sssekai.fmt.rla import read_rla_frames
+
+    samples = [
+        ([(f, open(sample_file_path("rla", f), "rb").read()) for f in files], version)
+        for files, version in RLA_SAMPLES
+    ]
+    frames = 0
+    for files, version in samples:
+        frames += sum(1 for _ in read_rla_frames(iter(files), version))
+
+    def run():
+        for files, version in samples:
+            for _ in read_rla_frames(iter(files), version):
+                pass
+
+    return run, frames
+
+
+def rla_payloads():
+    """(version, decoder signature, payload) of the unsplit sample packets"""
+    from sssekai.fmt.rla import decode_buffer_base64, decode_buffer_payload
+
+    payloads = list()
+    for files, version in RLA_SAMPLES + [(["streaming_live_vbs_1-0_0.bin"], (1, 0))]:
+        for file in files:
+            with open(sample_file_path("rla", file), "rb") as f:
+                split_info, _, data = decode_buffer_base64(f.read())
+            if not split_info:
+                payloads.append((version, *decode_buffer_payload(data)))
+    return payloads
+
+
+def bench_decode_streaming_data(decode):
+    payloads = rla_payloads() * 100
+
+    def run():
+        for version, signature, payload in payloads:
+            decode(version, signature, payload)
+
+    return run, len(payloads)
+
+
+@benchmark("decode_streaming_data", "frames/s")
+def bench_decode_streaming_data_compiled():
+    from sssekai.fmt.rla import decode_streaming_data
+
+    return bench_decode_streaming_data(decode_streaming_data)
+
+
+@benchmark("decode_streaming_data_legacy", "frames/s")
+def bench_decode_streaming_data_legacy():
+    from .rla_reference import decode_streaming_data_legacy
+
+    return bench_decode_streaming_data(decode_streaming_data_legacy)
+
+
+@benchmark("read_rla_frames_parallel", "frames/s")
+def bench_read_rla_frames_parallel():
+    from concurrent.futures import ProcessPoolExecutor
+    from sssekai.fmt.rla import read_rla_frames_parallel
+
+    with open(sample_file_path("rla", "1718434788237-0.bin"), "rb") as f:
+        data = f.read()
+    packets = [(i, data) for i in range(2000)]
+    executor = ProcessPoolExecutor()  # Warmed up by the first run
+
+    def run():
+        for _ in read_rla_frames_parallel(iter(packets), (1, 4), executor=executor):
+            pass
+
+    return run, len(packets)
+
+
+def bench_read_archive_rla_frames(types):
+    from sssekai.fmt.rla import read_archive_rla_frames
+
+    # Mostly motion capture, as in lives. One split sound frame per 20 of them
+    paths = ["1718434788237-0.bin"] * 20 + [
+        "1740309585940-0.bin",
+        "1740309585941-0.bin",
+    ]
+    packets = [open(sample_file_path("rla", f), "rb").read() for f in paths] * 20
+    archive = b"".join(
+        (tick + 1).to_bytes(8, "little") + len(packet).to_bytes(4, "little") + packet
+        for tick, packet in enumerate(packets)
+    )
+
+    def run():
+        for _ in read_archive_rla_frames(archive, (1, 6), types=types):
+            pass
+
+    return run, len(packets)
+
+
+@benchmark("read_archive_rla_frames", "packets/s")
+def bench_read_archive_rla_frames_all():
+    return bench_read_archive_rla_frames(None)
+
+
+@benchmark("read_archive_rla_frames_sound", "packets/s")
+def bench_read_archive_rla_frames_sound():
+    return bench_read_archive_rla_frames(["SoundData"])
+
+
+@benchmark("read_archive_rla_frames_motion", "packets/s")
+def bench_read_archive_rla_frames_motion():
+    return bench_read_archive_rla_frames(["MotionCaptureData"])
+
+
+@benchmark("rla_archive_index", "packets/s")
+def bench_rla_archive_index():
+    from sssekai.fmt.rla import RLAArchiveIndex
+
+    archive = synthetic_rla_archive(20000)
+
+    def run():
+        for _ in RLAArchiveIndex(archive):
+            pass
+
+    return run, 20000
+
+
+@benchmark("rla_archive_stream", "packets/s")
+def bench_rla_archive_stream():
+    from sssekai.fmt.rla import iter_archive_rla_packets
+
+    archive = synthetic_rla_archive(20000)
+
+    def run():
+        for _ in iter_archive_rla_packets(io.BytesIO(archive)):
+            pass
+
+    return run, 20000
+
+
+def bench_rla_output(format):
+    import shutil
+    from sssekai.fmt.rla import read_rla_frames
+    from sssekai.fmt.rla_output import make_frame_writer
+
+    with open(sample_file_path("rla", "1718434788237-0.bin"), "rb") as f:
+        data = f.read()
+    frames = list(read_rla_frames(((i, data) for i in range(500)), (1, 4)))
+    outdir = os.path.join(TEMP_DIR, "bench_rla_output_" + format)
+
+    def run():
+        shutil.rmtree(outdir, ignore_errors=True)
+        with make_frame_writer(format, outdir) as writer:
+            for tick, frame in frames:
+                writer.add(tick, frame)
+
+    return run, len(frames)
+
+
+@benchmark("rla_output_json", "frames/s")
+def bench_rla_output_json():
+    return bench_rla_output("json")
+
+
+@benchmark("rla_output_ndjson", "frames/s")
+def bench_rla_output_ndjson():
+    return bench_rla_output("ndjson")
+
+
+@benchmark("rla_output_msgpack", "frames/s")
+def bench_rla_output_msgpack():
+    return bench_rla_output("msgpack")
+
+
+@benchmark("rla_motion_tracks", "samples/s")
+def bench_rla_motion_tracks():
+    from sssekai.fmt.rla_columnar import read_rla_motion_tracks
+
+    with open(sample_file_path("rla", "1718434788237-0.bin"), "rb") as f:
+        data = f.read()
+    packets = [(i, data) for i in range(100)]
+    tracks = read_rla_motion_tracks(iter(packets), (1, 4))
+    samples = sum(len(track) for track in tracks.values())
+    return lambda: read_rla_motion_tracks(iter(packets), (1, 4)), samples
+
+
+@benchmark("animation_from_clip", "clips/s")
+def bench_animation_from_clip():
+    from sssekai.unity.AnimationClip import AnimationHelper
+
+    clips = sample_clips(64)
+    return lambda: [AnimationHelper.from_clip(clip) for clip in clips], len(clips)
+
+
+@benchmark("curve_resample_dense", "samples/s")
+def bench_curve_resample_dense():
+    from sssekai.unity.AnimationClip import AnimationHelper
+
+    curves = list()
+    for clip in sample_clips(8):
+        helper = AnimationHelper.from_clip(clip)
+        times = [i / 60 for i in range(int(helper.Duration * 60) + 1)]
+        curves += [(curve, times) for curve in helper.RawCurves.values()]
+
+    def run():
+        for curve, times in curves:
+            curve.resample_dense(times)
+
+    return run, sum(len(times) for _, times in curves)
+
+
+@benchmark("to_motion3", "clips/s")
+def bench_to_motion3():
+    from sssekai.unity.AnimationClip import AnimationHelper
+    from sssekai.unity.constant.SekaiLive2DPathNames import NAMES_CRC_TBL
+    from sssekai.fmt.motion3 import to_motion3
+
+    clips = sample_clips(64)
+    helpers = [(AnimationHelper.from_clip(clip), clip) for clip in clips]
+    return (
+        lambda: [to_motion3(helper, NAMES_CRC_TBL, clip) for helper, clip in helpers],
+        len(helpers),
+    )
+
+
+def mock_cache(server: MockSekaiServer):
+    from sssekai.abcache import AbCache, AbCacheConfig
+
+    return AbCache(AbCacheConfig(server.region, "9.9.9", "android", "mock"))
+
+
+@benchmark("mock_index_ingestion", "bundles/s")
+def bench_mock_index_ingestion():
+    server = MockSekaiServer("tw", bundle_count=20000, bundle_size=256).start()
+    cache = mock_cache(server)
+
+    def run():
+        with server.patch():
+            cache.update_abcache_index()
+
+    return run, server.bundle_count
+
+
+@benchmark("mock_download", "MB/s")
+def bench_mock_download():
+    import shutil
+    from tqdm import tqdm
+    from sssekai.abcache.fs import AbCacheFilesystem
+    from sssekai.abcache.storage import AbCacheLocalStorage
+    from sssekai.entrypoint.abcache import AbCacheDownloader
+
+    server = MockSekaiServer("tw", bundle_count=64, bundle_size=1 << 20).start()
+    cache = mock_cache(server)
+    with server.patch():
+        cache.update_abcache_index()
+    cache.configure_pool(8, block=True)
+    fs = AbCacheFilesystem(cache_obj=cache)
+    fs.readahead = 4
+    download_dir = os.path.join(TEMP_DIR, "bench_download")
+
+    def run():
+        shutil.rmtree(download_dir, ignore_errors=True)
+        with server.patch(), AbCacheDownloader(
+            fs, AbCacheLocalStorage(download_dir), max_workers=8
+        ) as downloader:
+            downloader.progress = tqdm(total=1, disable=True)  # Truthy when empty
+            for name in server.names:
+                downloader.add_link(fs.open(name), name)
+            downloader.run_until_complete()
+
+    return run, server.bundle_count * server.bundle_size / 1e6
+
+
+@benchmark("abserve_latency", "ms", higher_is_better=False)
+def bench_abserve_latency():
+    import threading
+    from http.server import ThreadingHTTPServer
+    from requests import Session
+    from sssekai.abcache.fs import AbCacheFilesystem
+    from sssekai.entrypoint import abserve
+
+    server = MockSekaiServer("tw", bundle_count=2000, bundle_size=4096).start()
+    cache = mock_cache(server)
+    with server.patch():
+        cache.update_abcache_index()
+    abserve.fs = AbCacheFilesystem(cache_obj=cache)
+
+    class Handler(abserve.AbServeHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d" % httpd.server_address[1]
+    paths = ["/", "/mock/", "/mock/000/"] + ["/" + name for name in server.names[:16]]
+    session = Session()
+
+    def run():
+        latencies = list()
+        with server.patch():
+            for path in paths:
+                t0 = time.perf_counter()
+                session.get(url + path).content
+                latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        return latencies[len(latencies) // 2] * 1000  # Median
+
+    return run, None
+
+
+# endregion
+
+
+def run_benchmarks(pattern: str = None, repeat: int = 3) -> dict:
+    results = dict()
+    for name, (setup, unit, higher_is_better) in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        print("%-30s" % name, end=" ", flush=True, file=sys.stderr)
+        run, amount = setup()
+        times, values = list(), list()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            value = run()
+            times.append(time.perf_counter() - t0)
+            values.append(value if isinstance(value, (int, float)) else times[-1])
+        if amount is None:
+            value = min(values) if not higher_is_better else max(values)
+        else:
+            value = amount / min(times)
+        results[name] = {
+            "value": value,
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+            "times": times,
+        }
+        print("%12.2f %s" % (value, unit), file=sys.stderr)
+    return results
+
+
+def metadata() -> dict:
+    import sssekai
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "sssekai": sssekai.__version__,
+        "commit": commit or None,
+        "python": sys.version,
+        "platform": platform.platform(),
+        "time": time.time(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print a comparison table. Returns names of the regressed benchmarks."""
+    regressed = list()
+    print("%-30s %12s %12s %8s" % ("benchmark", "baseline", "current", "change"))
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name, None)
+        if not base or not base["value"]:
+            print("%-30s %12s %12.2f" % (name, "-", result["value"]))
+            continue
+        change = result["value"] / base["value"] - 1
+        if not result["higher_is_better"]:
+            change = -change
+        flag = ""
+        if change < -threshold:
+            regressed.append(name)
+            flag = " REGRESSED"
+        print(
+            "%-30s %12.2f %12.2f %+7.1f%%%s"
+            % (name, base["value"], result["value"], change * 100, flag)
+        )
+    return regressed
+
+
+def __main__():
+    parser = argparse.ArgumentParser(description="sssekai benchmarks")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument(
+        "-c", "--compare", help="compare against results of a previous run"
+    )
+    parser.add_argument(
+        "-k", "--filter", help="only run benchmarks matching this regex"
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs per benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown considered a regression (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    warnings.simplefilter("ignore")
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    results = {"meta": metadata(), "results": run_benchmarks(args.filter, args.repeat)}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressed = compare(results["results"], baseline, args.threshold)
+        if regressed:
+            print("Regressed: %s" % ", ".join(regressed))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(__main__())
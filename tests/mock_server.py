@@ -0,0 +1,302 @@
+"""Local stand-in for the game API and AssetBundle CDN.
+
+Usage:
+    with MockSekaiServer("jp", bundle_count=64) as server, server.patch():
+        ... # Any AbCache request is now served locally
+
+While patched, requests of every AbCache session are rewritten from `https://<host>/<path>`
+to `http://127.0.0.1:<port>/<host>/<path>`. Routes are matched by host and path:
+    - POST .../api/signature                   -> Set-Cookie (JP)
+    - GET  game-version.../<version>/<hash>    -> SekaiGameVersionData (JP/EN)
+    - GET  .../api/system                      -> SekaiSystemData
+    - GET  ...assetbundle-info... (JP/EN), .../AssetBundleInfoNew.json (ROW) -> AbCacheIndex
+    - GET  .../version (ROW)                   -> AB version number
+    - GET  .../<bundleName>                    -> Obfuscated synthetic bundle
+API responses are encrypted msgpack, as with the live servers.
+
+Latency, bandwidth, errors (500) and throttling (429 with Retry-After) can be injected into
+bundle requests, and API requests with `api_faults`. Faults are drawn from a seeded RNG.
+Bundles listed in `corrupt` are served truncated, failing verification every time.
+"""
+
+import time, struct, random, hashlib, threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from msgpack import packb
+from sssekai.crypto.APIManager import encrypt, SEKAI_APIMANAGER_KEYSETS
+from sssekai.crypto.AssetBundle import SEKAI_AB_MAGIC, decrypt_header_inplace
+
+MOCK_APP_VERSION = "9.9.9"
+MOCK_ASSET_VERSION = "9.9.9.10"
+MOCK_HOST_HASH = "cf2d2388"
+MOCK_ROW_DOWNLOAD_PATH = "mock/android"
+
+
+def make_unityfs(size: int, rng: random.Random) -> bytes:
+    """Random bytes of `size`, starting with a UnityFS header that declares `size`."""
+    header = b"UnityFS\x00" + struct.pack(">I", 8) + b"5.x.x\x00" + b"2022.3.21f1\x00"
+    header += struct.pack(">q", size)
+    return header + rng.randbytes(max(size - len(header), 0))
+
+
+def obfuscate(content: bytes) -> bytes:
+    """Inverse of `decrypt_iter` for content of at least 128 bytes."""
+    header = decrypt_header_inplace(bytearray(content[:128]))  # Self-inverse
+    return SEKAI_AB_MAGIC + bytes(header) + content[128:]
+
+
+class MockSekaiServer:
+    def __init__(
+        self,
+        region: str = "jp",
+        bundle_count: int = 64,
+        bundle_size: int = 65536,
+        latency: float = 0,
+        bandwidth: float = None,
+        error_rate: float = 0,
+        throttle_rate: float = 0,
+        retry_after: float = 0.1,
+        api_faults: bool = False,
+        corrupt: set = (),
+        seed: int = 0,
+    ):
+        """Create the server. Call `start` (or use as a context manager) to serve.
+
+        Args:
+            region (str, optional): Region of the API. Defaults to "jp".
+            bundle_count (int, optional): Number of bundles in the index. Defaults to 64.
+            bundle_size (int, optional): Decrypted size of each bundle. Defaults to 65536.
+            latency (float, optional): Seconds added to every response. Defaults to 0.
+            bandwidth (float, optional): Bundle bodies are sent at this many bytes per second. Defaults to None (unlimited).
+            error_rate (float, optional): Chance of a request failing with 500. Defaults to 0.
+            throttle_rate (float, optional): Chance of a request throttled with 429. Defaults to 0.
+            retry_after (float, optional): Retry-After of throttled responses. Defaults to 0.1.
+            api_faults (bool, optional): Inject errors and throttling into API requests too. Defaults to False.
+            corrupt (set, optional): Indices of bundles that are always served truncated. Defaults to ().
+            seed (int, optional): Seed of bundle contents and injected faults. Defaults to 0.
+        """
+        self.region, self.seed = region, seed
+        self.bundle_count, self.bundle_size = bundle_count, bundle_size
+        self.latency, self.bandwidth = latency, bandwidth
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.retry_after, self.api_faults = retry_after, api_faults
+        self.corrupt = set(corrupt)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()  # (route, status) : count
+        self.requests = Counter()  # bundle index : count of bundles served
+        self.names = [self.bundle_name(i) for i in range(bundle_count)]
+        self.bundle_index = {name: i for i, name in enumerate(self.names)}
+        self.httpd = None
+
+    # region Data
+    @staticmethod
+    def bundle_name(i: int) -> str:
+        return "mock/%03d/bundle_%05d" % (i // 100, i)
+
+    @lru_cache(maxsize=256)
+    def content(self, i: int) -> bytes:
+        """Decrypted content of bundle `i`."""
+        return make_unityfs(self.bundle_size, random.Random(self.seed * 1000003 + i))
+
+    def body(self, i: int) -> bytes:
+        """Obfuscated content of bundle `i`, as served."""
+        return obfuscate(self.content(i))
+
+    def index(self) -> dict:
+        bundles = dict()
+        for i, name in enumerate(self.names):
+            body = self.body(i)
+            entry = {
+                "bundleName": name,
+                "cacheFileName": hashlib.md5(name.encode()).hexdigest(),
+                "cacheDirectoryName": "%05d" % i,
+                "hash": hashlib.md5(self.content(i)).hexdigest(),
+                "category": "StartApp" if i % 16 == 0 else "OnDemand",
+                "crc": 0,
+                "fileSize": len(body),
+                "dependencies": [self.names[i - 1]] if i % 8 else [],
+                "isBuiltin": i % 16 == 0,
+            }
+            if self.region in {"jp", "en"}:
+                entry["paths"] = []
+            else:
+                entry["md5Hash"] = hashlib.md5(body).hexdigest()
+                entry["downloadPath"] = MOCK_ROW_DOWNLOAD_PATH
+            bundles[name] = entry
+        index = {"version": MOCK_ASSET_VERSION, "bundles": bundles}
+        if self.region in {"jp", "en"}:
+            index["os"] = "android"
+        return index
+
+    def system_data(self) -> dict:
+        return {
+            "serverDate": int(time.time() * 1000),
+            "timezone": "Asia/Tokyo",
+            "profile": "production",
+            "maintenanceStatus": "maintenance_out",
+            "appVersions": [
+                {
+                    "systemProfile": "production",
+                    "appVersion": MOCK_APP_VERSION,
+                    "multiPlayVersion": "9.9.0",
+                    "appVersionStatus": "available",
+                    "assetVersion": MOCK_ASSET_VERSION,
+                }
+            ],
+        }
+
+    def gameversion_data(self) -> dict:
+        return {
+            "profile": "production",
+            "assetbundleHostHash": MOCK_HOST_HASH,
+            "domain": "production-game-api.sekai.colorfulpalette.org",
+        }
+
+    def packed(self, data: dict) -> bytes:
+        return encrypt(packb(data), SEKAI_APIMANAGER_KEYSETS[self.region])
+
+    # endregion
+
+    def route(self, method: str, host: str, path: str):
+        """(route name, body or bundle index). None if not found."""
+        if method == "POST" and path.endswith("/api/signature"):
+            return "signature", b""
+        if host.startswith("game-version."):
+            return "gameversion", self.packed(self.gameversion_data())
+        if path.endswith("/api/system"):
+            return "system", self.packed(self.system_data())
+        if "assetbundle-info" in host or path.endswith("/AssetBundleInfoNew.json"):
+            return "index", self.packed(self.index())
+        if path.endswith("/version"):
+            return "version", b"1"
+        parts = path.strip("/").split("/")
+        for k in range(len(parts)):
+            i = self.bundle_index.get("/".join(parts[k:]), None)
+            if i is not None:
+                return "bundle", i
+        return None
+
+    def fault(self, route: str) -> int | None:
+        """Status code of an injected fault. None if there's none."""
+        if route != "bundle" and not self.api_faults:
+            return None
+        with self.lock:
+            p = self.rng.random()
+        if p < self.throttle_rate:
+            return 429
+        if p < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, route, status, body=b"", headers=dict()):
+                with server.lock:
+                    server.stats[(route, status)] += 1
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if server.bandwidth and route == "bundle":
+                    chunk = max(int(server.bandwidth / 100), 1)
+                    for i in range(0, len(body), chunk):
+                        self.wfile.write(body[i : i + chunk])
+                        time.sleep(chunk / server.bandwidth)
+                else:
+                    self.wfile.write(body)
+
+            def handle_request(self, method):
+                self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+                if server.latency:
+                    time.sleep(server.latency)
+                host, _, path = self.path.lstrip("/").partition("/")
+                path = "/" + path.partition("?")[0]
+                route = server.route(method, host, path)
+                if route is None:
+                    return self.reply("unknown", 404)
+                route, body = route
+                status = server.fault(route)
+                if status == 429:
+                    return self.reply(
+                        route, 429, headers={"Retry-After": str(server.retry_after)}
+                    )
+                if status:
+                    return self.reply(route, status)
+                headers = dict()
+                if route == "signature":
+                    headers["Set-Cookie"] = (
+                        "CloudFront-Policy=mock; Path=/; Secure; HttpOnly"
+                    )
+                if route == "bundle":
+                    with server.lock:
+                        server.requests[body] += 1
+                    i, body = body, server.body(body)
+                    if i in server.corrupt:
+                        body = body[:-64]
+                self.reply(route, 200, body, headers)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def do_PUT(self):
+                self.handle_request("PUT")
+
+        return Handler
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @contextmanager
+    def patch(self):
+        """Route requests of all AbCache sessions to this server."""
+        from sssekai.abcache.adapter import AbCacheHTTPAdapter
+
+        send, base = AbCacheHTTPAdapter.send, self.url
+
+        def patched(adapter, request, **kwargs):
+            url = urlsplit(request.url)
+            request.url = "%s/%s%s" % (base, url.netloc, url.path)
+            if url.query:
+                request.url += "?" + url.query
+            return send(adapter, request, **kwargs)
+
+        AbCacheHTTPAdapter.send = patched
+        try:
+            yield self
+        finally:
+            AbCacheHTTPAdapter.send = send
@@ -0,0 +1,315 @@
+"""Reference implementations of RLA decoders replaced in `sssekai.fmt.rla`.
+
+Only used to check the replacements for identical output, and to benchmark them.
+"""
+
+from io import BytesIO
+import math
+import msgpack
+from sssekai.fmt.rla import read_int, read_float
+
+
+# Sekai_Streaming_StreamingData__Deserialize
+def decode_streaming_data_legacy(
+    version: tuple, decoder_signature, buffer, strict=True
+) -> dict:
+    """Decodes the streaming data payload into a dictionary.
+
+    Reference implementation of `decode_streaming_data`.
+
+    Args:
+        version (tuple): RLA version
+        decoder_signature (int): Decoder signature
+        buffer (bytes): Decoded payload data
+        strict (bool, optional): If False, incomplete packets will be returned as is. Defaults to True.
+
+    Raises:
+        Exception: If the packet is incomplete and strict is True.
+
+    Returns:
+        dict: Parsed streaming data payload
+    """
+    stream = BytesIO(buffer)
+    n_mask_offset = read_int(stream, 4)
+    n_init_pos = stream.tell()
+    stream.seek(n_mask_offset)
+    n_mask_length = read_int(stream, 2)
+    bitmask = stream.read(n_mask_length)
+    # assert not stream.read() # EOF
+    stream.seek(n_init_pos)
+    # CP_Serialize_SerializableValueSet
+    mask_i = -1
+
+    def get_next_mask():
+        nonlocal mask_i
+        mask_i += 1
+        return bitmask[mask_i // 8] & (1 << (mask_i % 8)) != 0
+
+    get_next_pred = lambda: get_next_mask() | (get_next_mask() << 1)
+    get_next_byte = lambda: [
+        lambda: 0,
+        lambda: 1,
+        lambda: -1,
+        lambda: read_int(stream, 1),
+    ][
+        get_next_pred()
+    ]()  # ReadByte
+    get_next_ushort = lambda: [
+        lambda: 0.0,
+        lambda: 0.0,
+        lambda: read_int(stream, 1),
+        lambda: read_int(stream, 2),
+    ][
+        get_next_pred()
+    ]()  # ReadUShort
+    get_next_short = lambda: [
+        lambda: 0.0,
+        lambda: 0.0,
+        lambda: read_int(stream, 1, True),
+        lambda: read_int(stream, 2),
+    ][
+        get_next_pred()
+    ]()  # ReadShort
+    get_next_int = lambda: [
+        lambda: 0,
+        lambda: read_int(stream, 1),
+        lambda: read_int(stream, 1, True),
+        lambda: read_int(stream, 4),
+    ][
+        get_next_pred()
+    ]()  # ReadInt
+    get_next_long = lambda: [
+        lambda: 0,
+        lambda: read_int(stream, 1),
+        lambda: read_int(stream, 2),
+        lambda: read_int(stream, 8),
+    ][
+        get_next_pred()
+    ]()  # ReadLong
+    get_next_float = lambda: [
+        lambda: 0.0,
+        lambda: 0.0,
+        lambda: 3.4028e38,
+        lambda: read_float(stream),
+    ][
+        get_next_pred()
+    ]()  # ReadSingle
+    get_next_vector3 = lambda: (
+        get_next_float(),
+        get_next_float(),
+        get_next_float(),
+    )  # ReadVector3
+    get_next_ushort_vector3 = lambda: (
+        get_next_ushort() * 0.01,
+        get_next_ushort() * 0.01,
+        get_next_ushort() * 0.01,
+    )  # ReadUShortVector3
+    get_next_quaternion = lambda: (
+        get_next_float(),
+        get_next_float(),
+        get_next_float(),
+        get_next_float(),
+    )  # ReadQuaternion
+    get_next_tiny_int = lambda type: {
+        "+": lambda: read_int(stream, 2),
+        "*": lambda: read_int(stream, 1, True),
+        ")": lambda: read_int(stream, 1),
+    }[
+        type
+    ]()  # ReadTinyInt
+    get_next_string = lambda: (
+        stream.read(get_next_tiny_int(chr(read_int(stream, 1)))).decode()
+        if get_next_pred()
+        else None
+    )  # ReadString
+
+    # HACK: Workaround for incomplete packets.
+    def gen_exception_handler(generator):
+        try:
+            for item in generator:
+                yield item
+        except Exception as e:
+            # XXX: This shouldn't happen unless the packet is corrupted.
+            if strict:
+                raise e
+            else:
+                return
+
+    gen_get_next_array = lambda reader: (
+        reader() for _ in range(get_next_int())
+    )  # ReadArray<T>
+    get_next_array = lambda reader: list(
+        gen_exception_handler(gen_get_next_array(reader))
+    )
+    # Sekai_Streaming_StreamingData__Deserialize
+    assert get_next_byte() == decoder_signature, "bad signature"
+    compress_type = get_next_int()
+    sequence_no = get_next_int()
+    target_time = get_next_long()
+    # StreamingData$$ReadValue implementations
+    deg_to_rad = lambda value: tuple(deg * (math.pi / 180) for deg in value)
+    get_next_deg_as_rad = lambda: deg_to_rad(
+        get_next_ushort_vector3()
+    )  # Eulers [0, 2pi]
+    get_next_pose_data = lambda: {
+        "bodyPosition": get_next_vector3(),
+        "bodyRotation": get_next_deg_as_rad(),  # Eulers
+        **(
+            {
+                "musicItemPropPosition": get_next_vector3(),
+                "musicItemPropRotation": get_next_deg_as_rad(),
+            }
+            if version >= (1, 1)
+            else {}
+        ),
+        "boneDatas": get_next_array(get_next_deg_as_rad),  # Eulers [0, 2pi]
+        "shapeDatas": get_next_array(get_next_float),  # [0,100]
+        **(
+            {"propBoneDatas": get_next_array(get_next_deg_as_rad)}  # Eulers [0, 2pi]
+            if version >= (1, 1)
+            else {}
+        ),
+        "heightOffset": get_next_short() * 0.01,
+        "isActive": get_next_mask(),
+        "useActiveFx": get_next_mask(),
+        **({"isEyeLookAt": get_next_mask()} if version >= (1, 4) else {}),
+    }
+    match decoder_signature:
+        case 0:
+            # Sekai_Streaming_MotionData
+            timeStamps = get_next_array(get_next_long) if get_next_pred() == 2 else None
+            poses = get_next_array(get_next_pose_data)
+            return {"type": "MotionData", "timeStamps": timeStamps, "poses": poses}
+        case 1:
+            # Sekai_Streaming_MotionCaptureData
+            read_character_capture_data = lambda: {
+                "id": get_next_int(),
+                "timestamp": get_next_long(),
+                "pose": get_next_pose_data(),
+            }
+            data = get_next_array(read_character_capture_data)
+            return {"type": "MotionCaptureData", "data": data}
+        case 2:
+            # Sekai_Streaming_SoundData
+            channels = get_next_int()
+            sample_rate = get_next_int()
+            data_length = get_next_int()
+            if compress_type != 1:
+                data = stream.read(data_length)  # Raw sampling data
+                return {
+                    "type": "SoundData",
+                    "channels": channels,
+                    "sampleRate": sample_rate,
+                    "encoding": "raw",
+                    "data": data,
+                }
+            else:
+                data = stream.read(data_length)  # HCA w/o metadata
+                return {
+                    "type": "SoundData",
+                    "channels": channels,
+                    "sampleRate": sample_rate,
+                    "encoding": "hca",
+                    "data": data,
+                }
+        case 3:
+            # Sekai_Streaming_StatusData
+            read_stage_status = lambda: {
+                "liveState": get_next_byte(),
+                "lightIntensity": get_next_float(),
+                "gayaVolume": get_next_float(),
+                "cheerVolume": get_next_float(),
+                "characterSpotlightIndex": get_next_int(),
+                "characterSpotlightIntensity": get_next_float(),
+                "stageSetlistIndex": get_next_int(),
+                "musicSetlistIndex": get_next_int(),
+                "musicTargetTime": get_next_long(),
+                "musicStartTime": get_next_float(),
+                "seId": get_next_int(),
+                "seStartTime": get_next_long(),
+                "timeStamp": get_next_long(),
+                "unk0": get_next_byte(),
+                "unk1": get_next_byte(),
+                "playTimelineId": get_next_int(),
+                **(
+                    {
+                        "screenFadeColorR": get_next_byte(),
+                        "screenFadeColorG": get_next_byte(),
+                        "screenFadeColorB": get_next_byte(),
+                        "screenFade": get_next_float(),
+                        "characterFormationRotate": get_next_int(),
+                        "stageCenterPosition": get_next_vector3(),
+                        "playerAvatarStartPosition": get_next_vector3(),
+                    }
+                    if version >= (1, 4)
+                    else {}
+                ),
+                **(
+                    {
+                        "characterVisible": get_next_mask(),
+                        "eyeLookAtTargetPositionOffset": get_next_vector3(),
+                        "eyeLookAtAngleLimit": get_next_vector3(),
+                        "isPreloadReverseCharacter": get_next_mask(),
+                    }
+                    if version >= (1, 5)
+                    else {}
+                ),
+                **(
+                    {
+                        "eyeLookAtUvLimit": get_next_quaternion(),
+                    }
+                    if version >= (1, 6)
+                    else {}
+                ),
+                **(
+                    {
+                        "preloadReserveFirstCharacterDelay": get_next_float(),
+                        "preloadReserveCharacterInterval": get_next_float(),
+                    }
+                    if version >= (1, 7)
+                    else {}
+                ),
+            }
+            read_character_status = lambda: {
+                "costumeIndex": get_next_int(),
+                **({"visible": get_next_mask()} if version >= (1, 6) else {}),
+                **({"useFx": get_next_mask()} if version >= (1, 2) else {}),
+                "timeStamp": get_next_long(),
+            }
+            stage_status_list = get_next_array(read_stage_status)
+            stage_status_length = get_next_int()
+            charcter_status_list = [
+                get_next_array(read_character_status)
+                for _ in range(stage_status_length)
+            ]
+            return {
+                "type": "StatusData",
+                "stageStatus": stage_status_list,
+                "characterStatus": charcter_status_list,
+            }
+        case 4:
+            # Sekai_Streaming_VirtualLiveMessageData
+            message_id = get_next_int()
+            user_id = get_next_string()
+            data_length = get_next_int()
+            data = stream.read(data_length)
+            # CP_BinarySerializer__Deserialize_OtherRoomMessageData
+            # CP_BinarySerializer__Deserialize_OtherRoomActionData
+            # NOTE: The msgpack payload does not contain the message type
+            data = msgpack.unpackb(data)
+            return {
+                "type": "VirtualLiveMessageData",
+                "messageId": message_id,
+                "userId": user_id,
+                "data": data,
+            }
+        case 5:
+            # Sekai_Streaming_ComplementInfoData
+            info_type = get_next_int()
+            info_data = get_next_string()
+            return {
+                "type": "ComplementInfoData",
+                "infoType": info_type,
+                "infoData": info_data,
+            }
+    return {"type": "Unknown", "data": buffer}
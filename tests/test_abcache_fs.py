@@ -0,0 +1,203 @@
+from . import *
+import random
+
+
+def __make_cache(names):
+    from sssekai.abcache import AbCache, AbCacheConfig, AbCacheIndex, AbCacheEntry
+
+    cache = AbCache(AbCacheConfig("jp", "unknown", "android", "unknown"))
+    cache.database.sekai_abcache_index = AbCacheIndex(
+        "unknown",
+        bundles={
+            name: AbCacheEntry(name, "", "", "", "OnDemand", 0, i + 1, [], False)
+            for i, name in enumerate(names)
+        },
+    )
+    return cache
+
+
+def __reference_fs(cache):
+    """The filesystem as listed before the directory index: plain `ls` and `info`,
+    and fsspec's generic `find` and `glob` over them"""
+    from fsspec.archive import AbstractArchiveFileSystem
+    from sssekai.abcache.fs import AbCacheFilesystem
+
+    bundles = cache.abcache_index.bundles
+    nodes = {"/": {"name": "/", "type": "directory", "size": 0}}
+    children = {"/": []}
+    for name in sorted(bundles):
+        parts = name.split("/")
+        for k in range(1, len(parts) + 1):
+            path, parent = "/" + "/".join(parts[:k]), "/" + "/".join(parts[: k - 1])
+            if path not in nodes:
+                is_file = k == len(parts)
+                nodes[path] = {
+                    "name": path,
+                    "type": "file" if is_file else "directory",
+                    "size": bundles[name].fileSize if is_file else 0,
+                }
+                children[parent].append(path)
+                children[path] = []
+
+    class ReferenceFilesystem(AbCacheFilesystem):
+        def info(self, path, **kwargs):
+            if (path or "/") not in nodes:
+                raise FileNotFoundError(path)
+            return nodes[path or "/"]
+
+        def ls(self, path, detail=True, **kwargs):
+            paths = children.get(path or "/", [])
+            return [nodes[p] for p in paths] if detail else paths
+
+        find = AbstractArchiveFileSystem.find
+        glob = AbstractArchiveFileSystem.glob
+
+    return ReferenceFilesystem(cache_obj=cache, skip_instance_cache=True)
+
+
+def test_abcache_fs_listing():
+    from sssekai.abcache.fs import AbCacheFilesystem
+
+    rng = random.Random(0)
+    names = set()
+    while len(names) < 1500:
+        depth = rng.randint(1, 4)
+        names.add("/".join(rng.choice("ab") + rng.choice("xyz") for _ in range(depth)))
+    # A name can't be both a file and a directory
+    names = [name for name in names if not any(n.startswith(name + "/") for n in names)]
+    cache = __make_cache(names)
+    fs = AbCacheFilesystem(cache_obj=cache, skip_instance_cache=True)
+    ref = __reference_fs(cache)
+    strip = lambda info: {k: info[k] for k in ("name", "type", "size")}
+    dirs = ref.find("/", withdirs=True)
+    for path in dirs[:: len(dirs) // 100] + ["/", "/zz", "/ax/zz"]:
+        assert fs.ls(path, detail=False) == ref.ls(path, detail=False), path
+        assert [strip(i) for i in fs.ls(path)] == [strip(i) for i in ref.ls(path)]
+        for args in ((), (1,), (2,)):
+            for withdirs in (False, True):
+                assert fs.find(path, *args, withdirs=withdirs) == ref.find(
+                    path, *args, withdirs=withdirs
+                ), (path, args, withdirs)
+        try:
+            assert strip(fs.info(path)) == strip(ref.info(path))
+        except FileNotFoundError:
+            assert not ref.exists(path)
+    for pattern in ("/*", "/ax/*", "/a*/b?", "/**", "/**/ay", "/ax", "/zz", "/zz/*"):
+        assert fs.glob(pattern) == ref.glob(pattern), pattern
+    # Pagination
+    listing = fs.ls("/ax", detail=False)
+    pages = [fs.ls("/ax", False, offset, 4) for offset in range(0, len(listing), 4)]
+    assert sum(pages, []) == listing and all(len(page) <= 4 for page in pages)
+    # Aggregates
+    info = fs.info("/ax")
+    files = [f for f in ref.find("/ax", detail=True).values()]
+    assert info["file_count"] == len(files)
+    assert info["total_size"] == sum(f["size"] for f in files)
+
+
+def test_abcache_fs_update():
+    from sssekai.abcache import AbCacheEntry
+    from sssekai.abcache.fs import AbCacheDirectoryIndex
+
+    rng = random.Random(1)
+    parts = lambda: "/".join(rng.choice("abc") for _ in range(rng.randint(1, 4)))
+    names = sorted({parts() + "/f" + str(i) for i in range(800)})
+    entry = lambda name, size: AbCacheEntry(
+        name, "", "", "", "OnDemand", 0, size, [], False
+    )
+    bundles = {name: entry(name, rng.randint(1, 100)) for name in names}
+    dirs = AbCacheDirectoryIndex(bundles)
+    for path in ("/", "/a", "/a/b", "/c/c/c", "/b/a/a"):  # Partially expanded
+        dirs.ls(path)
+    for _ in range(20):
+        new = dict(bundles)
+        for name in rng.sample(sorted(new), 30):
+            del new[name]
+        for name in rng.sample(sorted(new), 30):
+            new[name] = entry(name, rng.randint(1, 100))
+        for i in range(30):
+            name = parts() + "/g" + str(rng.randint(0, 10**6))
+            new[name] = entry(name, rng.randint(1, 100))
+        if rng.random() < 0.2:  # Whole directories going away
+            new = {k: v for k, v in new.items() if not k.startswith("b/")}
+        changed = {
+            k for k in new.keys() | bundles.keys() if new.get(k) is not bundles.get(k)
+        }
+        before = dirs.find("/", withdirs=True)
+        old, dirs = dirs, dirs.update(new, changed)
+        assert old.find("/", withdirs=True) == before  # Left as is
+        bundles = new
+        ref = AbCacheDirectoryIndex(bundles)
+        for node in ref.find("/", withdirs=True) + [{"name": "/b/zz"}]:
+            path = node["name"]
+            try:
+                expected = ref.ls(path), ref.find(path, withdirs=True)
+            except FileNotFoundError:
+                expected = None
+            try:
+                assert (dirs.ls(path), dirs.find(path, withdirs=True)) == expected, path
+            except FileNotFoundError:
+                assert expected is None, path
+        for path in rng.sample(
+            [node["name"] for node in ref.find("/", withdirs=True)], 10
+        ):
+            dirs.ls(path)  # Expand a few more for the next round
+    assert dirs.garbage <= len(dirs) - dirs.garbage
+
+
+def test_abcache_fs_refresh_concurrent():
+    import threading
+    from sssekai.abcache import AbCacheIndex, AbCacheEntry
+    from sssekai.abcache.fs import AbCacheFilesystem, AbCacheDirectoryIndex
+
+    names = ["a/%d/f%d" % (i % 50, i) for i in range(2000)]
+    cache = __make_cache(names)
+    fs = AbCacheFilesystem(cache_obj=cache, skip_instance_cache=True)
+    listing = fs.ls("/a", detail=False)
+    bundles = dict(cache.abcache_index.bundles)
+    bundles["b/f"] = AbCacheEntry("b/f", "", "", "", "OnDemand", 0, 1, [], False)
+    cache.update_abcache_index = lambda: setattr(
+        cache.database, "sekai_abcache_index", AbCacheIndex("unknown", bundles=bundles)
+    )
+    # Hold the refresh in the middle of applying the diff
+    applying, resume = threading.Event(), threading.Event()
+    apply = AbCacheDirectoryIndex._apply
+
+    def _apply(self, *args):
+        applying.set()
+        assert resume.wait(10)
+        return apply(self, *args)
+
+    AbCacheDirectoryIndex._apply = _apply
+    try:
+        refresh = threading.Thread(target=fs.refresh)
+        refresh.start()
+        assert applying.wait(10)
+        results = list()
+        reader = threading.Thread(
+            target=lambda: results.extend(
+                (fs.ls("/", detail=False), fs.ls("/a", detail=False), fs.info("/a/7"))
+            )
+        )
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), "readers blocked by the refresh"
+        assert results[:2] == [["/a"], listing] and results[2]["file_count"] == 40
+        # Refreshes are serialized, the second one waits for the first to be swapped in
+        second = threading.Thread(target=fs.refresh)
+        second.start()
+        second.join(0.2)
+        assert second.is_alive()
+        resume.set()
+        refresh.join(10)
+        second.join(10)
+    finally:
+        resume.set()
+        AbCacheDirectoryIndex._apply = apply
+    assert fs.ls("/", detail=False) == ["/a", "/b"]
+
+
+if __name__ == "__main__":
+    test_abcache_fs_listing()
+    test_abcache_fs_update()
+    test_abcache_fs_refresh_concurrent()
@@ -0,0 +1,106 @@
+from . import *
+from .mock_server import MockSekaiServer, MOCK_APP_VERSION
+
+
+def __store(server, name):
+    import shutil
+    from sssekai.abcache import AbCache, AbCacheConfig
+    from sssekai.abcache.fs import AbCacheFilesystem
+    from sssekai.abcache.fuse import AbCacheBlockStore
+
+    cache = AbCache(AbCacheConfig("tw", MOCK_APP_VERSION, "android", "mock"))
+    cache.update()
+    fs = AbCacheFilesystem(cache_obj=cache, skip_instance_cache=True)
+    root = os.path.join(TEMP_DIR, name)
+    shutil.rmtree(root, ignore_errors=True)
+    return AbCacheBlockStore(fs, root)
+
+
+def test_abcache_fuse_store():
+    import random, threading
+    from types import SimpleNamespace
+    from sssekai.abcache.fuse import AbCacheFuseOperations
+
+    with MockSekaiServer(
+        "tw", bundle_count=4, bundle_size=1 << 18, bandwidth=1 << 20
+    ) as server, server.patch():
+        store = __store(server, "abcache_fuse_store")
+        ops = AbCacheFuseOperations(store.fs, store)
+        path = "/" + server.names[0]
+        content = server.content(0)
+        entry = store.fs.cache.get_entry_by_bundle_name(server.names[0])
+        fi = SimpleNamespace(fh=0, keep_cache=0, direct_io=0)
+        ops.open(path, fi)
+        assert fi.direct_io  # Still being downloaded
+        state = ops.handles[fi.fh]
+        assert state.path.endswith(".part")
+        # Concurrent readers, waiting for their ranges while it's being filled
+        errors = list()
+
+        def __reader(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(16):
+                    offset = rng.randrange(len(content))
+                    size = rng.randint(1, 65536)
+                    data = ops.read(path, size, offset, fi)
+                    assert data == content[offset : offset + size]
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=__reader, args=(i,)) for i in range(8)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        assert not errors, errors
+        with state.cond:
+            state.cond.wait_for(lambda: state.done)
+        assert not state.error
+        # Renamed from .part once verified
+        assert state.path == store.object_path(entry.hash)
+        assert not os.path.exists(state.path + ".part")
+        assert store.stored_size(entry) == len(content)
+        assert ops.read(path, len(content) + 1, 0, fi) == content
+        ops.release(path, fi)
+        assert ops.getattr(path)["st_size"] == len(content)
+        # Stored bundles are served from the page cache
+        ops.open(path, fi)
+        assert fi.keep_cache and ops.handles[fi.fh].done
+        requests = server.requests[0]
+        assert store.fill(entry) is ops.handles[fi.fh]
+        assert server.requests[0] == requests
+
+
+def test_abcache_fuse_store_corrupt():
+    import errno
+
+    with MockSekaiServer(
+        "tw", bundle_count=2, bundle_size=1 << 16, corrupt={1}
+    ) as server, server.patch():
+        store = __store(server, "abcache_fuse_store_corrupt")
+        entry = store.fs.cache.get_entry_by_bundle_name(server.names[1])
+        state = store.fill(entry)
+        with state.cond:
+            state.cond.wait_for(lambda: state.done)
+        assert state.error and state.size > 0
+        # Nothing is served from a failed download. Not even what's already on disk
+        for offset, size in ((0, 16), (0, state.size), (state.size - 1, 2)):
+            try:
+                store.read(state, offset, size)
+                assert False, "read of a failed download"
+            except OSError as e:
+                assert e.errno == errno.EIO
+        assert store.stored_size(entry) is None
+        assert not os.path.exists(store.object_path(entry.hash))
+        # Which is downloaded again on the next open
+        retry = store.fill(entry)
+        assert retry is not state
+        with retry.cond:
+            retry.cond.wait_for(lambda: retry.done)
+        assert server.requests[1] == 2
+
+
+if __name__ == "__main__":
+    test_abcache_fuse_store()
+    test_abcache_fuse_store_corrupt()
@@ -0,0 +1,217 @@
+from . import *
+from .mock_server import (
+    MockSekaiServer,
+    MOCK_APP_VERSION,
+    MOCK_ASSET_VERSION,
+    MOCK_HOST_HASH,
+)
+
+
+def __args(region, db, download_dir, **kwargs):
+    args = {
+        "app_region": region,
+        "app_platform": "android",
+        "app_version": MOCK_APP_VERSION,
+        "app_appHash": "mock",
+        "db": db,
+        "download_dir": download_dir,
+        "download_storage": "local",
+        "download_workers": 4,
+        "download_readahead": 2,
+    }
+    args.update(kwargs)
+    return NamedDict(args)
+
+
+def __check_downloads(server: MockSekaiServer, download_dir: str, skip=()):
+    for i, name in enumerate(server.names):
+        if name in skip:
+            continue
+        with open(os.path.join(download_dir, name), "rb") as f:
+            assert f.read() == server.content(i), name
+
+
+def test_abcache_mock_jp():
+    import shutil
+    from sssekai.abcache import AbCache, AbCacheConfig
+    from sssekai.entrypoint.abcache import main_abcache
+
+    with MockSekaiServer(
+        "jp", bundle_count=32, bundle_size=4096, throttle_rate=0.1, api_faults=True
+    ) as server, server.patch():
+        # Signatures, game version and system data
+        cache = AbCache(
+            AbCacheConfig("jp", MOCK_APP_VERSION, "android", "mock", asset_hash="mock")
+        )
+        cache.update()
+        assert cache.SEKAI_AB_HOST_HASH == MOCK_HOST_HASH
+        assert cache.SEKAI_ASSET_VERSION == MOCK_ASSET_VERSION
+        assert len(cache.abcache_index.bundles) == 32
+        download_dir = os.path.join(TEMP_DIR, "abcache_mock_jp")
+        shutil.rmtree(download_dir, ignore_errors=True)  # Verified ones are skipped
+        main_abcache(
+            __args(
+                "jp",
+                os.path.join(TEMP_DIR, "abcache_mock_jp.db"),
+                download_dir,
+                app_asset_hash="mock",
+                app_asset_host=MOCK_HOST_HASH,
+                app_asset_version=MOCK_ASSET_VERSION,
+            )
+        )
+        __check_downloads(server, download_dir)
+        assert server.stats[("bundle", 429)] > 0
+
+
+def test_abcache_mock_row():
+    import shutil
+    from sssekai.entrypoint.abcache import main_abcache
+
+    with MockSekaiServer(
+        "tw", bundle_count=32, bundle_size=4096, error_rate=0.05
+    ) as server, server.patch():
+        download_dir = os.path.join(TEMP_DIR, "abcache_mock_tw")
+        shutil.rmtree(download_dir, ignore_errors=True)  # Verified ones are skipped
+        main_abcache(
+            __args("tw", os.path.join(TEMP_DIR, "abcache_mock_tw.db"), download_dir)
+        )
+        __check_downloads(server, download_dir)
+
+
+def test_abcache_mock_verify():
+    import shutil
+    from sssekai.abcache.storage import AbCacheLocalStorage
+    from sssekai.entrypoint.abcache import (
+        main_abcache,
+        AbCacheDownloader,
+        AbCacheDownloadState,
+    )
+    from sssekai.entrypoint.abdecrypt import main_abdecrypt
+
+    download_dir = os.path.join(TEMP_DIR, "abcache_mock_verify")
+    db = os.path.join(TEMP_DIR, "abcache_mock_verify.db")
+    shutil.rmtree(download_dir, ignore_errors=True)
+    with MockSekaiServer(
+        "tw", bundle_count=8, bundle_size=4096, corrupt={3}
+    ) as server, server.patch():
+        bad = server.names[3]
+        main_abcache(__args("tw", db, download_dir))
+        assert server.requests[3] == AbCacheDownloader.RETRIES
+        assert not os.path.exists(os.path.join(download_dir, bad))
+        with open(os.path.join(download_dir, ".quarantine", bad), "rb") as f:
+            assert f.read() == server.content(3)[:-64]
+        # Verified bundles are known-good after a restart. Only the corrupt one is retried
+        state = AbCacheDownloadState(AbCacheLocalStorage(download_dir))
+        assert set(state.verified) == set(server.names) - {bad}
+        requests = server.requests.copy()
+        main_abcache(__args("tw", db, download_dir, download_no_overwrite=True))
+        assert server.requests - requests == {3: AbCacheDownloader.RETRIES}
+        # Known-good ones are skipped either way. Changed, or never verified ones are not
+        for no_overwrite in (False, True):
+            with open(os.path.join(download_dir, server.names[1]), "ab") as f:
+                f.write(b"junk")
+            state = AbCacheDownloadState(AbCacheLocalStorage(download_dir))
+            del state.verified[server.names[2]]
+            state.save()
+            requests = server.requests.copy()
+            main_abcache(
+                __args("tw", db, download_dir, download_no_overwrite=no_overwrite)
+            )
+            assert server.requests - requests == {
+                1: 1,
+                2: 1,
+                3: AbCacheDownloader.RETRIES,
+            }
+        __check_downloads(server, download_dir, skip={bad})
+        # Nothing is recorded without verification, present files are kept as is
+        requests = server.requests.copy()
+        main_abcache(
+            __args(
+                "tw",
+                db,
+                download_dir,
+                download_no_overwrite=True,
+                download_no_verify=True,
+            )
+        )
+        assert server.requests - requests == {3: 1}
+    outdir = os.path.join(TEMP_DIR, "abcache_mock_verify_decrypted")
+    shutil.rmtree(outdir, ignore_errors=True)
+    main_abdecrypt(NamedDict(indir=download_dir, outdir=outdir))
+    assert not os.path.exists(os.path.join(outdir, AbCacheDownloadState.FILENAME))
+    assert not os.path.exists(os.path.join(outdir, AbCacheDownloader.QUARANTINE))
+
+
+def test_abcache_mock_sync():
+    import json, shutil
+    from sssekai.entrypoint.abcache import main_abcache
+
+    download_dir = os.path.join(TEMP_DIR, "abcache_mock_sync")
+    shutil.rmtree(download_dir, ignore_errors=True)
+    os.makedirs(download_dir)
+    configs = os.path.join(download_dir, "..", "abcache_mock_sync.json")
+    with open(configs, "w") as f:
+        config = {
+            "app_region": "jp",
+            "app_version": MOCK_APP_VERSION,
+            "app_hash": "mock",
+            "asset_hash": "mock",
+            "asset_host": MOCK_HOST_HASH,
+            "asset_version": MOCK_ASSET_VERSION,
+            "db": os.path.join(TEMP_DIR, "abcache_mock_sync.db"),
+        }
+        json.dump([config], f)
+    with MockSekaiServer(
+        "jp", bundle_count=8, bundle_size=4096
+    ) as server, server.patch():
+        args = lambda **kw: __args(
+            "jp",
+            None,
+            download_dir,
+            sync_configs=configs,
+            download_query="size > 0",
+            **kw
+        )
+        assert main_abcache(args()) == 0
+        for i, name in enumerate(server.names):
+            with open(os.path.join(download_dir, "jp", "android", name), "rb") as f:
+                assert f.read() == server.content(i), name
+        # Cookies are refreshed without updating, and nothing is left to download
+        signatures = server.stats[("signature", 200)]
+        plan = os.path.join(download_dir, "..", "abcache_mock_sync_plan.json")
+        assert main_abcache(args(no_update=True, download_plan=plan)) == 0
+        assert server.stats[("signature", 200)] == signatures + 1
+        with open(plan) as f:
+            plan = json.load(f)
+        assert plan["selected"] == plan["unique"] == 8 and plan["pending"] == 0
+        assert main_abcache(args(download_filter_cache_diff=config["db"])) == 1
+
+
+def test_abcache_mock_readahead_abandoned():
+    import gc, threading
+    from sssekai.abcache import AbCache, AbCacheConfig
+    from sssekai.abcache.fs import AbCacheFilesystem
+
+    with MockSekaiServer(
+        "tw", bundle_count=1, bundle_size=1 << 20
+    ) as server, server.patch():
+        cache = AbCache(AbCacheConfig("tw", MOCK_APP_VERSION, "android", "mock"))
+        cache.update()
+        fs = AbCacheFilesystem(cache_obj=cache, skip_instance_cache=True)
+        f = fs.open(server.names[0], readahead=2)
+        assert f.read(4096) == server.content(0)[:4096]
+        (thread,) = [t for t in threading.enumerate() if t.name == "abcache-readahead"]
+        # Dropped without closing. The producer must not keep it alive
+        del f
+        gc.collect()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert cache.throttle.in_flight == 0
+
+
+if __name__ == "__main__":
+    test_abcache_mock_jp()
+    test_abcache_mock_row()
+    test_abcache_mock_verify()
+    test_abcache_mock_sync()
+    test_abcache_mock_readahead_abandoned()
@@ -0,0 +1,68 @@
+from . import *
+
+
+def __make_cache(bundles):
+    from sssekai.abcache import AbCache, AbCacheConfig, AbCacheIndex, AbCacheEntry
+
+    cache = AbCache(AbCacheConfig("jp", "unknown", "android", "unknown"))
+    cache.database.sekai_abcache_index = AbCacheIndex(
+        "unknown",
+        bundles={
+            name: AbCacheEntry(name, "", "", hash, category, 0, size, deps, builtin)
+            for name, hash, category, size, deps, builtin in bundles
+        },
+    )
+    return cache
+
+
+def test_abcache_query():
+    import re
+    from sssekai.abcache.query import regex_literal_prefix
+
+    cache = __make_cache(
+        [
+            ("live_pv/model/01", "a", "OnDemand", 1000, ["shader/live"], False),
+            ("live_pv/model/02", "b", "OnDemand", 5000, ["shader/live"], False),
+            ("live_pv/timeline/01", "c", "OnDemand", 200, [], False),
+            ("shader/live", "d", "StartApp", 300, [], True),
+        ]
+    )
+    diff = __make_cache([("live_pv/model/01", "a", "OnDemand", 1000, [], False)])
+    assert cache.query('name ^= "live_pv/model/"') == [
+        "live_pv/model/01",
+        "live_pv/model/02",
+    ]
+    assert cache.query('name ~ "live_pv/.*/01" and size > 500') == ["live_pv/model/01"]
+    assert cache.query("category = StartApp or builtin = true") == ["shader/live"]
+    assert cache.query('dependency = "shader/live" and not size < 2000') == [
+        "live_pv/model/02"
+    ]
+    assert cache.query('status = "unchanged"', diff) == ["live_pv/model/01"]
+    assert len(cache.query("")) == 4
+    assert regex_literal_prefix(re.compile("live_pv/model/.*")) == "live_pv/model/"
+    assert regex_literal_prefix(re.compile("^shader|live")) == ""
+
+
+def test_abcache_select_bundles():
+    from sssekai.entrypoint.abcache import select_bundles
+
+    cache = __make_cache(
+        [
+            ("live_pv/model/01", "a", "OnDemand", 1000, ["live_pv/motion/01"], False),
+            ("live_pv/motion/01", "b", "OnDemand", 500, ["shader/live"], False),
+            ("live_pv/timeline/01", "c", "OnDemand", 200, [], False),
+            ("shader/live", "d", "StartApp", 300, [], True),
+        ]
+    )
+    bundles, basebundles = select_bundles(cache, "live_pv/model/.*", query="size > 0")
+    assert bundles == basebundles == {"live_pv/model/01"}
+    bundles, basebundles = select_bundles(cache, "live_pv/model/.*", ensure_deps=True)
+    assert basebundles == {"live_pv/model/01"}
+    assert bundles == {"live_pv/model/01", "live_pv/motion/01", "shader/live"}
+    bundles, _ = select_bundles(cache, "nothing", ensure_deps=True)
+    assert bundles == set()
+
+
+if __name__ == "__main__":
+    test_abcache_query()
+    test_abcache_select_bundles()
@@ -0,0 +1,135 @@
+from . import *
+import io, shutil
+
+
+def __temp(name):
+    path = os.path.join(TEMP_DIR, name)
+    shutil.rmtree(path, ignore_errors=True)
+    return path
+
+
+def __crash(storage):
+    """Drop a shard storage as if the process died. Its shard is left without a central directory"""
+    fp, storage.zip.fp = storage.zip.fp, None
+    fp.close()
+    storage.index_file.close()
+
+
+def test_abcache_shard_storage():
+    import zipfile
+    from sssekai.abcache.storage import AbCacheShardStorage, open_storage
+
+    root = __temp("abcache_shard_storage")
+    data = {"a/%d" % i: os.urandom(1000 + i) for i in range(8)}
+    with AbCacheShardStorage(root, shard_size=4096) as storage:
+        for name, content in data.items():
+            with storage.create(name) as f:
+                f.write(content)
+                f.commit()
+        with storage.create("discarded") as f:
+            f.write(b"uncommitted")
+        assert storage.names() == set(data)
+        for name, content in data.items():
+            assert storage.stat(name)[0] == len(content)
+            with storage.open(name) as f:
+                assert f.read() == content
+    # Full shards are rolled over, and stay readable as plain ZIPs once closed
+    shards = sorted(p for p in os.listdir(root) if p.startswith("shard-"))
+    assert len(shards) > 1
+    members = dict()
+    for shard in shards:
+        with zipfile.ZipFile(os.path.join(root, shard)) as z:
+            members.update((name, z.read(name)) for name in z.namelist())
+    assert members == data
+    # Reopened from the index
+    assert isinstance(open_storage(root), AbCacheShardStorage)
+    with AbCacheShardStorage(root, shard_size=4096) as storage:
+        assert storage.names() == set(data)
+        storage.remove("a/0")
+        storage.put("a/1", io.BytesIO(b"replaced"), 8)
+        try:
+            storage.remove("a/0")
+            assert False, "removed twice"
+        except FileNotFoundError:
+            pass
+    # Index replay. Removals and the latest records win, torn lines are skipped
+    with open(os.path.join(root, AbCacheShardStorage.INDEX), "a") as f:
+        f.write('{"name": "torn", "sha')
+    with AbCacheShardStorage(root, shard_size=4096) as storage:
+        assert storage.names() == set(data) - {"a/0"}
+        assert not storage.exists("a/0") and not storage.exists("torn")
+        with storage.open("a/1") as f:
+            assert f.read() == b"replaced"
+
+
+def test_abcache_shard_storage_crash():
+    from sssekai.abcache.storage import AbCacheShardStorage
+
+    root = __temp("abcache_shard_storage_crash")
+    storage = AbCacheShardStorage(root)
+    storage.put("before", io.BytesIO(b"before crash"), 12)
+    __crash(storage)
+    # Members of the unclosed shard are still readable through the index,
+    # and new ones go to a fresh shard
+    with AbCacheShardStorage(root) as storage:
+        with storage.open("before") as f:
+            assert f.read() == b"before crash"
+        storage.put("after", io.BytesIO(b"after crash"), 11)
+        assert storage.shard_id == 1
+    with AbCacheShardStorage(root) as storage:
+        assert storage.names() == {"before", "after"}
+        with storage.open("after") as f:
+            assert f.read() == b"after crash"
+
+
+def test_abcache_object_storage():
+    from sssekai.abcache.storage import AbCacheObjectStorage
+
+    root = __temp("abcache_object_storage")
+    storage = AbCacheObjectStorage("file://" + root)
+    assert storage.names() == set()
+    with storage.create("a/b/bundle") as f:
+        f.write(b"content")
+        assert not storage.exists("a/b/bundle")  # Not visible until committed
+        f.commit()
+    with storage.create("a/uncommitted") as f:
+        f.write(b"discarded")
+    storage.write_meta("state.json", b"{}")
+    assert storage.names() == {"a/b/bundle", "state.json"}
+    assert storage.stat("a/b/bundle")[0] == 7
+    with storage.open("a/b/bundle") as f:
+        assert f.read() == b"content"
+    assert storage.read_meta("state.json") == b"{}"
+    assert storage.read_meta("missing.json") is None
+    storage.remove("a/b/bundle")
+    assert not storage.exists("a/b/bundle")
+    # Only whole objects. No temporaries are left behind
+    assert sorted(os.listdir(root)) == ["a", "state.json"]
+    assert os.listdir(os.path.join(root, "a")) == ["b"]
+
+
+def test_abcache_shard_storage_abdecrypt():
+    from sssekai.abcache.storage import AbCacheShardStorage
+    from sssekai.entrypoint.abcache import AbCacheDownloader
+    from sssekai.entrypoint.abdecrypt import main_abdecrypt
+    from .mock_server import make_unityfs, obfuscate
+    import random
+
+    root = __temp("abcache_shard_storage_abdecrypt")
+    outdir = __temp("abcache_shard_storage_abdecrypt_out")
+    content = make_unityfs(4096, random.Random(0))
+    body = obfuscate(content)
+    with AbCacheShardStorage(root) as storage:
+        for name in ("bundle", AbCacheDownloader.QUARANTINE + "corrupt"):
+            storage.put(name, io.BytesIO(body), len(body))
+    main_abdecrypt(NamedDict(indir=root, outdir=outdir))
+    assert os.listdir(outdir) == ["bundle"]
+    with open(os.path.join(outdir, "bundle"), "rb") as f:
+        assert f.read() == content
+
+
+if __name__ == "__main__":
+    test_abcache_shard_storage()
+    test_abcache_shard_storage_crash()
+    test_abcache_object_storage()
+    test_abcache_shard_storage_abdecrypt()
@@ -0,0 +1,89 @@
+from . import *
+
+
+def test_abcache_parse_retry_after():
+    import time
+    from email.utils import formatdate
+    from sssekai.abcache.throttle import parse_retry_after
+
+    assert parse_retry_after("5") == 5
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("-3") == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0
+
+
+def test_abcache_throttle_aimd():
+    import time
+    from sssekai.abcache.throttle import AbCacheThrottle
+
+    throttle = AbCacheThrottle(max_limit=8, min_limit=2, base_backoff=0.05)
+    # Multiplicative decrease, once per pause
+    assert abs(throttle.backoff(0.05) - 0.05) < 1e-6
+    assert throttle.limit == 4
+    assert throttle.backoff(0.1) > 0.05  # Extends the pause only
+    assert throttle.limit == 4
+    time.sleep(0.1)
+    throttle.backoff(0)
+    assert throttle.limit == 2
+    throttle.backoff(0)
+    assert throttle.limit == 2  # Floored at min_limit
+    # Exponential backoff without Retry-After, reset by a success
+    assert throttle.consecutive == 4
+    time.sleep(0.01)
+    assert abs(throttle.backoff() - 0.05 * 2**4) < 0.01
+    capped = AbCacheThrottle(base_backoff=0.05, max_backoff=0.1)
+    assert [round(capped.backoff() + 1e-6, 2) for _ in range(3)] == [0.05, 0.1, 0.1]
+    throttle.success()
+    assert throttle.consecutive == 0
+    # Additive increase of about `increase` per round of `limit` requests
+    throttle.limit = 2
+    for _ in range(2):
+        throttle.success()
+    assert 2.8 < throttle.limit < 3
+    for _ in range(100):
+        throttle.success()
+    assert throttle.limit == 8  # Capped at max_limit
+    # Resizing keeps an unthrottled limit at the maximum
+    throttle.resize(4)
+    assert throttle.limit == 4
+    throttle.resize(16)
+    assert throttle.limit == 16
+
+
+def test_abcache_throttle_slots():
+    import time, threading
+    from sssekai.abcache.throttle import AbCacheThrottle
+
+    throttle = AbCacheThrottle(max_limit=2)
+    throttle.acquire()
+    throttle.acquire()
+    acquired = threading.Event()
+
+    def __acquire():
+        with throttle:
+            acquired.set()
+
+    thread = threading.Thread(target=__acquire)
+    thread.start()
+    assert not acquired.wait(0.1)  # No slot left
+    throttle.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert throttle.in_flight == 1
+    throttle.release()
+    # New requests wait out the pause
+    throttle.backoff(0.2)
+    start = time.monotonic()
+    with throttle:
+        assert time.monotonic() - start >= 0.15
+    assert throttle.in_flight == 0
+
+
+if __name__ == "__main__":
+    test_abcache_parse_retry_after()
+    test_abcache_throttle_aimd()
+    test_abcache_throttle_slots()
@@ -0,0 +1,27 @@
+from . import *
+import json
+
+
+def test_profile_spineextract():
+    from sssekai.profiling import Profile, PROFILE_MODES
+    from sssekai.entrypoint.spineextract import main_spineextract
+
+    for mode in PROFILE_MODES:
+        output = os.path.join(TEMP_DIR, "profile_spineextract_%s" % mode)
+        with Profile(output, mode):
+            main_spineextract(
+                NamedDict(
+                    {
+                        "infile": sample_file_path("spine", "base_model"),
+                        "outdir": os.path.join(TEMP_DIR, "profile_spineextract"),
+                    }
+                )
+            )
+        with open(output + ".phases.json", "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        assert {"load", "parse", "convert", "write"} <= summary["phases"].keys()
+        assert os.path.getsize(summary["stats"])
+
+
+if __name__ == "__main__":
+    test_profile_spineextract()
@@ -32,8 +32,585 @@ def test_rla_1_0():
     __check_paths(PATH, (1, 0))
 
 
+def __decode_both(version, signature, buffer, strict):
+    from sssekai.fmt.rla import decode_streaming_data
+    from .rla_reference import decode_streaming_data_legacy
+
+    results = list()  # reprs, as NaNs are never equal
+    for decode in (decode_streaming_data_legacy, decode_streaming_data):
+        try:
+            results.append(repr(decode(version, signature, buffer, strict)))
+        except Exception as e:
+            results.append(type(e))
+    return results
+
+
+def test_rla_compiled_decoder():
+    import random
+    from sssekai.fmt.rla import (
+        RLA_VERSIONS,
+        decode_buffer_base64,
+        decode_buffer_payload,
+    )
+
+    # Samples
+    for paths, version in [
+        (["1740309585940-0.bin", "1740309585941-0.bin"], (1, 6)),
+        (["1728191806276-0.bin"], (1, 5)),
+        (["1718434788237-0.bin"], (1, 4)),
+        (["streaming_live_vbs_1-0_0.bin"], (1, 0)),
+    ]:
+        for path in paths:
+            with open(sample_file_path("rla", path), "rb") as f:
+                split_info, _, data = decode_buffer_base64(f.read())
+            if split_info:
+                continue
+            signature, payload = decode_buffer_payload(data)
+            legacy, compiled = __decode_both(version, signature, payload, True)
+            assert legacy == compiled, path
+    # Synthetic payloads, including truncated and corrupt ones
+    rng = random.Random(0)
+    for version in RLA_VERSIONS:
+        for signature in range(7):
+            for _ in range(50):
+                data = bytes([signature]) + rng.randbytes(rng.randint(0, 256))
+                mask = bytes([0b11 | rng.randint(0, 255) & ~0b11])
+                mask += rng.randbytes(rng.randint(0, 64))
+                buffer = (len(data) + 4).to_bytes(4, "little") + data
+                buffer += len(mask).to_bytes(2, "little") + mask
+                buffer = buffer[
+                    : rng.choice([len(buffer), rng.randint(0, len(buffer))])
+                ]
+                for strict in (True, False):
+                    legacy, compiled = __decode_both(version, signature, buffer, strict)
+                    assert legacy == compiled, (version, signature, buffer, strict)
+
+
+def test_rla_motion_tracks():
+    import math, random
+    import numpy as np
+    from sssekai.fmt.rla import (
+        RLA_VERSIONS,
+        read_rla_frames,
+        decode_streaming_data,
+    )
+    from sssekai.fmt.rla_columnar import read_rla_motion_tracks
+
+    packets = [
+        (
+            "1718434788237-0.bin",
+            open(sample_file_path("rla", "1718434788237-0.bin"), "rb").read(),
+        )
+    ]
+    tracks = read_rla_motion_tracks(iter(packets), (1, 4))
+    rows = [
+        data
+        for _, frame in read_rla_frames(iter(packets), (1, 4))
+        for data in frame["data"]
+    ]
+    assert sum(len(track) for track in tracks.values()) == len(rows)
+    for id, track in tracks.items():
+        poses = [data for data in rows if data["id"] == id]
+        assert list(track.timeStamps) == [data["timestamp"] for data in poses]
+        for key in ("bodyPosition", "bodyRotation", "musicItemPropRotation"):
+            assert np.array_equal(
+                track.__dict__[key], [data["pose"][key] for data in poses]
+            )
+        assert not track.boneDatas.size and not track.counts["boneDatas"].any()
+    # Columnar decoding of synthetic payloads with bone data
+    rng = random.Random(0)
+    for version in RLA_VERSIONS:
+        for _ in range(50):
+            data = bytes([1]) + rng.randbytes(rng.randint(0, 512))
+            mask = bytes([0b11 | rng.randint(0, 255) & ~0b11])
+            mask += rng.randbytes(rng.randint(0, 128))
+            buffer = (len(data) + 4).to_bytes(4, "little") + data
+            buffer += len(mask).to_bytes(2, "little") + mask
+            try:
+                row = decode_streaming_data(version, 1, buffer, False)
+            except Exception:
+                continue
+            columnar = decode_streaming_data(version, 1, buffer, False, True)
+            for a, b in zip(row["data"], columnar["data"]):
+                for key in ("bodyRotation", "boneDatas", "propBoneDatas"):
+                    if key in a["pose"]:
+                        flat = (
+                            [x for v in a["pose"][key] for x in v]
+                            if key != "bodyRotation"
+                            else a["pose"][key]
+                        )
+                        assert [
+                            x * 0.01 * (math.pi / 180) for x in b["pose"][key]
+                        ] == list(flat)
+
+
+def test_rla_parallel():
+    from concurrent.futures import ProcessPoolExecutor
+    from sssekai.fmt.rla import (
+        read_rla_frames,
+        read_rla_frames_parallel,
+        SSEMissingSplitPacketException,
+    )
+
+    def packets(paths):
+        return [(f, open(sample_file_path("rla", f), "rb").read()) for f in paths]
+
+    with ProcessPoolExecutor(2) as executor:
+        for paths, version in [
+            (["1740309585940-0.bin", "1740309585941-0.bin"] * 3, (1, 6)),
+            (["1718434788237-0.bin"] * 5, (1, 4)),
+            (["streaming_live_vbs_1-0_0.bin"] * 5, (1, 0)),
+        ]:
+            serial = list(read_rla_frames(iter(packets(paths)), version))
+            parallel = list(
+                read_rla_frames_parallel(
+                    iter(packets(paths)), version, executor=executor, batch_size=2
+                )
+            )
+            assert repr(serial) == repr(parallel)
+        # Missing split packets are raised after all complete frames are yielded
+        frames = list()
+        try:
+            for frame in read_rla_frames_parallel(
+                iter(packets(["1718434788237-0.bin", "1740309585940-0.bin"])),
+                (1, 4),
+                executor=executor,
+            ):
+                frames.append(frame)
+            assert False, "missing split packet not raised"
+        except SSEMissingSplitPacketException:
+            assert len(frames) == 1
+
+
+def test_rla_archive_index():
+    from io import BytesIO
+    from sssekai.fmt.rla import (
+        RLAArchiveIndex,
+        iter_archive_rla_packets,
+        iter_rla_payloads,
+        read_archive_rla_frames,
+    )
+    from sssekai.fmt.rla_index import RLASplitIndex
+
+    paths = ["1740309585940-0.bin", "1718434788237-0.bin", "1740309585941-0.bin"]
+    archive = b"".join(
+        (1000 + tick).to_bytes(8, "little") + len(buffer).to_bytes(4, "little") + buffer
+        for tick, buffer in enumerate(
+            open(sample_file_path("rla", f), "rb").read() for f in paths
+        )
+    )
+    archive += bytes(8)  # Terminating tick
+    streamed = list(iter_archive_rla_packets(BytesIO(archive)))
+    index = RLAArchiveIndex(archive)
+    assert len(index) == 3 and index.frame_count() == 2
+    assert [(t, bytes(b)) for t, b in iter_archive_rla_packets(archive)] == streamed
+    assert index.find(1001) == 1 and index.find(1003) == 3
+    assert index[1][1].obj is index.view.obj  # Not copied
+    assert repr(list(read_archive_rla_frames(memoryview(archive), (1, 4)))) == repr(
+        list(read_archive_rla_frames(BytesIO(archive), (1, 4)))
+    )
+    # Truncated packets are kept, as with streams
+    assert bytes(RLAArchiveIndex(archive[:-20])[2][1]) == streamed[2][1][:-12]
+    # Reused splitIds start new groups. Corrupt packets and incomplete groups aren't frames
+    payload = b"".join(
+        open(sample_file_path("rla", f), "rb").read()[50:] for f in paths[::2]
+    )
+    buffers = __split_packets(payload, 4, [60000, 73608])
+    buffers += [b"RTVL garbage"] + buffers + buffers + buffers[:1]
+    archive = b"".join(
+        (1 + tick).to_bytes(8, "little") + len(buffer).to_bytes(4, "little") + buffer
+        for tick, buffer in enumerate(buffers)
+    )
+    count = len(list(iter_rla_payloads(enumerate(buffers), strict=False)))
+    assert RLAArchiveIndex(archive).frame_count() == count == 3
+    assert len(RLASplitIndex.build("archive", archive)) == count
+    # Repeated chunks don't complete groups early. Frames seeked to are the ones decoded
+    buffers = __split_packets(payload, 4, [50000, 50000, 33608])
+    buffers = buffers[:1] + buffers + __split_packets(payload, 4, [133608], 2)
+    archive = b"".join(
+        (1 + tick).to_bytes(8, "little") + len(buffer).to_bytes(4, "little") + buffer
+        for tick, buffer in enumerate(buffers)
+    )
+    expected = list(iter_rla_payloads(enumerate(buffers, 1)))
+    index = RLASplitIndex.build("archive", archive)
+    assert RLAArchiveIndex(archive).frame_count() == len(index) == len(expected) == 2
+    assert list(index.frame_first) == [0, 4] and list(index.frame_last) == [3, 4]
+    for frame, payload in enumerate(expected):
+        packets = index.packets(archive, [frame])
+        assert list(iter_rla_payloads((t, bytes(b)) for t, b in packets)) == [payload]
+
+
+def test_textasset_bytes():
+    from UnityPy.enums import ClassIDType
+    from sssekai.unity.AssetBundle import load_assetbundle, read_textasset_bytes
+
+    with open(sample_file_path("live2d", "21miku_night"), "rb") as f:
+        env = load_assetbundle(f)
+    for obj in env.objects:
+        if obj.type == ClassIDType.TextAsset:
+            data = obj.read()
+            name, script = read_textasset_bytes(obj)
+            assert name == data.m_Name
+            assert bytes(script) == data.m_Script.encode("utf-8", "surrogateescape")
+
+
+def test_rla_seek_index():
+    from sssekai.fmt.rla import read_archive_rla_frames
+    from sssekai.fmt.rla_index import RLAArchive, RLASeekIndex, RLA_TICKS_PER_SECOND
+
+    def archive(ticks_paths):
+        return b"".join(
+            tick.to_bytes(8, "little") + len(buffer).to_bytes(4, "little") + buffer
+            for tick, buffer in (
+                (tick, open(sample_file_path("rla", f), "rb").read())
+                for tick, f in ticks_paths
+            )
+        )
+
+    header = {"version": "1.6", "splitSeconds": 60, "splitFileIds": [0, 1]}
+    scripts = {
+        "sekai_60_00000000.rla": archive(
+            [(100, "1718434788237-0.bin"), (200, "1740309585940-0.bin")]
+            + [(300, "streaming_live_vbs_1-0_0.bin"), (400, "1740309585941-0.bin")]
+        ),
+        "sekai_60_00000001.rla": archive(
+            [(500, "streaming_live_vbs_1-0_0.bin"), (600, "1718434788237-0.bin")]
+        ),
+    }
+    rla = RLAArchive.from_scripts(header, scripts)
+    every = [
+        frame
+        for name in scripts
+        for frame in read_archive_rla_frames(scripts[name], rla.version)
+    ]
+    assert len(rla) == len(every) == 5
+    assert repr(list(rla.frames())) == repr(every)
+    # Windows
+    assert [tick for tick, _ in rla.frames(300, 600)] == [300, 400, 500]
+    assert [tick for tick, _ in rla.frames(350)] == [400, 500, 600]
+    # Split frames are reassembled from packets before the window
+    assert repr(list(rla.frames(400, 401))) == repr(every[2:3])
+    # Types
+    assert [tick for tick, _ in rla.frames(types=["VirtualLiveMessageData", 1])] == [
+        100,
+        300,
+        500,
+        600,
+    ]
+    assert [tick for tick, _ in rla.frames(200, types=["SoundData"])] == [400]
+    # Sidecar
+    path = os.path.join(TEMP_DIR, "test_rla_seek_index" + ".rlaidx.json")
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    rla.index.save(path)
+    loaded = RLAArchive(header, scripts, RLASeekIndex.load(path))
+    assert repr(list(loaded.frames(300))) == repr(every[1:])
+    # Tick unit
+    assert rla.tick_at(1) == 100 + RLA_TICKS_PER_SECOND
+    rla = RLAArchive.from_scripts(header, scripts, ticks_per_second=100)
+    t0, t1 = rla.tick_at(2), rla.tick_at(4)
+    assert [tick for tick, _ in rla.frames(t0, t1)] == [300, 400]
+
+
+def test_rla_type_filter():
+    from sssekai.fmt.rla import read_rla_frames, RLAFrame
+
+    paths = ["1718434788237-0.bin", "1740309585940-0.bin", "1740309585941-0.bin"]
+    paths += ["streaming_live_vbs_1-0_0.bin"]
+
+    def packets():
+        return ((f, open(sample_file_path("rla", f), "rb").read()) for f in paths)
+
+    every = list(read_rla_frames(packets(), (1, 6)))
+    for types, names in (
+        (["SoundData"], {"SoundData"}),
+        (["MotionCaptureData", 4], {"MotionCaptureData", "VirtualLiveMessageData"}),
+        ([], set()),
+    ):
+        filtered = list(read_rla_frames(packets(), (1, 6), types=types))
+        expected = [(tick, frame) for tick, frame in every if frame["type"] in names]
+        assert repr(filtered) == repr(expected)
+    lazy = list(read_rla_frames(packets(), (1, 6), lazy=True))
+    assert all(isinstance(frame, RLAFrame) for _, frame in lazy)
+    assert [frame["type"] for _, frame in lazy] == [f["type"] for _, f in every]
+    assert all(frame.frame is None for _, frame in lazy)  # Not decoded
+    assert lazy[1][1].channels == every[1][1]["channels"]
+    assert repr([(t, dict(frame)) for t, frame in lazy]) == repr(every)
+
+
+def test_rla_frame_pickle():
+    import copy, pickle
+    from sssekai.fmt.rla import read_rla_frames, RLAFrame
+
+    paths = ["1718434788237-0.bin", "1740309585940-0.bin", "1740309585941-0.bin"]
+    packets = ((f, open(sample_file_path("rla", f), "rb").read()) for f in paths)
+    lazy = [frame for _, frame in read_rla_frames(packets, (1, 6), lazy=True)]
+    # Protocols and special methods aren't keys. Looking them up doesn't decode
+    assert not hasattr(lazy[0], "__array__") and not hasattr(lazy[0], "__deepcopy__")
+    assert lazy[0].frame is None
+    for frame in lazy:
+        expected = repr(dict(copy.copy(frame)))  # Decoded before copying
+        assert frame.frame is not None
+        for clone in (
+            pickle.loads(pickle.dumps(frame)),
+            copy.copy(frame),
+            copy.deepcopy(frame),
+        ):
+            assert clone.type == frame.type and clone.frame is not None
+            assert repr(dict(clone)) == expected
+    # Signatures without a schema. Streaming data of just the signature byte, by its mask
+    data = (5).to_bytes(4, "little") + b"\x63" + (1).to_bytes(2, "little") + b"\x03"
+    frame = RLAFrame((1, 6), 99, b"\x63\x01\x00\x00\x00" + data)
+    assert frame.type == "Unknown" and repr(frame) == "<RLAFrame Unknown (pending)>"
+    assert frame.decode()["type"] == frame.type
+    clone = pickle.loads(pickle.dumps(frame))
+    assert clone.type == "Unknown" and repr(dict(clone)) == repr(dict(frame))
+
+
+def __split_packets(data: bytes, signature: int, sizes: list, splitId=1) -> list:
+    """`data` (base64) as split packets of `sizes`"""
+    packets, offset = list(), 0
+    for index, size in enumerate(sizes):
+        chunk, offset = data[offset : offset + size], offset + size
+        header = b"%5d%5d%5d%10d%10d" % (splitId, index, len(sizes), size, len(data))
+        packet = b"TT%03d" % signature + header + chunk
+        packets.append(b"RTVL%06X" % (len(packet) + 10) + packet)
+    return packets
+
+
+def test_rla_split_buffer():
+    from base64 import b64decode
+    from random import Random
+    from sssekai.fmt.rla import (
+        iter_rla_payloads,
+        RLASplitBuffer,
+        RTVL_MAX_LENGTH,
+        SSEMissingSplitPacketException,
+    )
+
+    paths = ["1740309585940-0.bin", "1740309585941-0.bin"]
+    packets = [open(sample_file_path("rla", f), "rb").read() for f in paths]
+    payload = b"".join(packet[50:] for packet in packets)
+    (_, signature, decoded), *_ = iter_rla_payloads(enumerate(packets))
+    assert decoded == b64decode(payload)
+    (_, _, reversed_), *_ = iter_rla_payloads(enumerate(packets[::-1]))
+    assert reversed_ == decoded
+    rng = Random(0)
+    for sizes, buffered in (
+        ([20000] * 6 + [13608], True),  # Fixed size chunks, in place
+        ([133608], True),
+        ([30000, 50000, 53608], False),  # Uneven chunks, joined
+        ([100000, 33000, 608], False),
+    ):
+        split = __split_packets(payload, signature, sizes)
+        rng.shuffle(split)
+        group = RLASplitBuffer(0, signature, len(sizes), len(payload), True, sizes[0])
+        for buffer in split:
+            group.add(int(buffer[20:25]), memoryview(buffer)[50:])
+        assert group.complete and (group.parts is None) == buffered
+        assert group.join() == decoded
+        assert [p for _, _, p in iter_rla_payloads(enumerate(split))] == [decoded]
+    # Corrupt totalDataLength, never preallocated
+    for count, total, length in (
+        (2, 10**10, 10),
+        (1 << 20, RTVL_MAX_LENGTH * 2, 10**6),
+    ):
+        group = RLASplitBuffer(0, signature, count, total, True, length)
+        assert group.parts is not None and group.nbytes == 0
+    # Incomplete, and mislabeled groups
+    split = __split_packets(payload, signature, [60000, 60000, 13608])
+    try:
+        list(iter_rla_payloads(enumerate(split[:2])))
+        assert False, "missing split packet not raised"
+    except SSEMissingSplitPacketException as e:
+        assert e.missing == [(0, 1)]
+    short = __split_packets(payload[:-4], signature, [60000, 60000, 13604])
+    short = [p[:40] + b"%10d" % len(payload) + p[50:] for p in short]
+    (_, _, joined), *_ = iter_rla_payloads(enumerate(short), strict=False)
+    assert joined == b64decode(payload[:-4])
+    try:
+        list(iter_rla_payloads(enumerate(short)))
+        assert False, "incomplete split packet not raised"
+    except AssertionError as e:
+        assert str(e) == "incomplete split packet"
+
+
+# Header of a mono 44100Hz HCA with 371 byte blocks, as the SoundData sample. CRC is patched
+HCA_TEMPLATE = bytes.fromhex(
+    "4843410002000060666d74000100ac440000002c0080033c636f6d700173010f0101808000000000"
+    "63697068000070616400000000000000000000000000000000000000000000000000000000000000"
+    "00000000000000000000000000000000"
+)
+
+
+def test_rla_audio_track():
+    import json, shutil, threading
+    from sssekai.fmt.rla import read_rla_frames, SSEMissingSplitPacketException
+    from sssekai.fmt.rla_audio import (
+        HCAHeader,
+        RLAAudioTrackWriter,
+        find_hca_blocks,
+        hca_crc16,
+        hca_silent_block,
+    )
+    from sssekai.entrypoint.rla2json import main_rla2json
+
+    template = HCAHeader.parse(HCA_TEMPLATE).patched(0)
+    paths = ["1740309585940-0.bin", "1740309585941-0.bin"]
+    packets = [(f, open(sample_file_path("rla", f), "rb").read()) for f in paths]
+    ((_, frame),) = read_rla_frames(iter(packets), (1, 6))
+    start, block_size, count = find_hca_blocks(frame["data"])
+    assert (start, block_size, count) == (0, 371, 270)
+    duration = count * 1024 / 44100
+    output = os.path.join(TEMP_DIR, "test_rla_audio_track.hca")
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    with RLAAudioTrackWriter(output, template=template) as track:
+        # Out of order, with a gap of a frame
+        track.add(duration, frame)
+        track.add(0, frame)
+        track.add(duration * 3, frame)
+    with open(output, "rb") as f:
+        hca = f.read()
+    header = HCAHeader.parse(hca)
+    assert header.block_count == count * 4 and hca_crc16(header.data) == 0
+    # The gap is filled with silent blocks, so the last frame plays at its time
+    silence = hca_silent_block(block_size)
+    assert silence[:2] == b"\xff\xff" and hca_crc16(silence) == 0
+    assert (
+        hca[len(header.data) :] == frame["data"] * 2 + silence * count + frame["data"]
+    )
+    with open(output + ".json", "r", encoding="utf-8") as f:
+        summary = json.load(f)
+    assert len(summary["gaps"]) == 1 and summary["gaps"][0]["block"] == count * 2
+    assert abs(summary["gaps"][0]["duration"] - duration) < 1e-6
+    assert summary["samples"] == count * 4 * 1024
+    # Gaps short of whole blocks. The rounding doesn't accumulate
+    block = 1024 / 44100
+    with RLAAudioTrackWriter(output, template=template) as track:
+        for i in range(3):
+            track.add(i * (duration + block * 3.5), frame)
+    assert track.blocks == count * 3 + 7  # 4 and 3, not 4 and 4
+    # Archive ticks, in the unit shared with `RLAArchive`
+    with RLAAudioTrackWriter(
+        output, template=template, ticks_per_second=44100
+    ) as track:
+        track.add_tick(0, frame)
+        track.add_tick(count * 1024 * 2, frame)
+    assert track.blocks == count * 3 and len(track.gaps) == 1
+    # rla2json, from loose packets
+    indir = os.path.join(TEMP_DIR, "test_rla_audio_track_packets")
+    outdir = os.path.join(TEMP_DIR, "test_rla_audio_track_out")
+    shutil.rmtree(indir, ignore_errors=True)
+    shutil.rmtree(outdir, ignore_errors=True)
+    os.makedirs(indir, exist_ok=True)
+    for path in paths:
+        shutil.copy(sample_file_path("rla", path), indir)
+    main_rla2json(
+        NamedDict(
+            {
+                "input": indir,
+                "outdir": outdir,
+                "version": "1.6",
+                "audio": "hca",
+                "hca_template": None,
+            }
+        )
+    )
+    with open(os.path.join(outdir, "SoundData.hca"), "rb") as f:
+        assert f.read() == frame["data"]  # Bare blocks without a template
+    assert sorted(os.listdir(outdir)) == ["SoundData.hca", "SoundData.hca.json"]
+    # Failing at the end, on an incomplete split group. Output is still flushed
+    shutil.rmtree(outdir)
+    with open(os.path.join(indir, "incomplete.bin"), "wb") as f:
+        f.write(__split_packets(b"AAAAAAAA", 1, [4, 4], splitId=9)[0])
+    try:
+        main_rla2json(
+            NamedDict(
+                {
+                    "input": indir,
+                    "outdir": outdir,
+                    "version": "1.6",
+                    "audio": "hca",
+                    "strict": True,
+                }
+            )
+        )
+        assert False, "missing split packet not raised"
+    except SSEMissingSplitPacketException:
+        pass
+    with open(os.path.join(outdir, "SoundData.hca"), "rb") as f:
+        assert f.read() == frame["data"]
+    assert os.path.exists(os.path.join(outdir, "SoundData.hca.json"))
+    assert not [t for t in threading.enumerate() if t.name == "sssekai-writer"]
+
+
+def test_rla2json_formats():
+    import json, shutil, msgpack
+    import numpy as np
+    from sssekai.fmt.rla import read_rla_frames
+    from sssekai.fmt.rla_output import RLA_OUTPUT_FORMATS, json_default
+    from sssekai.entrypoint.rla2json import main_rla2json
+
+    paths = ["1718434788237-0.bin", "streaming_live_vbs_1-0_0.bin"]
+    indir = os.path.join(TEMP_DIR, "test_rla2json_formats_packets")
+    shutil.rmtree(indir, ignore_errors=True)
+    os.makedirs(indir)
+    for path in paths:
+        shutil.copy(sample_file_path("rla", path), indir)
+    packets = [(f, open(sample_file_path("rla", f), "rb").read()) for f in paths]
+    expected = {
+        frame["type"]: (tick, frame)
+        for tick, frame in read_rla_frames(iter(packets), (1, 6))
+    }
+    roundtrip = lambda frame: json.loads(json.dumps(frame, default=json_default))
+    for format in RLA_OUTPUT_FORMATS:
+        outdir = os.path.join(TEMP_DIR, "test_rla2json_formats_" + format)
+        shutil.rmtree(outdir, ignore_errors=True)
+        main_rla2json(
+            NamedDict(
+                {"input": indir, "outdir": outdir, "version": "1.6", "format": format}
+            )
+        )
+        match format:
+            case "json":
+                for type, (tick, frame) in expected.items():
+                    with open(os.path.join(outdir, type, tick + ".json"), "rb") as f:
+                        assert json.load(f) == roundtrip(frame)
+            case "ndjson" | "npz":
+                for type, (tick, frame) in expected.items():
+                    if format == "npz" and type == "MotionCaptureData":
+                        continue
+                    with open(os.path.join(outdir, type + ".ndjson"), "rb") as f:
+                        (line,) = f.read().splitlines()
+                    assert json.loads(line) == roundtrip({"tick": tick, **frame})
+            case "msgpack":
+                for type, (tick, frame) in expected.items():
+                    with open(os.path.join(outdir, type + ".msgpack"), "rb") as f:
+                        (item,) = msgpack.Unpacker(f)
+                    assert repr(item) == repr(
+                        msgpack.unpackb(msgpack.packb([tick, frame]))
+                    )
+        if format == "npz":
+            tick, frame = expected["MotionCaptureData"]
+            ids = [data["id"] for data in frame["data"]]
+            with np.load(os.path.join(outdir, "motion.npz")) as npz:
+                for id in set(ids):
+                    assert len(npz["%d/timeStamps" % id]) == ids.count(id)
+                    assert npz["%d/bodyPosition" % id].shape == (ids.count(id), 3)
+
+
 if __name__ == "__main__":
     test_rla_1_6_split()
     test_rla_1_5()
     test_rla_1_4()
     test_rla_1_0()
+    test_rla_compiled_decoder()
+    test_rla_motion_tracks()
+    test_rla_parallel()
+    test_rla_archive_index()
+    test_textasset_bytes()
+    test_rla_seek_index()
+    test_rla_type_filter()
+    test_rla_frame_pickle()
+    test_rla_split_buffer()
+    test_rla_audio_track()
+    test_rla2json_formats()
@@ -0,0 +1,156 @@
+from . import *
+import asyncio
+
+PATHS = [
+    "1718434788237-0.bin",
+    "1740309585940-0.bin",
+    "streaming_live_vbs_1-0_0.bin",
+    "1740309585941-0.bin",
+]
+
+
+def __packets(paths):
+    return [open(sample_file_path("rla", f), "rb").read() for f in paths]
+
+
+def __with_split_id(packet, splitId):
+    return packet[:15] + b"%5d" % splitId + packet[20:]
+
+
+async def __serve(messages, chunk_size=1000):
+    """A local event stream of `messages`, sent chunked in `chunk_size` pieces"""
+
+    async def handle(reader, writer):
+        while (await reader.readline()).strip():
+            pass
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        body = b": keep-alive\n\n" + b"".join(
+            b"event: message\r\ndata: " + message + b"\r\n\r\n" for message in messages
+        )
+        for i in range(0, len(body), chunk_size):
+            chunk = body[i : i + chunk_size]
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, "http://127.0.0.1:%d/live" % server.sockets[0].getsockname()[1]
+
+
+def test_rla_sse_ingestor():
+    import threading
+    from sssekai.fmt import rla_sse
+    from sssekai.fmt.rla import read_rla_frames
+    from sssekai.fmt.rla_sse import RLASSEIngestor
+
+    # The first half of a split group that never completes
+    packets = __packets(PATHS + ["1740309585940-0.bin"])
+    packets[-1] = __with_split_id(packets[-1], 9)
+    expected = list(read_rla_frames(enumerate(packets), (1, 6), strict=False))
+
+    # Frames are decoded off the event loop, and connections are waited on to close
+    decode, wait_closed = rla_sse.decode_rla_payload, asyncio.StreamWriter.wait_closed
+    threads, closed = set(), list()
+
+    def _decode(*args):
+        threads.add(threading.current_thread())
+        return decode(*args)
+
+    async def _wait_closed(writer):
+        closed.append(writer)
+        return await wait_closed(writer)
+
+    async def run():
+        server, url = await __serve(packets)
+        async with server:
+            ingestor = RLASSEIngestor(url, (1, 6))
+            frames = [frame async for _, frame in ingestor]
+            assert ingestor.reassembler.dropped == 1
+            # Filtered, with a consumer slower than the stream
+            async with RLASSEIngestor(url, (1, 6), types=[1], max_frames=1) as ingestor:
+                await asyncio.sleep(0.1)
+                assert ingestor.queue.full()
+                motion = [frame async for _, frame in ingestor]
+        return frames, motion
+
+    rla_sse.decode_rla_payload, asyncio.StreamWriter.wait_closed = _decode, _wait_closed
+    try:
+        frames, motion = asyncio.run(run())
+    finally:
+        rla_sse.decode_rla_payload, asyncio.StreamWriter.wait_closed = decode, wait_closed
+    assert threads and threading.main_thread() not in threads
+    assert len(closed) == 2
+    assert repr(frames) == repr([frame for _, frame in expected])
+    assert [frame["type"] for frame in motion] == ["MotionCaptureData"]
+
+
+def test_rla_split_reassembler():
+    from sssekai.fmt.rla import SSEMissingSplitPacketException
+    from sssekai.fmt.rla_sse import RLASplitReassembler
+
+    first, second = __packets(["1740309585940-0.bin", "1740309585941-0.bin"])
+    now = [0]
+    reassembler = RLASplitReassembler(timeout=10, clock=lambda: now[0])
+    assert reassembler.feed(0, first) is None
+    assert reassembler.feed(0, first) is None  # Duplicate parts are replaced
+    assert reassembler.feed(1, second)[:2] == (1, 2)  # Completing timestamp
+    assert not reassembler.pending and not reassembler.pending_bytes
+    # Timeouts
+    reassembler.feed(2, first)
+    now[0] = 11
+    reassembler.feed(3, __packets(["1718434788237-0.bin"])[0])
+    assert reassembler.dropped == 1 and not reassembler.pending_bytes
+    # Memory limit. Groups hold their totalDataLength from the first part on, room for
+    # it is made before it's allocated
+    reassembler = RLASplitReassembler(max_pending=int(first[40:50]))
+    reassembler.feed(0, first)
+    reassembler.feed(1, __with_split_id(first, 2))
+    assert reassembler.dropped == 1 and list(reassembler.pending) == [2]
+    # Groups that can't fit at all are rejected, corrupt ones aren't preallocated
+    reassembler = RLASplitReassembler(max_pending=int(first[40:50]) - 1)
+    assert reassembler.feed(0, first) is None and not reassembler.pending
+    reassembler.feed(0, first[:40] + b"%10d" % 10**10 + first[50:])
+    assert reassembler.pending_bytes < len(first) and reassembler.dropped == 0
+    # Strict
+    reassembler = RLASplitReassembler(strict=True)
+    reassembler.feed(0, first)
+    try:
+        reassembler.close()
+        assert False, "missing split packet not raised"
+    except SSEMissingSplitPacketException as e:
+        assert e.missing == [(0, 1)]
+
+
+def test_rla_sse_lines_eof():
+    from sssekai.fmt.rla_sse import iter_sse_lines
+
+    async def lines(body, chunked):
+        reader = asyncio.StreamReader()
+        reader.feed_data(body)
+        reader.feed_eof()
+        return [line async for line in iter_sse_lines(reader, chunked)]
+
+    chunks = b"6\r\ndata: \r\n8;ext=1\r\nRTVL\r\n\r\n\r\n"
+    for body, chunked, expected in (
+        (b"data: RTVL\r\n\r\n", False, [b"data: RTVL", b""]),
+        (chunks + b"0\r\n\r\n", True, [b"data: RTVL", b""]),
+        # Closed without the terminating chunk, between and inside chunks
+        (chunks, True, [b"data: RTVL", b""]),
+        (chunks + b"\r\n", True, [b"data: RTVL", b""]),
+        (chunks + b"8\r\nda", True, [b"data: RTVL", b"", b"da"]),
+        (chunks[:-6], True, [b"data: RTVL"]),
+        (b"", True, []),
+    ):
+        assert asyncio.run(lines(body, chunked)) == expected, body
+
+
+if __name__ == "__main__":
+    test_rla_sse_ingestor()
+    test_rla_split_reassembler()
+    test_rla_sse_lines_eof()